@@ -0,0 +1,33 @@
+// Precompress the Vite build so the Python server can serve .br/.gz files directly
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs'
+import { join, extname } from 'node:path'
+import { brotliCompressSync, gzipSync, constants } from 'node:zlib'
+
+const DIST = process.argv[2] || 'dist'
+const COMPRESSIBLE = new Set(['.html', '.js', '.mjs', '.css', '.json', '.svg', '.txt', '.map', '.xml'])
+const MIN_SIZE = 1024
+
+function walk(dir) {
+  return readdirSync(dir).flatMap((name) => {
+    const path = join(dir, name)
+    return statSync(path).isDirectory() ? walk(path) : [path]
+  })
+}
+
+let count = 0
+for (const file of walk(DIST)) {
+  if (!COMPRESSIBLE.has(extname(file))) continue
+  const data = readFileSync(file)
+  if (data.length < MIN_SIZE) continue
+
+  writeFileSync(`${file}.gz`, gzipSync(data, { level: 9 }))
+  writeFileSync(`${file}.br`, brotliCompressSync(data, {
+    params: {
+      [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+      [constants.BROTLI_PARAM_SIZE_HINT]: data.length
+    }
+  }))
+  count++
+}
+
+console.log(`Precompressed ${count} files in ${DIST}`)
@@ -0,0 +1,137 @@
+"""
+Books listing benchmark on a 100k-title catalog
+
+Seeds a scratch database with synthetic titles (skewed author popularity,
+~10% out of stock), creates the app's indexes, then times representative
+filter/sort shapes through book_controller.search_books:
+
+    cold  facet cache cleared: one $facet aggregation (page + counts)
+    warm  facet counts served from the cache: page query only
+
+and prints each shape's winning plan (index used, or COLLSCAN / blocking
+SORT when an index is missing).
+
+Usage (from the server directory, with MONGODB_URI pointing at a test server):
+    python -m benchmarks.book_listing [--titles 100000] [--runs 20] [--keep-db]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from config import settings
+
+settings.DATABASE_NAME = f"{settings.DATABASE_NAME}_book_listing"
+
+import database  # noqa: E402
+from controllers import book_controller  # noqa: E402
+from models.book import Availability, BookQuery, BookSort  # noqa: E402
+
+SHAPES = {
+    "default (in stock, newest)": BookQuery(),
+    "price ascending": BookQuery(sort=BookSort.PRICE_ASC),
+    "title, page 10": BookQuery(sort=BookSort.TITLE, page=10, limit=24),
+    "one author, newest": BookQuery(authors=["Author 7"]),
+    "one author, price desc": BookQuery(authors=["Author 7"], sort=BookSort.PRICE_DESC),
+    "three authors, price range": BookQuery(authors=["Author 1", "Author 2", "Author 3"], min_price=200, max_price=800),
+    "price range, newest": BookQuery(min_price=500, max_price=1000),
+    "all availability, title": BookQuery(availability=Availability.ALL, sort=BookSort.TITLE),
+}
+
+
+async def seed(db, titles: int):
+    random.seed(7)
+    authors = [f"Author {i}" for i in range(2000)]
+    weights = [1 / (rank + 1) for rank in range(len(authors))]
+    now = datetime.utcnow()
+    batch = []
+    for i in range(titles):
+        batch.append({
+            "title": f"Title {random.randrange(10 ** 9):09d}",
+            "description": "Synthetic benchmark title",
+            "price": float(random.randrange(99, 3000)),
+            "image": "",
+            "stock": 0 if random.random() < 0.1 else random.randrange(1, 100),
+            "author": random.choices(authors, weights)[0],
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now
+        })
+        if len(batch) == 5000:
+            await db.books.insert_many(batch)
+            batch = []
+    if batch:
+        await db.books.insert_many(batch)
+    await database.ensure_indexes(db)
+
+
+def plan_summary(explain: dict) -> str:
+    """Index names and notable stages from an aggregate explain"""
+    indexes, stages = [], set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get("stage") in ("COLLSCAN", "SORT", "SORT_MERGE"):
+                stages.add(node["stage"])
+            if node.get("indexName"):
+                indexes.append(node["indexName"])
+            for key, value in node.items():
+                if key != "rejectedPlans":
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain)
+    return ", ".join(sorted(set(indexes)) + sorted(stages)) or "?"
+
+
+async def explain(db, query: BookQuery) -> str:
+    pipeline = book_controller.facet_pipeline(query)
+    try:
+        result = await db.command("explain", {"aggregate": "books", "pipeline": pipeline, "cursor": {}})
+        return plan_summary(result)
+    except Exception as e:
+        return f"explain unavailable ({e.__class__.__name__})"
+
+
+async def time_shape(query: BookQuery, runs: int, cold: bool) -> float:
+    timings = []
+    for _ in range(runs):
+        if cold:
+            book_controller.book_facets.clear()
+        started = time.perf_counter()
+        await book_controller.search_books(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def run(args) -> int:
+    await database.connect_db()
+    db = database.get_database()
+    try:
+        if await db.books.estimated_document_count() != args.titles:
+            await db.books.drop()
+            print(f"Seeding {args.titles} titles...")
+            await seed(db, args.titles)
+
+        print(f"\n{'shape':<30} {'cold ms':>9} {'warm ms':>9}  plan")
+        for name, query in SHAPES.items():
+            cold = await time_shape(query, args.runs, cold=True)
+            warm = await time_shape(query, args.runs, cold=False)
+            print(f"{name:<30} {cold:>9.1f} {warm:>9.1f}  {await explain(db, query)}")
+    finally:
+        if not args.keep_db:
+            await database.client.drop_database(settings.DATABASE_NAME)
+        await database.close_db()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Books listing benchmark")
+    parser.add_argument("--titles", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--keep-db", action="store_true", help="keep the seeded catalog for the next run")
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,128 @@
+"""
+Flash-sale stock: per-request $inc vs leased token pools
+
+Fires more concurrent single-unit reservations at one book than it has
+stock, first with the guarded per-request $inc every normal checkout uses,
+then through StockPools (several simulated workers, each with its own
+lease). Reports reservations/sec and writes to the hot document, and fails
+if either path sells more units than existed.
+
+Usage (from the server directory, with MONGODB_URI pointing at a test server):
+    python -m benchmarks.flash_sale [--stock 5000] [--attempts 6000]
+        [--concurrency 200] [--workers 4] [--block 25]
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from config import settings
+
+settings.DATABASE_NAME = f"{settings.DATABASE_NAME}_flash_sale"
+
+import database  # noqa: E402
+from utils.metrics import metrics  # noqa: E402
+from utils.stock_pool import StockPools  # noqa: E402
+
+
+async def run_attempts(attempts: int, concurrency: int, reserve) -> tuple:
+    """Run `attempts` reservations, at most `concurrency` at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    sold = 0
+
+    async def attempt(i):
+        nonlocal sold
+        async with semaphore:
+            if await reserve(i):
+                sold += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt(i) for i in range(attempts)))
+    return sold, time.perf_counter() - started
+
+
+async def per_request(db, args) -> dict:
+    book_id = (await db.books.insert_one({"title": "Launch", "stock": args.stock})).inserted_id
+
+    async def reserve(_):
+        result = await db.books.update_one({"_id": book_id, "stock": {"$gte": 1}}, {"$inc": {"stock": -1}})
+        return result.modified_count == 1
+
+    sold, elapsed = await run_attempts(args.attempts, args.concurrency, reserve)
+    book = await db.books.find_one({"_id": book_id})
+    return {"sold": sold, "seconds": elapsed, "writes": args.attempts, "left": book["stock"], "leased": 0}
+
+
+async def pooled(db, args) -> dict:
+    book_id = (await db.books.insert_one({"title": "Launch", "stock": args.stock, "flash_sale": True})).inserted_id
+    workers = [StockPools(worker_id=f"bench-{i}", block=args.block) for i in range(args.workers)]
+    writes = {"flushes": 0}
+    leases_before = metrics.snapshot().get("flashSale.leases", 0)
+
+    async def reserve(i):
+        return await workers[i % len(workers)].reserve(db, book_id, 1)
+
+    async def flusher():
+        while True:
+            await asyncio.sleep(settings.FLASH_SALE_FLUSH_SECONDS)
+            for pools in workers:
+                writes["flushes"] += await pools.flush(db)
+
+    flushing = asyncio.create_task(flusher())
+    try:
+        sold, elapsed = await run_attempts(args.attempts, args.concurrency, reserve)
+    finally:
+        flushing.cancel()
+    for pools in workers:
+        writes["flushes"] += await pools.flush(db, return_all=True)
+
+    book = await db.books.find_one({"_id": book_id})
+    leases = metrics.snapshot().get("flashSale.leases", 0) - leases_before
+    return {
+        "sold": sold,
+        "seconds": elapsed,
+        "writes": leases + writes["flushes"],
+        "left": book["stock"],
+        "leased": book.get("leased", 0)
+    }
+
+
+def report(name: str, result: dict, stock: int) -> bool:
+    rate = result["sold"] / result["seconds"] if result["seconds"] else 0
+    print(
+        f"{name:<12} sold {result['sold']:>6}  {rate:>9.0f} reservations/sec  "
+        f"{result['writes']:>6} writes to the book  left {result['left']}  leased {result['leased']}"
+    )
+    # Every unit is either sold, back in stock, or still leased
+    ok = result["sold"] <= stock and result["sold"] + result["left"] + result["leased"] == stock
+    if not ok:
+        print(f"❌ {name}: units do not add up")
+    return ok
+
+
+async def run(args) -> int:
+    await database.connect_db()
+    db = database.get_database()
+    try:
+        baseline = await per_request(db, args)
+        flash = await pooled(db, args)
+    finally:
+        await database.client.drop_database(settings.DATABASE_NAME)
+        await database.close_db()
+
+    print()
+    ok = report("per-request", baseline, args.stock)
+    ok = report("token pool", flash, args.stock) and ok
+    if ok:
+        print("\n✅ No oversell on either path")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flash-sale stock benchmark")
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--attempts", type=int, default=6000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4, help="simulated worker processes")
+    parser.add_argument("--block", type=int, default=settings.FLASH_SALE_LEASE_BLOCK)
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,210 @@
+"""
+Query budget check
+
+Drives every budgeted API route once, in-process and serially, against a
+scratch database, counting the Mongo commands each request issues. Exits
+non-zero with a report of the offending commands when a route goes over
+the budget declared on it (`openapi_extra=query_budget(n)`), or when an
+/api route declares no budget at all. Meant to run in CI on every PR.
+
+Usage (from the server directory, with MONGODB_URI pointing at a test server):
+    python -m benchmarks.query_budget [--keep-db]
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import sys
+from urllib.parse import urlencode
+
+from fastapi.routing import APIRoute
+
+from config import settings
+
+settings.QUERY_BUDGET_MODE = "warn"
+settings.DATABASE_NAME = f"{settings.DATABASE_NAME}_query_budget"
+settings.RATE_LIMIT_ENABLED = False
+settings.EMAIL_USER = ""
+
+import database  # noqa: E402
+import main  # noqa: E402
+from controllers import payment_controller  # noqa: E402
+from utils import query_budget  # noqa: E402
+from utils.rate_limit import configure_store  # noqa: E402
+
+
+class FakeRazorpay:
+    """Stands in for the gateway; the check is about our database traffic"""
+
+    class order:
+        @staticmethod
+        def create(data, **options):
+            return {"id": f"order_{data['receipt']}", "amount": data["amount"], "currency": data["currency"]}
+
+
+async def request(app, method: str, path: str, body=None, query=None) -> dict:
+    """Minimal in-process ASGI call; returns status, headers and JSON body"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(query or {}).encode(),
+        "headers": [(b"host", b"budget"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0),
+        "server": ("budget", 80),
+    }
+    received = {"sent": False}
+    response = {"status": None, "headers": {}, "body": b""}
+
+    async def receive():
+        if received["sent"]:
+            return {"type": "http.disconnect"}
+        received["sent"] = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    try:
+        response["json"] = json.loads(response["body"] or b"null")
+    except ValueError:
+        response["json"] = None
+    return response
+
+
+async def exercise(app) -> list:
+    """One request per route, in an order where each has the data it needs"""
+    calls = []
+
+    async def call(method, path, body=None, query=None, expect=200):
+        response = await request(app, method, path, body, query)
+        calls.append((method, path, response))
+        if response["status"] != expect:
+            raise RuntimeError(f"{method} {path} returned {response['status']}: {response['body'][:500]}")
+        return response["json"]
+
+    book = {
+        "title": "Budget Book",
+        "description": "Seeded by the query budget check",
+        "price": 199,
+        "image": "",
+        "stock": 50,
+        "author": "CI"
+    }
+    user = {
+        "fullName": "Budget Check",
+        "address": "1 Test Street",
+        "pincode": "500001",
+        "mobile": "9000000000",
+        "email": "budget@example.com"
+    }
+
+    book_id = (await call("POST", "/api/books/", book))["data"]["_id"]
+    await call("GET", "/api/books/")
+    await call("GET", "/api/books/batch", query={"ids": book_id})
+    await call("GET", f"/api/books/{book_id}")
+    await call("GET", f"/api/books/{book_id}/related")
+    await call("PUT", f"/api/books/{book_id}", {"price": 249})
+    await call("POST", "/api/books/stock/bulk", {"updates": [{"id": book_id, "delta": 5}]})
+    await call("GET", f"/api/images/{book_id}", expect=404)
+
+    order = (await call("POST", "/api/orders/", {"bookId": book_id, "userDetails": user}))["data"]
+    cart = (await call("POST", "/api/orders/cart", {
+        "items": [{"bookId": book_id, "quantity": 2}],
+        "userDetails": user
+    }))["data"]
+    await call("POST", "/api/checkout", {"items": [{"bookId": book_id, "quantity": 1}], "userDetails": user})
+    await call("GET", "/api/orders/")
+    await call("GET", f"/api/orders/{order['_id']}")
+    await call("GET", "/api/orders/by-customer", query={"email": user["email"]})
+
+    razorpay_order_id = (await call("POST", "/api/payment/create-order", {"orderId": order["orderId"]}))["data"]["razorpayOrderId"]
+    payment_id = "pay_budget"
+    signature = hmac.new(
+        settings.RAZORPAY_SECRET.encode(),
+        f"{razorpay_order_id}|{payment_id}".encode(),
+        hashlib.sha256
+    ).hexdigest()
+    await call("POST", "/api/payment/verify", {
+        "razorpay_order_id": razorpay_order_id,
+        "razorpay_payment_id": payment_id,
+        "razorpay_signature": signature,
+        "orderId": order["orderId"]
+    })
+    await call("POST", "/api/payment/failed", {"orderId": cart["orderId"], "error": "budget check"})
+
+    await call("GET", "/api/health", query={"deep": "true"})
+    await call("GET", "/api/metrics")
+    await call("DELETE", f"/api/books/{book_id}")
+    return calls
+
+
+def unbudgeted_routes(app) -> list:
+    return sorted(
+        f"{','.join(sorted(route.methods))} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.path.startswith("/api")
+        and query_budget.route_budget(route) is None
+    )
+
+
+async def run(keep_db: bool) -> int:
+    if not settings.RAZORPAY_SECRET:
+        settings.RAZORPAY_SECRET = "query-budget-check"
+    payment_controller._razorpay_client = FakeRazorpay()
+
+    await database.connect_db()
+    db = database.get_database()
+    configure_store(db)
+    app = main.create_app()
+
+    try:
+        calls = await exercise(app)
+    finally:
+        if not keep_db:
+            await database.client.drop_database(settings.DATABASE_NAME)
+        await database.close_db()
+
+    print(f"\n{'request':<48} {'commands':>8}")
+    for method, path, response in calls:
+        print(f"{method + ' ' + path[:40]:<48} {response['headers'].get('x-mongo-commands', '?'):>8}")
+
+    failed = False
+    if query_budget.violations:
+        failed = True
+        print("\n❌ Routes over their query budget:")
+        for report in query_budget.violations:
+            print(query_budget.format_report(report))
+
+    missing = unbudgeted_routes(app)
+    if missing:
+        failed = True
+        print("\n❌ Routes without a declared query budget:")
+        for route in missing:
+            print(f"  {route}")
+
+    if not failed:
+        print("\n✅ Every route is within its query budget")
+    return 1 if failed else 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keep-db", action="store_true", help="keep the scratch database for inspection")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.keep_db)))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,67 @@
+"""
+Co-purchase table build time and lookup latency on synthetic order history
+
+Generates purchases with a skewed (Zipf-like) book popularity, builds the
+top-K table exactly as the refresher does, and times lookups. No database
+is needed.
+
+Usage (from the server directory):
+    python -m benchmarks.recommendations [--customers 50000] [--books 5000]
+        [--orders-per-customer 3] [--top-k 8]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from workers.recommendations import build_related_table
+
+
+def synthetic_purchases(customers: int, books: int, per_customer: int) -> list:
+    weights = [1 / (rank + 1) for rank in range(books)]
+    book_ids = [f"{i:024x}" for i in range(books)]
+    purchases = []
+    for customer in range(customers):
+        email = f"customer{customer}@example.com"
+        count = max(1, int(random.expovariate(1 / per_customer)))
+        for book_id in random.choices(book_ids, weights, k=count):
+            purchases.append((email, book_id))
+    return purchases
+
+
+def main(args) -> int:
+    random.seed(42)
+    purchases = synthetic_purchases(args.customers, args.books, args.orders_per_customer)
+    table = build_related_table(purchases, args.top_k)
+
+    probes = random.choices(table.book_ids, k=args.lookups)
+    timings = []
+    for book_id in probes:
+        started = time.perf_counter()
+        table.lookup(book_id)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    print(f"purchases         {len(purchases)}")
+    print(f"customers/books   {table.customers} / {len(table.book_ids)}")
+    print(f"build             {table.build_seconds}s (top {table.top_k})")
+    print(f"lookup median     {statistics.median(timings) * 1e6:.1f} µs")
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"lookup p99        {p99:.1f} µs")
+
+    if p99 >= 1000:
+        print("\n❌ Lookups are not sub-millisecond")
+        return 1
+    print("\n✅ Sub-millisecond lookups")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Co-purchase recommendations benchmark")
+    parser.add_argument("--customers", type=int, default=50000)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--orders-per-customer", type=float, default=3)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--lookups", type=int, default=100000)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,287 @@
+"""
+Replay captured production traffic and compare two builds
+
+Captures come from TrafficCaptureMiddleware (TRAFFIC_CAPTURE_ENABLED=true):
+NDJSON files of sanitized requests with their original timing.
+
+    run      re-issue a capture against a local stack, at the original
+             pace (--speed 1), scaled (--speed 2 = twice as fast) or as fast
+             as --concurrency allows (--speed 0); writes per-request latency,
+             status and Mongo command counts to a results file
+    compare  per-route latency distribution (p50/p95/p99) and Mongo
+             commands of two results files; exits 1 on a regression
+
+Mongo command counts come from the X-Mongo-Commands header, so start the
+target with QUERY_BUDGET_MODE=warn. The server counts each request's own
+commands (utils/query_budget.py), so the counts hold at any --concurrency.
+Builds from before per-request counting mixed in the commands of requests
+running alongside; replay those with --concurrency 1 to compare counts.
+Writes (checkouts) change the database,
+so restore the same snapshot before each build's run, e.g.:
+
+    python -m benchmarks.replay run traffic_capture/ --target http://localhost:5000 --out before.json
+    (switch build, restore the snapshot, restart)
+    python -m benchmarks.replay run traffic_capture/ --target http://localhost:5000 --out after.json
+    python -m benchmarks.replay compare before.json after.json
+
+Event streams are measured to their first event and then closed.
+"""
+import argparse
+import asyncio
+import glob
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from urllib.parse import urlsplit
+
+
+def load_capture(paths: List[str]) -> List[dict]:
+    """Capture records from files and/or directories, in original order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "traffic-*.ndjson")))
+        else:
+            files.extend(glob.glob(path))
+
+    entries = []
+    for name in files:
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    if not entry.get("bodyTruncated"):
+                        entries.append(entry)
+    entries.sort(key=lambda entry: entry["ts"])
+    return entries
+
+
+class Replayer:
+    """Issues requests from worker threads, one keep-alive connection per thread"""
+
+    def __init__(self, target: str, timeout: float):
+        url = urlsplit(target)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.https = url.scheme == "https"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or fresh:
+            if connection is not None:
+                connection.close()
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = cls(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def send(self, entry: dict) -> dict:
+        path = entry["path"] + (f"?{entry['query']}" if entry.get("query") else "")
+        body = json.dumps(entry["body"]).encode() if entry.get("body") is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if entry.get("stream"):
+            headers["Accept"] = "text/event-stream"
+
+        result = {"method": entry["method"], "route": entry.get("route") or entry["path"]}
+        started = time.perf_counter()
+        for attempt in range(2):
+            try:
+                connection = self._connection(fresh=attempt > 0)
+                connection.request(entry["method"], path, body=body, headers=headers)
+                response = connection.getresponse()
+                if entry.get("stream"):
+                    response.read1(1)  # first event, then hang up
+                    connection.close()
+                    self._local.connection = None
+                else:
+                    response.read()
+                result["status"] = response.status
+                mongo = response.getheader("X-Mongo-Commands")
+                result["mongo"] = int(mongo) if mongo is not None else None
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Stale keep-alive connection; retry once on a fresh one
+                if attempt:
+                    result["status"] = None
+                    result["error"] = "connection reset"
+            except Exception as e:
+                result["status"] = None
+                result["error"] = f"{type(e).__name__}: {e}"
+                self._local.connection = None
+                break
+        result["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+
+async def replay(entries: List[dict], replayer: Replayer, speed: float, concurrency: int) -> dict:
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    first_ts = entries[0]["ts"]
+    started = time.perf_counter()
+
+    async def issue(entry):
+        offset = (entry["ts"] - first_ts) / speed if speed > 0 else 0
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with semaphore:
+            # How far behind the capture's schedule the request went out
+            lag = max(0.0, time.perf_counter() - started - offset) if speed > 0 else 0.0
+            result = await loop.run_in_executor(executor, replayer.send, entry)
+        result["lagMs"] = round(lag * 1000, 3)
+        return result
+
+    try:
+        results = await asyncio.gather(*(issue(entry) for entry in entries))
+    finally:
+        executor.shutdown(wait=False)
+    return {"wallSeconds": round(time.perf_counter() - started, 3), "results": results}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def summarize(results: List[dict]) -> dict:
+    """Per "METHOD route": count, errors, latency percentiles and mean Mongo commands"""
+    groups = defaultdict(list)
+    for result in results:
+        groups[f"{result['method']} {result['route']}"].append(result)
+
+    summary = {}
+    for key, rows in groups.items():
+        latencies = [row["ms"] for row in rows]
+        mongo = [row["mongo"] for row in rows if row.get("mongo") is not None]
+        summary[key] = {
+            "count": len(rows),
+            "errors": sum(1 for row in rows if not row.get("status") or row["status"] >= 500),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mongo": round(sum(mongo) / len(mongo), 2) if mongo else None
+        }
+    return summary
+
+
+def print_summary(summary: dict):
+    print(f"{'route':<44} {'n':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mongo':>6}")
+    for key in sorted(summary):
+        row = summary[key]
+        mongo = "-" if row["mongo"] is None else f"{row['mongo']:.1f}"
+        print(f"{key:<44} {row['count']:>6} {row['errors']:>5} {row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f} {mongo:>6}")
+
+
+def cmd_run(args) -> int:
+    entries = load_capture(args.capture)
+    if args.read_only:
+        entries = [entry for entry in entries if entry["method"] == "GET"]
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print("❌ No captured requests found")
+        return 1
+
+    span = entries[-1]["ts"] - entries[0]["ts"]
+    pace = f"{args.speed}x ({span / args.speed:.1f}s)" if args.speed > 0 else "unpaced"
+    print(f"Replaying {len(entries)} requests captured over {span:.1f}s against {args.target}, {pace}")
+
+    run = asyncio.run(replay(entries, Replayer(args.target, args.timeout), args.speed, args.concurrency))
+    results = run["results"]
+    lags = [result["lagMs"] for result in results]
+    report = {
+        "label": args.label or os.path.basename(args.out),
+        "target": args.target,
+        "speed": args.speed,
+        "concurrency": args.concurrency,
+        "wallSeconds": run["wallSeconds"],
+        "lagP95Ms": percentile(lags, 95),
+        "summary": summarize(results),
+        "results": results
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+
+    print()
+    print_summary(report["summary"])
+    print(f"\nwall {report['wallSeconds']}s, schedule lag p95 {report['lagP95Ms']:.1f} ms -> {args.out}")
+    if report["lagP95Ms"] > 100:
+        print("⚠️  Requests went out late; raise --concurrency or lower --speed for a faithful pace")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"{'route':<44} {'n':>6} {'p50 ms':>17} {'p95 ms':>17} {'Δp95':>7} {'mongo':>11}")
+    regressions = []
+    for key in sorted(set(before["summary"]) | set(after["summary"])):
+        a, b = before["summary"].get(key), after["summary"].get(key)
+        if not a or not b:
+            print(f"{key:<44} only in {'after' if b else 'before'}")
+            continue
+
+        delta = (b["p95"] - a["p95"]) / a["p95"] if a["p95"] else 0.0
+        mongo = "-" if a["mongo"] is None or b["mongo"] is None else f"{a['mongo']:.1f}->{b['mongo']:.1f}"
+        flags = []
+        if min(a["count"], b["count"]) >= args.min_count and delta > args.threshold:
+            flags.append("latency")
+        if a["mongo"] is not None and b["mongo"] is not None and b["mongo"] > a["mongo"]:
+            flags.append("mongo")
+        if b["errors"] > a["errors"]:
+            flags.append("errors")
+        if flags:
+            regressions.append((key, flags))
+
+        print(
+            f"{key:<44} {b['count']:>6} {a['p50']:>8.1f}->{b['p50']:<8.1f} {a['p95']:>8.1f}->{b['p95']:<8.1f} "
+            f"{delta:>+7.0%} {mongo:>11} {' '.join('⚠️ ' + flag for flag in flags)}"
+        )
+
+    print(f"\n{before['label']} -> {after['label']}")
+    if before.get("concurrency") != after.get("concurrency"):
+        print(f"⚠️  Runs used different --concurrency ({before.get('concurrency')} vs {after.get('concurrency')})")
+    if regressions:
+        print(f"❌ {len(regressions)} routes regressed (p95 threshold {args.threshold:.0%})")
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare builds")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="replay a capture against a running server")
+    run.add_argument("capture", nargs="+", help="capture files or directories")
+    run.add_argument("--target", default="http://localhost:5000")
+    run.add_argument("--speed", type=float, default=1.0, help="time scale; 0 replays unpaced")
+    run.add_argument("--concurrency", type=int, default=64)
+    run.add_argument("--timeout", type=float, default=30)
+    run.add_argument("--read-only", action="store_true", help="replay GET requests only")
+    run.add_argument("--limit", type=int, default=None)
+    run.add_argument("--label", default=None)
+    run.add_argument("--out", default="replay-results.json")
+
+    compare = commands.add_parser("compare", help="compare two replay results files")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    compare.add_argument("--threshold", type=float, default=0.10, help="allowed p95 increase")
+    compare.add_argument("--min-count", type=int, default=20, help="requests needed to judge a route's latency")
+
+    args = parser.parse_args()
+    sys.exit(cmd_run(args) if args.command == "run" else cmd_compare(args))
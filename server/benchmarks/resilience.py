@@ -0,0 +1,182 @@
+"""
+Razorpay and SMTP resilience against slow local fake servers
+
+Starts an in-process fake Razorpay HTTP API (with adjustable latency) and a
+hung SMTP server, then drives the real client code paths
+(payment_controller.create_razorpay_order, send_order_confirmation_email)
+through these scenarios:
+
+    healthy     calls succeed, circuit stays closed
+    slow        calls are cut at the deadline until the circuit opens
+    open        further calls fail fast without reaching the server
+    recovery    after the cool-down one probe closes the circuit again
+    bulkhead    excess concurrent calls are rejected, the server never
+                sees more than the bulkhead size
+    smtp hung   mail sends time out, then fail fast once the circuit opens
+
+Short deadlines and cool-downs are used so the run takes a few seconds.
+
+Usage (from the server directory):
+    python -m benchmarks.resilience
+"""
+import asyncio
+import json
+import sys
+import time
+
+from config import settings
+
+settings.RAZORPAY_TIMEOUT_SECONDS = 0.3
+settings.RAZORPAY_MAX_CONCURRENCY = 4
+settings.RAZORPAY_BREAKER_FAILURES = 3
+settings.RAZORPAY_BREAKER_RESET_SECONDS = 1
+settings.EMAIL_TIMEOUT_SECONDS = 0.3
+settings.EMAIL_BREAKER_FAILURES = 2
+settings.DEPENDENCY_QUEUE_SECONDS = 0.05
+settings.EMAIL_USER = "shop@example.com"
+settings.EMAIL_PASSWORD = "secret"
+
+from fastapi import HTTPException  # noqa: E402
+
+from controllers import payment_controller  # noqa: E402
+from utils import email_service  # noqa: E402
+
+
+class FakeGateway:
+    """Minimal HTTP server answering every request with a Razorpay order after `delay`"""
+
+    def __init__(self):
+        self.delay = 0.0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode().split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":")[1])
+            await reader.readexactly(length)
+
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self.in_flight -= 1
+
+            body = json.dumps({"id": f"order_{self.requests}", "amount": 15000, "currency": "INR"}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+hung_connections = []
+
+
+async def hung_smtp(reader, writer):
+    """Accepts the connection and never sends the greeting"""
+    hung_connections.append(writer)
+
+
+async def timed(call) -> tuple:
+    started = time.perf_counter()
+    try:
+        await call()
+        outcome = "ok"
+    except HTTPException as e:
+        outcome = str(e.status_code)
+    except Exception as e:
+        outcome = type(e).__name__
+    return outcome, (time.perf_counter() - started) * 1000
+
+
+def create_order():
+    return payment_controller.create_razorpay_order({"amount": 15000, "currency": "INR", "receipt": "bench"})
+
+
+async def run() -> int:
+    import razorpay
+
+    gateway = FakeGateway()
+    http_server = await asyncio.start_server(gateway.handle, "127.0.0.1", 0)
+    smtp_server = await asyncio.start_server(hung_smtp, "127.0.0.1", 0)
+    port = http_server.sockets[0].getsockname()[1]
+    payment_controller._razorpay_client = razorpay.Client(
+        auth=("rzp_test", "secret"), base_url=f"http://127.0.0.1:{port}/v1"
+    )
+    settings.EMAIL_HOST = "127.0.0.1"
+    settings.EMAIL_PORT = smtp_server.sockets[0].getsockname()[1]
+    breaker = payment_controller.razorpay_gateway
+    failures = []
+
+    def check(name: str, ok: bool, detail: str):
+        print(f"{'✅' if ok else '❌'} {name:<10} {detail}")
+        if not ok:
+            failures.append(name)
+
+    # healthy
+    gateway.delay = 0.01
+    results = [await timed(create_order) for _ in range(5)]
+    check("healthy", all(outcome == "ok" for outcome, _ in results) and breaker.state == "closed",
+          f"{[outcome for outcome, _ in results]} state={breaker.state}")
+
+    # slow: each call is cut at the deadline until the breaker opens
+    gateway.delay = 2
+    results = [await timed(create_order) for _ in range(settings.RAZORPAY_BREAKER_FAILURES)]
+    slowest = max(ms for _, ms in results)
+    check("slow", all(outcome == "503" for outcome, _ in results) and slowest < 600 and breaker.state == "open",
+          f"{len(results)} calls cut at ~{slowest:.0f} ms, state={breaker.state}")
+
+    # open: fail fast without touching the server
+    seen = gateway.requests
+    results = [await timed(create_order) for _ in range(50)]
+    slowest = max(ms for _, ms in results)
+    check("open", all(outcome == "503" for outcome, _ in results) and gateway.requests == seen and slowest < 5,
+          f"50 calls rejected in <= {slowest:.2f} ms, {gateway.requests - seen} reached the server")
+
+    # recovery: after the cool-down a single probe goes through and closes the circuit
+    gateway.delay = 0.1
+    await asyncio.sleep(settings.RAZORPAY_BREAKER_RESET_SECONDS)
+    results = await asyncio.gather(*(timed(create_order) for _ in range(5)))
+    outcomes = sorted(outcome for outcome, _ in results)
+    check("recovery", outcomes == ["503"] * 4 + ["ok"] and breaker.state == "closed",
+          f"probe + 4 rejected while half-open: {outcomes}, state={breaker.state}")
+
+    # bulkhead: never more than RAZORPAY_MAX_CONCURRENCY calls reach the server
+    gateway.delay = 0.2
+    while gateway.in_flight:
+        # Let the server finish requests the slow phase abandoned
+        await asyncio.sleep(0.05)
+    gateway.max_in_flight = 0
+    results = await asyncio.gather(*(timed(create_order) for _ in range(12)))
+    served = sum(1 for outcome, _ in results if outcome == "ok")
+    check("bulkhead", gateway.max_in_flight <= settings.RAZORPAY_MAX_CONCURRENCY and served == settings.RAZORPAY_MAX_CONCURRENCY,
+          f"{served} served, {12 - served} rejected, max {gateway.max_in_flight} at the server")
+
+    # smtp hung: sends time out, then the circuit opens and they fail fast
+    order = {"orderId": "ORDBENCH", "userDetails": {"email": "reader@example.com"}, "bookId": {"title": "Bench"}}
+    results = [await timed(lambda: email_service.send_order_confirmation_email(order)) for _ in range(4)]
+    check("smtp hung", email_service.smtp.state == "open" and results[-1][1] < 5,
+          f"{[f'{ms:.0f} ms' for _, ms in results]} state={email_service.smtp.state}")
+
+    print(f"\nrazorpay {breaker.stats()}\nsmtp     {email_service.smtp.stats()}")
+
+    for writer in hung_connections:
+        writer.close()
+    http_server.close()
+    smtp_server.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,100 @@
+"""
+Cold-start benchmark for the FastAPI app
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and breaks
+the import cost down by top-level package, so regressions such as an eager
+razorpay/aiosmtplib import show up immediately.
+
+Usage (from the server directory):
+    python -m benchmarks.startup [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that must stay off the import path of `main`
+LAZY_PACKAGES = ("razorpay", "requests", "aiosmtplib", "email.mime", "numpy", "scipy")
+
+
+def run_once():
+    """Import `main` in a fresh interpreter; return wall time and importtime rows"""
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SERVER_DIR,
+        capture_output=True,
+        text=True
+    )
+    wall = time.perf_counter() - started
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return wall, rows
+
+
+def breakdown(rows):
+    """Self time summed per top-level package"""
+    totals = defaultdict(int)
+    for self_us, _, name in rows:
+        totals[name.strip().split(".")[0]] += self_us
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    walls = []
+    per_package = defaultdict(list)
+    last_rows = []
+
+    for _ in range(args.runs):
+        wall, rows = run_once()
+        walls.append(wall)
+        for package, self_us in breakdown(rows).items():
+            per_package[package].append(self_us)
+        last_rows = rows
+
+    total_import_us = sum(self_us for self_us, _, _ in last_rows)
+
+    print("=" * 50)
+    print(f"Cold start: import main ({args.runs} runs)")
+    print("=" * 50)
+    print(f"Interpreter + import wall time: median {statistics.median(walls) * 1000:.1f} ms, "
+          f"min {min(walls) * 1000:.1f} ms")
+    print(f"Import time (last run): {total_import_us / 1000:.1f} ms across {len(last_rows)} modules")
+    print()
+    print(f"{'package':<28}{'median ms':>12}{'share':>10}")
+
+    medians = {package: statistics.median(values) for package, values in per_package.items()}
+    for package, self_us in sorted(medians.items(), key=lambda item: -item[1])[: args.top]:
+        share = self_us / total_import_us * 100 if total_import_us else 0
+        print(f"{package:<28}{self_us / 1000:>12.1f}{share:>9.1f}%")
+
+    imported = {name.strip() for _, _, name in last_rows}
+    eager = [pkg for pkg in LAZY_PACKAGES if pkg in imported]
+    print()
+    if eager:
+        print(f"❌ Eagerly imported at startup: {', '.join(eager)}")
+        sys.exit(1)
+    print("✅ Payment, email and recommendation dependencies are not imported at startup")
+
+
+if __name__ == "__main__":
+    main()
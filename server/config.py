@@ -3,6 +3,7 @@ Configuration settings for the FastAPI application
 """
 import os
 from typing import Optional
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -23,17 +24,146 @@ class Settings(BaseSettings):
     # Razorpay settings
     RAZORPAY_KEY_ID: Optional[str] = os.getenv("RAZORPAY_KEY_ID")
     RAZORPAY_SECRET: Optional[str] = os.getenv("RAZORPAY_SECRET")
+    # Deadline per call, concurrent calls, consecutive failures that open the circuit, cool-down
+    RAZORPAY_TIMEOUT_SECONDS: float = float(os.getenv("RAZORPAY_TIMEOUT_SECONDS", 8))
+    RAZORPAY_MAX_CONCURRENCY: int = int(os.getenv("RAZORPAY_MAX_CONCURRENCY", 16))
+    RAZORPAY_BREAKER_FAILURES: int = int(os.getenv("RAZORPAY_BREAKER_FAILURES", 5))
+    RAZORPAY_BREAKER_RESET_SECONDS: float = float(os.getenv("RAZORPAY_BREAKER_RESET_SECONDS", 30))
     
     # Email settings
     EMAIL_HOST: str = os.getenv("EMAIL_HOST", "smtp.gmail.com")
     EMAIL_PORT: int = int(os.getenv("EMAIL_PORT", 587))
     EMAIL_USER: Optional[str] = os.getenv("EMAIL_USER")
     EMAIL_PASSWORD: Optional[str] = os.getenv("EMAIL_PASSWORD")
+    EMAIL_TIMEOUT_SECONDS: float = float(os.getenv("EMAIL_TIMEOUT_SECONDS", 10))
+    EMAIL_MAX_CONCURRENCY: int = int(os.getenv("EMAIL_MAX_CONCURRENCY", 4))
+    EMAIL_BREAKER_FAILURES: int = int(os.getenv("EMAIL_BREAKER_FAILURES", 3))
+    EMAIL_BREAKER_RESET_SECONDS: float = float(os.getenv("EMAIL_BREAKER_RESET_SECONDS", 60))
+    # How long a call may queue for a free slot before it is rejected
+    DEPENDENCY_QUEUE_SECONDS: float = float(os.getenv("DEPENDENCY_QUEUE_SECONDS", 0.5))
     
     # CORS settings
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:5173")
     NODE_ENV: str = os.getenv("NODE_ENV", "development")
     
+    # Rate limiting / admission control
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_STORE: str = os.getenv("RATE_LIMIT_STORE", "memory")  # memory | mongo
+    # Reverse proxies in front of the app that append to X-Forwarded-For (Render: 1)
+    RATE_LIMIT_TRUSTED_PROXIES: int = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", 0))
+    RATE_LIMIT_IP_RATE: float = float(os.getenv("RATE_LIMIT_IP_RATE", 1))  # tokens per second
+    RATE_LIMIT_IP_BURST: int = int(os.getenv("RATE_LIMIT_IP_BURST", 10))
+    RATE_LIMIT_GLOBAL_RATE: float = float(os.getenv("RATE_LIMIT_GLOBAL_RATE", 50))
+    RATE_LIMIT_GLOBAL_BURST: int = int(os.getenv("RATE_LIMIT_GLOBAL_BURST", 100))
+    ROUTE_GROUP_MAX_CONCURRENCY: int = int(os.getenv("ROUTE_GROUP_MAX_CONCURRENCY", 32))
+    
+    # Read coalescing micro-cache TTLs in seconds (0 disables caching)
+    BOOK_CACHE_TTL: float = float(os.getenv("BOOK_CACHE_TTL", 1))
+    ORDER_CACHE_TTL: float = float(os.getenv("ORDER_CACHE_TTL", 0))
+    BOOKS_BATCH_MAX: int = int(os.getenv("BOOKS_BATCH_MAX", 100))
+    BOOK_FACETS_TTL: float = float(os.getenv("BOOK_FACETS_TTL", 10))
+    
+    # Books listing facets: price bucket lower bounds and how many authors to count
+    BOOK_PRICE_BUCKETS: str = os.getenv("BOOK_PRICE_BUCKETS", "0,200,500,1000,2000")
+    BOOK_FACET_AUTHORS: int = int(os.getenv("BOOK_FACET_AUTHORS", 20))
+    
+    # Book cover image proxy
+    IMAGE_CACHE_DIR: str = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    IMAGE_WIDTHS: str = os.getenv("IMAGE_WIDTHS", "80,160,320,480,640,960")
+    IMAGE_QUALITY: int = int(os.getenv("IMAGE_QUALITY", 80))
+    IMAGE_FETCH_TIMEOUT: float = float(os.getenv("IMAGE_FETCH_TIMEOUT", 10))
+    IMAGE_MAX_SOURCE_BYTES: int = int(os.getenv("IMAGE_MAX_SOURCE_BYTES", 10 * 1024 * 1024))
+    IMAGE_ALLOW_LOCAL_SOURCES: bool = os.getenv("IMAGE_ALLOW_LOCAL_SOURCES", "false").lower() == "true"
+    
+    # Single-origin mode: serve the built frontend from this server
+    SERVE_FRONTEND: bool = os.getenv("SERVE_FRONTEND", "false").lower() == "true"
+    FRONTEND_DIST_DIR: str = os.getenv(
+        "FRONTEND_DIST_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dist")
+    )
+    FRONTEND_CATALOG_REFRESH_SECONDS: int = int(os.getenv("FRONTEND_CATALOG_REFRESH_SECONDS", 60))
+    
+    # Event-loop lag monitoring (stack capture of blocking callbacks in debug)
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.5))
+    LOOP_STALL_THRESHOLD_MS: int = int(os.getenv("LOOP_STALL_THRESHOLD_MS", 100))
+    LOOP_STALL_CAPTURE: bool = os.getenv(
+        "LOOP_STALL_CAPTURE", str(os.getenv("NODE_ENV") != "production")
+    ).lower() == "true"
+    
+    # Mongo commands per request vs. each route's declared budget: off | warn | strict
+    QUERY_BUDGET_MODE: str = os.getenv("QUERY_BUDGET_MODE", "off")
+    
+    # Reconciliation of pending orders against Razorpay (also: python -m workers.reconciliation)
+    RECONCILE_ENABLED: bool = os.getenv("RECONCILE_ENABLED", "true").lower() == "true"
+    RECONCILE_INTERVAL_SECONDS: int = int(os.getenv("RECONCILE_INTERVAL_SECONDS", 300))
+    RECONCILE_GRACE_MINUTES: int = int(os.getenv("RECONCILE_GRACE_MINUTES", 15))
+    RECONCILE_LOOKBACK_HOURS: int = int(os.getenv("RECONCILE_LOOKBACK_HOURS", 72))  # late captures on expired orders
+    RECONCILE_CONCURRENCY: int = int(os.getenv("RECONCILE_CONCURRENCY", 8))
+    RECONCILE_RATE: float = float(os.getenv("RECONCILE_RATE", 20))  # gateway lookups per second
+    RECONCILE_BATCH_SIZE: int = int(os.getenv("RECONCILE_BATCH_SIZE", 200))
+    
+    # Order status SSE stream: memory (single worker) | changestream (replica set)
+    ORDER_EVENTS_BACKEND: str = os.getenv("ORDER_EVENTS_BACKEND", "memory")
+    ORDER_EVENTS_HEARTBEAT_SECONDS: int = int(os.getenv("ORDER_EVENTS_HEARTBEAT_SECONDS", 15))
+    ORDER_EVENTS_MAX_SECONDS: int = int(os.getenv("ORDER_EVENTS_MAX_SECONDS", 1800))
+    ORDER_EVENTS_RETRY_MS: int = int(os.getenv("ORDER_EVENTS_RETRY_MS", 3000))
+    
+    # Flash sales: books flagged flash_sale are reserved from per-worker leased stock
+    FLASH_SALE_ENABLED: bool = os.getenv("FLASH_SALE_ENABLED", "true").lower() == "true"
+    FLASH_SALE_LEASE_BLOCK: int = int(os.getenv("FLASH_SALE_LEASE_BLOCK", 25))
+    FLASH_SALE_FLUSH_SECONDS: float = float(os.getenv("FLASH_SALE_FLUSH_SECONDS", 2))
+    FLASH_SALE_IDLE_SECONDS: float = float(os.getenv("FLASH_SALE_IDLE_SECONDS", 30))
+    
+    # "Customers also bought": co-purchase table rebuilt from paid orders (needs numpy + scipy)
+    RECOMMENDATIONS_ENABLED: bool = os.getenv("RECOMMENDATIONS_ENABLED", "true").lower() == "true"
+    RECOMMENDATIONS_TOP_K: int = int(os.getenv("RECOMMENDATIONS_TOP_K", 8))
+    RECOMMENDATIONS_REFRESH_SECONDS: int = int(os.getenv("RECOMMENDATIONS_REFRESH_SECONDS", 3600))
+    
+    # Archive of old paid orders into monthly orders_archive_YYYYMM collections (also: python -m workers.order_archive)
+    ORDER_ARCHIVE_ENABLED: bool = os.getenv("ORDER_ARCHIVE_ENABLED", "false").lower() == "true"
+    ORDER_ARCHIVE_AFTER_DAYS: int = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", 180))
+    ORDER_ARCHIVE_INTERVAL_SECONDS: int = int(os.getenv("ORDER_ARCHIVE_INTERVAL_SECONDS", 6 * 3600))
+    ORDER_ARCHIVE_BATCH_SIZE: int = int(os.getenv("ORDER_ARCHIVE_BATCH_SIZE", 500))
+    ORDER_ARCHIVE_COMPRESSOR: str = os.getenv("ORDER_ARCHIVE_COMPRESSOR", "zstd")  # "" for the server default
+    # Newest-first order listings read at most this many archive months per page
+    ORDER_HISTORY_ARCHIVE_MONTHS: int = int(os.getenv("ORDER_HISTORY_ARCHIVE_MONTHS", 2))
+    # How long the list of archive collections is cached (the archiver refreshes it in-process)
+    ORDER_ARCHIVE_NAMES_TTL: float = float(os.getenv("ORDER_ARCHIVE_NAMES_TTL", 60))
+    
+    # Traffic capture for replay (python -m benchmarks.replay); customer and payment data redacted
+    TRAFFIC_CAPTURE_ENABLED: bool = os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() == "true"
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", 1))
+    TRAFFIC_CAPTURE_DIR: str = os.getenv("TRAFFIC_CAPTURE_DIR", "traffic_capture")
+    TRAFFIC_CAPTURE_MAX_FILE_BYTES: int = int(os.getenv("TRAFFIC_CAPTURE_MAX_FILE_BYTES", 50 * 1024 * 1024))
+    TRAFFIC_CAPTURE_MAX_FILES: int = int(os.getenv("TRAFFIC_CAPTURE_MAX_FILES", 20))
+    
+    # Delivery quotes: pincode prefix rate table, hot-reloaded when the file changes
+    DELIVERY_RATES_FILE: str = os.getenv(
+        "DELIVERY_RATES_FILE",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "delivery_rates.csv")
+    )
+    DELIVERY_RATES_RELOAD_SECONDS: int = int(os.getenv("DELIVERY_RATES_RELOAD_SECONDS", 30))
+    DELIVERY_DEFAULT_CHARGE: float = float(os.getenv("DELIVERY_DEFAULT_CHARGE", 50))
+    DELIVERY_DEFAULT_MIN_DAYS: int = int(os.getenv("DELIVERY_DEFAULT_MIN_DAYS", 5))
+    DELIVERY_DEFAULT_MAX_DAYS: int = int(os.getenv("DELIVERY_DEFAULT_MAX_DAYS", 7))
+    
+    # Abandoned pending order expiry
+    ORDER_EXPIRY_ENABLED: bool = os.getenv("ORDER_EXPIRY_ENABLED", "true").lower() == "true"
+    PENDING_ORDER_TTL_MINUTES: int = int(os.getenv("PENDING_ORDER_TTL_MINUTES", 30))
+    ORDER_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("ORDER_SWEEP_INTERVAL_SECONDS", 60))
+    ORDER_SWEEP_BATCH_SIZE: int = int(os.getenv("ORDER_SWEEP_BATCH_SIZE", 500))
+    
+    @field_validator("BOOK_PRICE_BUCKETS")
+    @classmethod
+    def check_price_buckets(cls, value: str) -> str:
+        # $bucket needs at least two ascending boundaries
+        bounds = [float(bound) for bound in value.split(",") if bound.strip()]
+        if len(bounds) < 2 or bounds != sorted(set(bounds)):
+            raise ValueError("BOOK_PRICE_BUCKETS needs at least 2 ascending boundaries, e.g. 0,200,500")
+        return value
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
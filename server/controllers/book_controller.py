@@ -1,16 +1,185 @@
+import asyncio
 from fastapi import HTTPException
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple
 
 from database import get_database
-from models.book import Book, BookCreate, BookUpdate
+from models.book import Availability, Book, BookCreate, BookQuery, BookSort, BookUpdate, StockAdjustment
+from utils.metrics import metrics
+from utils.related_books import RelatedTable
+from utils.single_flight import SingleFlight
+from config import settings
 
-async def get_all_books() -> List[Book]:
-    """Get all books with stock > 0"""
+# Coalesces concurrent lookups of the same book into one find_one
+book_lookups = SingleFlight("books", ttl=settings.BOOK_CACHE_TTL)
+# Listing facet counts keyed on the normalized filter (see search_books)
+book_facets = SingleFlight("books.facets", ttl=settings.BOOK_FACETS_TTL, max_entries=1_000)
+
+# "Customers also bought"; swapped wholesale on refresh
+_related = RelatedTable.empty()
+metrics.register("books.related", lambda: _related.stats())
+
+# Sort orders; each ends in _id so pages are stable, and each has a matching index
+SORTS = {
+    BookSort.NEWEST: {"created_at": -1, "_id": -1},
+    BookSort.PRICE_ASC: {"price": 1, "_id": 1},
+    BookSort.PRICE_DESC: {"price": -1, "_id": -1},
+    BookSort.TITLE: {"title": 1, "_id": 1},
+}
+
+IN_STOCK = {"$or": [{"stock": {"$gt": 0}}, {"leased": {"$gt": 0}}]}
+OUT_OF_STOCK = {"stock": {"$lte": 0}, "leased": {"$not": {"$gt": 0}}}
+
+# Per-worker lease bookkeeping (host names, pids) and the last bulk stock
+# batch tag never leave the server
+HIDDEN_BOOK_FIELDS = ("leases", "stockBatch")
+
+def book_projection() -> dict:
+    # A new dict per query: drivers may add `_id` to the projection they are given
+    return {field: 0 for field in HIDDEN_BOOK_FIELDS}
+
+def for_sale(book: Optional[dict]) -> Optional[dict]:
+    """Units leased to workers are still for sale (settled within a flush interval)"""
+    if book and book.get("leased"):
+        return {**book, "stock": book.get("stock", 0) + book["leased"]}
+    return book
+
+def price_buckets() -> List[float]:
+    return [float(bound) for bound in settings.BOOK_PRICE_BUCKETS.split(",") if bound.strip()]
+
+def build_match(query: BookQuery, without: Tuple[str, ...] = ()) -> dict:
+    """
+    Mongo filter for the listing filters (sort and page excluded).
+    
+    Filters named in `without` ("author", "price") are left out, for
+    counting that facet's other choices.
+    """
+    match = {}
+    authors = sorted(set(query.authors)) if "author" not in without else []
+    if len(authors) == 1:
+        match["author"] = authors[0]
+    elif authors:
+        match["author"] = {"$in": authors}
+    
+    price = {}
+    if query.min_price is not None:
+        price["$gte"] = query.min_price
+    if query.max_price is not None:
+        price["$lte"] = query.max_price
+    if price and "price" not in without:
+        match["price"] = price
+    
+    if query.availability == Availability.IN_STOCK:
+        match.update(IN_STOCK)
+    elif query.availability == Availability.OUT_OF_STOCK:
+        match.update(OUT_OF_STOCK)
+    return match
+
+def _narrow(match: dict, within: dict) -> List[dict]:
+    """$match stage narrowing documents that already passed `within` to `match`"""
+    rest = {key: value for key, value in match.items() if within.get(key) != value}
+    return [{"$match": rest}] if rest else []
+
+def _facet_stages(query: BookQuery, within: dict) -> dict:
+    """
+    Facets over documents matching `within` (the filters all facets share).
+    
+    The total counts the full filter; the author and price facets each drop
+    their own filter, so the other authors and price ranges still show how
+    many books selecting them would give.
+    """
+    buckets = price_buckets()
+    return {
+        "total": [*_narrow(build_match(query), within), {"$count": "count"}],
+        "authors": [
+            *_narrow(build_match(query, without=("author",)), within),
+            {"$group": {"_id": "$author", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": settings.BOOK_FACET_AUTHORS}
+        ],
+        "prices": [
+            *_narrow(build_match(query, without=("price",)), within),
+            # Prices at or above the last boundary land in the last bucket
+            {"$bucket": {
+                "groupBy": "$price",
+                "boundaries": buckets,
+                "default": buckets[-1],
+                "output": {"count": {"$sum": 1}}
+            }}
+        ]
+    }
+
+def facet_pipeline(query: BookQuery, skip: int = 0) -> List[dict]:
+    """One page of results plus facet counts, as one aggregation"""
+    # Start from the filters every facet shares; each branch narrows from there
+    shared = build_match(query, without=("author", "price"))
+    return [
+        {"$match": shared},
+        {"$sort": SORTS[query.sort]},
+        {"$facet": {
+            "results": [
+                *_narrow(build_match(query), shared),
+                {"$skip": skip}, {"$limit": query.limit}, {"$project": book_projection()}
+            ],
+            **_facet_stages(query, shared)
+        }}
+    ]
+
+def _format_facets(raw: dict) -> dict:
+    buckets = price_buckets()
+    counts = {bucket["_id"]: bucket["count"] for bucket in raw["prices"]}
+    return {
+        "total": raw["total"][0]["count"] if raw["total"] else 0,
+        "authors": [{"author": row["_id"], "count": row["count"]} for row in raw["authors"]],
+        "price": [
+            {
+                "min": low,
+                "max": buckets[index + 1] if index + 1 < len(buckets) else None,
+                "count": counts.get(low, 0)
+            }
+            for index, low in enumerate(buckets)
+        ]
+    }
+
+async def search_books(query: BookQuery, with_facets: bool = True) -> dict:
+    """
+    One page of the filtered, sorted listing, plus facet counts.
+    
+    Facet counts (total, authors, price buckets) depend only on the filters,
+    so they are cached for BOOK_FACETS_TTL seconds under the normalized
+    filter. A miss runs results and counts as one $facet aggregation; a hit
+    (or with_facets=False) only fetches the page. Either way it is one query.
+    """
+    if query.min_price is not None and query.max_price is not None and query.min_price > query.max_price:
+        raise HTTPException(status_code=400, detail="minPrice must not exceed maxPrice")
+    
     db = get_database()
-    books = await db.books.find({"stock": {"$gt": 0}}).sort("created_at", -1).to_list(100)
-    return books
+    match = build_match(query)
+    sort = SORTS[query.sort]
+    skip = (query.page - 1) * query.limit
+    
+    key = query.filter_key()
+    facets = book_facets.get_cached(key) if with_facets else None
+    
+    if with_facets:
+        metrics.inc("books.facets.hits" if facets is not None else "books.facets.misses")
+    
+    if with_facets and facets is None:
+        raw = (await db.books.aggregate(facet_pipeline(query, skip)).to_list(1))[0]
+        books = raw["results"]
+        facets = _format_facets(raw)
+        book_facets.prime(key, facets)
+    else:
+        books = await db.books.find(match, book_projection()).sort(list(sort.items())).skip(skip).limit(query.limit).to_list(query.limit)
+    
+    return {"books": [for_sale(book) for book in books], "facets": facets}
+
+async def get_all_books() -> List[Book]:
+    """Get all books with stock > 0 (including stock leased to flash-sale pools), newest first"""
+    return (await search_books(BookQuery(), with_facets=False))["books"]
 
 async def get_book_by_id(book_id: str) -> Book:
     """Get a single book by ID"""
@@ -18,13 +187,102 @@ async def get_book_by_id(book_id: str) -> Book:
         raise HTTPException(status_code=400, detail="Invalid book ID")
     
     db = get_database()
-    book = await db.books.find_one({"_id": ObjectId(book_id)})
+    
+    async def load():
+        return for_sale(await db.books.find_one({"_id": ObjectId(book_id)}, book_projection()))
+    
+    book = await book_lookups.do(book_id, load)
     
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     
     return book
 
+async def get_books_by_ids(book_ids: List[str]) -> List[Optional[Book]]:
+    """
+    Resolve many book IDs at once, in request order (None where not found).
+    
+    Fresh entries come from the lookup micro-cache; the rest are fetched
+    with a single $in query and primed into the cache.
+    """
+    if len(book_ids) > settings.BOOKS_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BOOKS_BATCH_MAX} book IDs per request"
+        )
+    
+    invalid = [book_id for book_id in book_ids if not ObjectId.is_valid(book_id)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid book ID: {', '.join(invalid)}")
+    
+    found = {}
+    missing = []
+    for book_id in dict.fromkeys(book_ids):
+        cached = book_lookups.get_cached(book_id)
+        if cached is not None:
+            found[book_id] = cached
+        else:
+            missing.append(book_id)
+    
+    if missing:
+        db = get_database()
+        books = await db.books.find(
+            {"_id": {"$in": [ObjectId(book_id) for book_id in missing]}}, book_projection()
+        ).to_list(len(missing))
+        for book in map(for_sale, books):
+            book_id = str(book["_id"])
+            found[book_id] = book
+            book_lookups.prime(book_id, book)
+    
+    return [found.get(book_id) for book_id in book_ids]
+
+async def get_related_books(book_id: str, limit: int) -> List[dict]:
+    """
+    Books most often bought together with `book_id`.
+    
+    Neighbours come from the precomputed table; the book documents are
+    resolved through the lookup micro-cache (at most one $in query).
+    """
+    if not ObjectId.is_valid(book_id):
+        raise HTTPException(status_code=400, detail="Invalid book ID")
+    
+    related = _related.lookup(book_id, limit)
+    if not related:
+        return []
+    
+    books = await get_books_by_ids([related_id for related_id, _ in related])
+    return [
+        {**book, "boughtTogether": count}
+        for book, (_, count) in zip(books, related)
+        if book is not None
+    ]
+
+async def refresh_related_books() -> RelatedTable:
+    """Rebuild the co-purchase table from paid orders and swap it in"""
+    global _related
+    from workers.recommendations import build_from_orders
+    
+    _related = await build_from_orders(get_database())
+    metrics.inc("books.related.refreshes")
+    return _related
+
+async def run_related_books_refresher():
+    """Build on startup, then every RECOMMENDATIONS_REFRESH_SECONDS; started from the app lifespan"""
+    while True:
+        try:
+            table = await refresh_related_books()
+            print(f"📚 Related books built for {len(table.book_ids)} books in {table.build_seconds}s")
+        except asyncio.CancelledError:
+            raise
+        except ImportError as e:
+            print(f"⚠️ Related books disabled, install numpy and scipy: {e}")
+            return
+        except Exception as e:
+            # Keep serving the previous table
+            metrics.inc("books.related.refreshErrors")
+            print(f"❌ Related books refresh failed: {e}")
+        await asyncio.sleep(settings.RECOMMENDATIONS_REFRESH_SECONDS)
+
 async def create_book(book_data: BookCreate) -> Book:
     """Create a new book"""
     db = get_database()
@@ -34,7 +292,8 @@ async def create_book(book_data: BookCreate) -> Book:
     book_dict["updated_at"] = datetime.utcnow()
     
     result = await db.books.insert_one(book_dict)
-    created_book = await db.books.find_one({"_id": result.inserted_id})
+    created_book = await db.books.find_one({"_id": result.inserted_id}, book_projection())
+    book_facets.clear()
     
     return created_book
 
@@ -60,9 +319,83 @@ async def update_book(book_id: str, book_data: BookUpdate) -> Book:
             {"$set": update_data}
         )
     
-    updated_book = await db.books.find_one({"_id": ObjectId(book_id)})
+    updated_book = await db.books.find_one({"_id": ObjectId(book_id)}, book_projection())
+    book_lookups.invalidate(book_id)
+    book_facets.clear()
     return updated_book
 
+async def bulk_adjust_stock(updates: List[StockAdjustment]) -> dict:
+    """
+    Apply many stock changes in one unordered bulk_write.
+    
+    Decrements only match while the result stays non-negative and nothing
+    upserts, so a row that matched no book changed nothing. Each write tags
+    the book with the batch id; when fewer rows matched than were sent, one
+    read of the batch's books tells a missing book (not_found) from a
+    refused decrement (insufficient_stock).
+    """
+    results = [{"id": update.id, "status": "ok"} for update in updates]
+    
+    batch = ObjectId()
+    stamp = {"updated_at": datetime.utcnow(), "stockBatch": batch}
+    ops = []
+    op_rows = []
+    for index, (row, update) in enumerate(zip(results, updates)):
+        if not ObjectId.is_valid(update.id):
+            row["status"] = "invalid_id"
+            continue
+        book_id = ObjectId(update.id)
+        
+        if update.set_ is not None:
+            ops.append(UpdateOne({"_id": book_id}, {"$set": {"stock": update.set_, **stamp}}))
+        elif update.delta < 0:
+            ops.append(UpdateOne(
+                {"_id": book_id, "stock": {"$gte": -update.delta}},
+                {"$inc": {"stock": update.delta}, "$set": stamp}
+            ))
+        else:
+            ops.append(UpdateOne({"_id": book_id}, {"$inc": {"stock": update.delta}, "$set": stamp}))
+        op_rows.append(index)
+    
+    modified = 0
+    if ops:
+        db = get_database()
+        try:
+            result = await db.books.bulk_write(ops, ordered=False)
+            matched, modified = result.matched_count, result.modified_count
+        except BulkWriteError as e:
+            matched, modified = e.details.get("nMatched", 0), e.details.get("nModified", 0)
+            for error in e.details["writeErrors"]:
+                results[op_rows[error["index"]]]["status"] = "error"
+        
+        pending = [results[index] for index in op_rows if results[index]["status"] == "ok"]
+        if matched < len(pending):
+            books = await db.books.find(
+                {"_id": {"$in": [ObjectId(row["id"]) for row in pending]}},
+                {"stockBatch": 1}
+            ).to_list(len(pending))
+            tags = {book["_id"]: book.get("stockBatch") for book in books}
+            for row in pending:
+                book_id = ObjectId(row["id"])
+                if book_id not in tags:
+                    row["status"] = "not_found"
+                elif tags[book_id] != batch:
+                    row["status"] = "insufficient_stock"
+        
+        # One invalidation for the whole batch instead of one per title
+        invalidate_catalog_cache()
+    
+    return {
+        "applied": sum(1 for row in results if row["status"] == "ok"),
+        "modified": modified,
+        "results": results
+    }
+
+def invalidate_catalog_cache():
+    """Drop every cached book and facet count so readers see fresh stock"""
+    book_lookups.clear()
+    book_facets.clear()
+
 async def delete_book(book_id: str) -> bool:
     """Delete a book"""
     if not ObjectId.is_valid(book_id):
@@ -71,6 +404,8 @@ async def delete_book(book_id: str) -> bool:
     db = get_database()
     
     result = await db.books.delete_one({"_id": ObjectId(book_id)})
+    book_lookups.invalidate(book_id)
+    book_facets.clear()
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Book not found")
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime
+
+from database import get_database
+from models.order import CartOrderCreate, PaymentStatus
+from controllers.order_controller import prepare_cart_order, release_cart_reservation
+from controllers.payment_controller import create_razorpay_order
+from utils.metrics import metrics
+from config import settings
+
+async def _give_back(db, order_dict: dict, pooled: list, inserted, status: PaymentStatus):
+    """Return the reservation and, if the order was inserted, close it with `status`"""
+    metrics.inc("checkout.failures")
+    await release_cart_reservation(db, order_dict, pooled)
+    if isinstance(inserted, BaseException):
+        return
+    # Nobody has seen this order yet; keep it for the record but not its stock
+    now = datetime.utcnow()
+    fields = {"paymentStatus": status.value, "stockReleased": True, "updatedAt": now}
+    if status == PaymentStatus.EXPIRED:
+        fields["expiredAt"] = now
+    await db.orders.update_one({"_id": inserted.inserted_id}, {"$set": fields})
+
+async def checkout(order_data: CartOrderCreate) -> dict:
+    """
+    Create the order and its Razorpay order in one call.
+
+    Stock is reserved first, then the order insert and the gateway call run
+    concurrently; the gateway receipt is our own orderId, so neither has to
+    wait for the other. If either side fails the reservation is given back
+    (and an inserted order is marked Failed) before the error is raised. If
+    the request is cancelled meanwhile, both calls are still awaited and the
+    reservation given back (the order marked Expired) before re-raising.
+    """
+    db = get_database()
+    order_dict, pooled = await prepare_cart_order(db, order_data)
+    order_id = order_dict["orderId"]
+
+    calls = asyncio.gather(
+        db.orders.insert_one(order_dict),
+        create_razorpay_order({
+            "amount": int(order_dict["totalAmount"] * 100),  # Amount in paise
+            "currency": "INR",
+            "receipt": order_id,
+            "notes": {
+                "orderId": order_id,
+                "bookTitle": ", ".join(item["title"] for item in order_dict["items"])[:250]
+            }
+        }),
+        return_exceptions=True
+    )
+
+    async def abandon():
+        # The insert may still land after a cancellation; wait for it before cleaning up
+        inserted, _ = await calls
+        await _give_back(db, order_dict, pooled, inserted, PaymentStatus.EXPIRED)
+
+    try:
+        inserted, razorpay_order = await asyncio.shield(calls)
+    except BaseException:
+        await asyncio.shield(abandon())
+        raise
+
+    if isinstance(inserted, BaseException) or isinstance(razorpay_order, BaseException):
+        await _give_back(db, order_dict, pooled, inserted, PaymentStatus.FAILED)
+        # A gateway order nobody pays simply expires at Razorpay
+        raise inserted if isinstance(inserted, BaseException) else razorpay_order
+
+    await db.orders.update_one(
+        {"_id": inserted.inserted_id},
+        {
+            "$set": {
+                "razorpayOrderId": razorpay_order["id"],
+                "updatedAt": datetime.utcnow()
+            }
+        }
+    )
+    order_dict["_id"] = inserted.inserted_id
+    order_dict["razorpayOrderId"] = razorpay_order["id"]
+    metrics.inc("checkout.created")
+
+    return {
+        "order": order_dict,
+        "payment": {
+            "razorpayOrderId": razorpay_order["id"],
+            "amount": razorpay_order["amount"],
+            "currency": razorpay_order["currency"],
+            "keyId": settings.RAZORPAY_KEY_ID
+        }
+    }
@@ -0,0 +1,121 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from utils.delivery_rates import RateTable, Zone
+from utils.metrics import metrics
+from config import settings
+
+DEFAULT_ZONE = Zone(
+    name="standard",
+    charge=settings.DELIVERY_DEFAULT_CHARGE,
+    extra_item_charge=0,
+    min_days=settings.DELIVERY_DEFAULT_MIN_DAYS,
+    max_days=settings.DELIVERY_DEFAULT_MAX_DAYS
+)
+
+# Swapped wholesale on reload; readers never see a half-built table
+_table = RateTable.empty(DEFAULT_ZONE)
+# mtime of a rate file that failed to load, so it is not re-parsed every poll
+_failed_mtime = None
+metrics.register("delivery.rates", lambda: _table.stats())
+
+def get_rate_table() -> RateTable:
+    return _table
+
+async def load_rate_table() -> bool:
+    """
+    (Re)load the rate file if it changed since the last load; True when swapped.
+    
+    A file that fails to parse is logged and skipped: the previous table (the
+    default zone, at startup) stays in use until the file is fixed.
+    """
+    global _table, _failed_mtime
+    path = settings.DELIVERY_RATES_FILE
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+
+    if mtime in (_table.mtime, _failed_mtime):
+        return False
+
+    try:
+        _table = await asyncio.to_thread(RateTable.load, path, DEFAULT_ZONE)
+    except (OSError, ValueError) as e:
+        _failed_mtime = mtime
+        metrics.inc("delivery.reloadErrors")
+        print(f"❌ Delivery rates not loaded from {path}: {e}")
+        return False
+    metrics.inc("delivery.reloads")
+    print(f"🚚 Delivery rates loaded: {_table.rows} prefixes, {len(_table.zones) - 1} zones")
+    return True
+
+async def run_rate_table_reloader():
+    """Pick up edits to the rate file without a restart; started from the app lifespan"""
+    while True:
+        await asyncio.sleep(settings.DELIVERY_RATES_RELOAD_SECONDS)
+        try:
+            await load_rate_table()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.inc("delivery.reloadErrors")
+            print(f"❌ Delivery rates reload failed: {e}")
+
+def normalize_pincode(pincode: Optional[str]) -> Optional[str]:
+    """The six digits of a pincode typed with spaces (e.g. "500 001"), or None"""
+    digits = "".join((pincode or "").split())
+    return digits if len(digits) == 6 and digits.isdigit() else None
+
+def parse_pincode(pincode: str) -> int:
+    digits = normalize_pincode(pincode)
+    if digits is None:
+        raise HTTPException(status_code=400, detail="Invalid pincode")
+    return int(digits)
+
+def zone_for(pincode: Optional[str]) -> Zone:
+    """The pincode's zone; the default zone when it cannot be read"""
+    digits = normalize_pincode(pincode)
+    return DEFAULT_ZONE if digits is None else _table.lookup(int(digits))
+
+def basket_size(book_ids: List[str]) -> int:
+    if len(book_ids) > settings.BOOKS_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BOOKS_BATCH_MAX} book IDs per request"
+        )
+    invalid = [book_id for book_id in book_ids if not ObjectId.is_valid(book_id)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid book ID: {', '.join(invalid)}")
+    return len(book_ids)
+
+def quote(pincode: str, item_count: int = 1, fallback: bool = False) -> dict:
+    """
+    Delivery charge and ETA for `item_count` books shipped to `pincode`.
+    
+    An unreadable pincode is a 400, or with `fallback` (orders, whose address
+    was already validated) a quote for the default zone.
+    """
+    zone = zone_for(pincode) if fallback else _table.lookup(parse_pincode(pincode))
+    item_count = max(1, item_count)
+    today = datetime.utcnow()
+
+    return {
+        "pincode": normalize_pincode(pincode) or (pincode or "").strip(),
+        "zone": zone.name,
+        "items": item_count,
+        "deliveryCharges": zone.charge + zone.extra_item_charge * (item_count - 1),
+        "minDays": zone.min_days,
+        "maxDays": zone.max_days,
+        "earliestDelivery": (today + timedelta(days=zone.min_days)).date().isoformat(),
+        "latestDelivery": (today + timedelta(days=zone.max_days)).date().isoformat()
+    }
+
+def delivery_date(pincode: str) -> datetime:
+    """Promised delivery date for an order paid now (the zone's latest day)"""
+    return datetime.utcnow() + timedelta(days=zone_for(pincode).max_days)
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+import mimetypes
+import os
+import urllib.request
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from fastapi import HTTPException
+
+from controllers.book_controller import get_book_by_id
+from utils.disk_cache import DiskLRUCache
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight
+from config import settings
+
+IMAGE_WIDTHS = sorted(int(w) for w in settings.IMAGE_WIDTHS.split(","))
+
+_cache: Optional[DiskLRUCache] = None
+# One fetch/resize per variant even when many clients ask at once
+_renders = SingleFlight("images")
+
+async def get_image_cache() -> DiskLRUCache:
+    """The cache, built on first use (warmed at startup by open_image_cache)"""
+    global _cache
+    if _cache is None:
+        # Rebuilding the index lists and stats every cached file: keep it off the event loop
+        cache = await asyncio.to_thread(DiskLRUCache, settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES)
+        if _cache is None:
+            _cache = cache
+            metrics.register("images.cache", _cache.stats)
+    return _cache
+
+async def open_image_cache():
+    await get_image_cache()
+
+async def _cached(key: str) -> Optional[str]:
+    # A hit touches the file's mtime (the recency kept across restarts)
+    return await asyncio.to_thread((await get_image_cache()).get, key)
+
+def source_version(image_url: str) -> str:
+    """Short hash of the source URL; changes whenever a book's image changes"""
+    return hashlib.sha1(image_url.encode()).hexdigest()[:12]
+
+def pick_width(width: Optional[int]) -> int:
+    """Snap to the smallest configured width that covers the request"""
+    if width is None:
+        return IMAGE_WIDTHS[-1]
+    for allowed in IMAGE_WIDTHS:
+        if allowed >= width:
+            return allowed
+    return IMAGE_WIDTHS[-1]
+
+def _read_source(image_url: str) -> bytes:
+    """Blocking fetch of the original image (run in a worker thread)"""
+    parsed = urlparse(image_url)
+
+    if parsed.scheme in ("http", "https"):
+        request = urllib.request.Request(image_url, headers={"User-Agent": "bookstore-image-proxy"})
+        with urllib.request.urlopen(request, timeout=settings.IMAGE_FETCH_TIMEOUT) as response:
+            data = response.read(settings.IMAGE_MAX_SOURCE_BYTES + 1)
+    elif settings.IMAGE_ALLOW_LOCAL_SOURCES and parsed.scheme in ("", "file"):
+        with open(parsed.path if parsed.scheme else image_url, "rb") as f:
+            data = f.read(settings.IMAGE_MAX_SOURCE_BYTES + 1)
+    else:
+        raise ValueError(f"Unsupported image source: {image_url}")
+
+    if len(data) > settings.IMAGE_MAX_SOURCE_BYTES:
+        raise ValueError("Source image too large")
+    return data
+
+def _resize(source: bytes, width: int, image_format: str) -> bytes:
+    """Downscale (never upscale) and re-encode; CPU bound, run in a worker thread"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(source)) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            image = image.resize((width, height), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if image_format == "webp":
+            image.save(output, "WEBP", quality=settings.IMAGE_QUALITY, method=4)
+        else:
+            image.save(output, "JPEG", quality=settings.IMAGE_QUALITY, optimize=True, progressive=True)
+        return output.getvalue()
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def _fetch_source(image_url: str, key: str) -> str:
+    metrics.inc("images.sourceFetches")
+    data = await asyncio.to_thread(_read_source, image_url)
+    return await asyncio.to_thread((await get_image_cache()).put, key, data)
+
+async def _source_path(book_id: str, image_url: str) -> str:
+    """The original image is fetched once and kept in the cache alongside its variants"""
+    key = f"{book_id}-{source_version(image_url)}-src"
+    path = await _cached(key)
+    if path:
+        return path
+    return await _renders.do(key, lambda: _fetch_source(image_url, key))
+
+async def _render(book_id: str, image_url: str, key: str, width: int, image_format: str) -> str:
+    source = await asyncio.to_thread(_read_file, await _source_path(book_id, image_url))
+    data = await asyncio.to_thread(_resize, source, width, image_format)
+    metrics.inc("images.renders")
+    # File write plus eviction; keep it off the event loop like the reads
+    return await asyncio.to_thread((await get_image_cache()).put, key, data)
+
+def pillow_available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+async def get_book_image(book_id: str, width: Optional[int], accept: str) -> Tuple[str, str, str]:
+    """
+    Resolve a cached (or freshly rendered) cover variant.
+
+    Returns (file path, media type, source version).
+    """
+    book = await get_book_by_id(book_id)
+    image_url = book.get("image")
+    if not image_url:
+        raise HTTPException(status_code=404, detail="Book has no image")
+
+    version = source_version(image_url)
+
+    if not pillow_available():
+        # Without Pillow we can only proxy the original bytes
+        try:
+            path = await _source_path(book_id, image_url)
+        except (OSError, ValueError) as e:
+            raise HTTPException(status_code=502, detail=f"Could not load book image: {e}")
+        media_type = mimetypes.guess_type(urlparse(image_url).path)[0] or "image/jpeg"
+        return path, media_type, version
+
+    width = pick_width(width)
+    image_format = "webp" if "image/webp" in (accept or "") else "jpeg"
+    key = f"{book_id}-{version}-{width}.{image_format}"
+    media_type = f"image/{image_format}"
+
+    path = await _cached(key)
+    if path:
+        metrics.inc("images.cacheHits")
+        return path, media_type, version
+
+    try:
+        path = await _renders.do(key, lambda: _render(book_id, image_url, key, width, image_format))
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=502, detail=f"Could not load book image: {e}")
+
+    if not os.path.exists(path):
+        # Evicted between render and response under heavy churn; render again
+        path = await _render(book_id, image_url, key, width, image_format)
+    return path, media_type, version
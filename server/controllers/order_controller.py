@@ -1,12 +1,55 @@
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
 from bson import ObjectId
 from datetime import datetime
+import asyncio
+import json
 import time
 import random
-from typing import List
+from collections import Counter
+from typing import AsyncIterator, List, Optional, Tuple
 
 from database import get_database
-from models.order import Order, OrderCreate, PaymentStatus
+from controllers import delivery_controller
+from controllers.book_controller import HIDDEN_BOOK_FIELDS
+from models.order import Order, OrderCreate, CartOrderCreate, PaymentStatus
+from utils.single_flight import SingleFlight
+from utils.pubsub import order_events
+from utils.helpers import encode_cursor, decode_cursor
+from utils import order_archive
+from utils.order_archive import bucket_time, order_id_time
+from utils.stock import reserve_stock, adjust_stock, InsufficientStockError
+from utils.stock_pool import stock_pools
+from config import settings
+
+# Payment page polling hits the same orderId repeatedly; share in-flight reads
+order_lookups = SingleFlight("orders", ttl=settings.ORDER_CACHE_TTL)
+# Archive collection names change at most once a month
+archive_names = SingleFlight("orders.archives", ttl=settings.ORDER_ARCHIVE_NAMES_TTL)
+
+# Populated books get the same projection as book responses
+HIDE_BOOK_LEASES = {"$project": {f"bookId.{field}": 0 for field in HIDDEN_BOOK_FIELDS}}
+
+# A position before every order created at the same instant
+_FIRST_ID = ObjectId("0" * 24)
+
+# A failed payment can still be retried; these end an order's event stream
+FINAL_STATUSES = {PaymentStatus.PAID.value, PaymentStatus.EXPIRED.value}
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def normalize_mobile(mobile: str) -> str:
+    return "".join(ch for ch in mobile if ch.isdigit())
+
+def normalize_user_details(user_details: dict) -> dict:
+    """Canonical email/mobile so customer lookups can use exact index matches"""
+    user_details["email"] = normalize_email(user_details["email"])
+    user_details["mobile"] = normalize_mobile(user_details["mobile"])
+    return user_details
+
+def generate_order_id() -> str:
+    return f"ORD{int(time.time())}{random.randint(100, 999)}"
 
 async def create_order(order_data: OrderCreate) -> Order:
     """Create a new order with user details"""
@@ -21,23 +64,31 @@ async def create_order(order_data: OrderCreate) -> Order:
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     
-    if book.get("stock", 0) < 1:
+    delivery = delivery_controller.quote(order_data.user_details.pincode, fallback=True)
+    
+    # Flash-sale titles are reserved from this worker's leased stock
+    flash_sale = settings.FLASH_SALE_ENABLED and book.get("flash_sale")
+    if flash_sale:
+        if not await stock_pools.reserve(db, book["_id"], 1):
+            raise HTTPException(status_code=400, detail="Book out of stock")
+    elif book.get("stock", 0) < 1:
         raise HTTPException(status_code=400, detail="Book out of stock")
     
     # Generate unique order ID
-    order_id = f"ORD{int(time.time())}{random.randint(100, 999)}"
+    order_id = generate_order_id()
     
     # Calculate total amount
-    delivery_charges = 50
+    delivery_charges = delivery["deliveryCharges"]
     total_amount = book["price"] + delivery_charges
     
     # Create order document
     order_dict = {
         "bookId": ObjectId(book_id),
-        "userDetails": order_data.user_details.model_dump(by_alias=True),
+        "userDetails": normalize_user_details(order_data.user_details.model_dump(by_alias=True)),
         "orderId": order_id,
         "amount": book["price"],
         "deliveryCharges": delivery_charges,
+        "deliveryZone": delivery["zone"],
         "totalAmount": total_amount,
         "paymentStatus": PaymentStatus.PENDING.value,
         "paymentId": None,
@@ -47,12 +98,126 @@ async def create_order(order_data: OrderCreate) -> Order:
         "createdAt": datetime.utcnow(),
         "updatedAt": datetime.utcnow()
     }
+    if flash_sale:
+        order_dict["stockReserved"] = True
     
-    result = await db.orders.insert_one(order_dict)
+    try:
+        result = await db.orders.insert_one(order_dict)
+    except Exception:
+        if flash_sale:
+            stock_pools.release(book["_id"], 1)
+        raise
     created_order = await db.orders.find_one({"_id": result.inserted_id})
     
     return created_order
 
+async def prepare_cart_order(db, order_data: CartOrderCreate) -> Tuple[dict, List[dict]]:
+    """
+    Validate a basket, reserve its stock and build the order document
+    without inserting it; returns the document and its flash-sale lines.
+    
+    Prices come from a single $in query and stock for every line is reserved
+    in one bulk write. The caller inserts the document and must call
+    release_cart_reservation() if it gives up on the order.
+    """
+    # Merge repeated lines for the same book
+    quantities = Counter()
+    for item in order_data.items:
+        if not ObjectId.is_valid(item.book_id):
+            raise HTTPException(status_code=400, detail="Invalid book ID")
+        quantities[ObjectId(item.book_id)] += item.quantity
+    
+    delivery = delivery_controller.quote(order_data.user_details.pincode, sum(quantities.values()), fallback=True)
+    
+    books = await db.books.find(
+        {"_id": {"$in": list(quantities)}},
+        {"title": 1, "price": 1, "stock": 1, "flash_sale": 1}
+    ).to_list(len(quantities))
+    books_by_id = {book["_id"]: book for book in books}
+    
+    missing = [str(book_id) for book_id in quantities if book_id not in books_by_id]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Book not found: {', '.join(missing)}")
+    
+    items = [
+        {
+            "bookId": book_id,
+            "title": books_by_id[book_id]["title"],
+            "price": books_by_id[book_id]["price"],
+            "quantity": quantity
+        }
+        for book_id, quantity in quantities.items()
+    ]
+    
+    # Flash-sale lines come out of this worker's leased stock, the rest from the books
+    pooled = [
+        item for item in items
+        if settings.FLASH_SALE_ENABLED and books_by_id[item["bookId"]].get("flash_sale")
+    ]
+    regular = [item for item in items if item not in pooled]
+    
+    taken = []
+    try:
+        for item in pooled:
+            if not await stock_pools.reserve(db, item["bookId"], item["quantity"]):
+                raise InsufficientStockError(item["bookId"])
+            taken.append(item)
+        await reserve_stock(db, regular)
+    except InsufficientStockError as e:
+        for item in taken:
+            stock_pools.release(item["bookId"], item["quantity"])
+        title = books_by_id[e.book_id]["title"]
+        raise HTTPException(status_code=400, detail=f"Book out of stock: {title}")
+    
+    # Calculate total amount
+    delivery_charges = delivery["deliveryCharges"]
+    amount = sum(item["price"] * item["quantity"] for item in items)
+    
+    order_dict = {
+        "bookId": items[0]["bookId"],
+        "items": items,
+        "userDetails": normalize_user_details(order_data.user_details.model_dump(by_alias=True)),
+        "orderId": generate_order_id(),
+        "amount": amount,
+        "deliveryCharges": delivery_charges,
+        "deliveryZone": delivery["zone"],
+        "totalAmount": amount + delivery_charges,
+        "paymentStatus": PaymentStatus.PENDING.value,
+        "paymentId": None,
+        "razorpayOrderId": None,
+        "deliveryDate": None,
+        "paymentSignature": None,
+        "stockReserved": True,
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow()
+    }
+    
+    return order_dict, pooled
+
+async def release_cart_reservation(db, order_dict: dict, pooled: List[dict]):
+    """Give back the stock prepare_cart_order() reserved for an order that was never inserted"""
+    for item in pooled:
+        stock_pools.release(item["bookId"], item["quantity"])
+    await adjust_stock(db, [item for item in order_dict["items"] if item not in pooled], +1)
+
+async def create_cart_order(order_data: CartOrderCreate) -> Order:
+    """
+    Create one order for a basket of books.
+    
+    The basket is paid with a single Razorpay order.
+    """
+    db = get_database()
+    order_dict, pooled = await prepare_cart_order(db, order_data)
+    
+    try:
+        result = await db.orders.insert_one(order_dict)
+    except Exception:
+        await release_cart_reservation(db, order_dict, pooled)
+        raise
+    
+    order_dict["_id"] = result.inserted_id
+    return order_dict
+
 async def get_order_by_id(order_id: str) -> Order:
     """Get order by MongoDB ID"""
     if not ObjectId.is_valid(order_id):
@@ -71,10 +236,14 @@ async def get_order_by_id(order_id: str) -> Order:
                 "as": "bookId"
             }
         },
-        {"$unwind": "$bookId"}
+        {"$unwind": "$bookId"},
+        HIDE_BOOK_LEASES
     ]
     
     orders = await db.orders.aggregate(pipeline).to_list(1)
+    if not orders:
+        # Not in the hot set: try the archive month the ObjectId was created in
+        orders = await order_archive.aggregate_archived(db, bucket_time({"_id": ObjectId(order_id)}), pipeline)
     
     if not orders:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -82,10 +251,38 @@ async def get_order_by_id(order_id: str) -> Order:
     return orders[0]
 
 async def get_all_orders() -> List[Order]:
-    """Get all orders with populated book details"""
-    db = get_database()
+    """Get the newest 100 orders (archived ones included) with populated book details"""
+    orders, _ = await newest_orders(get_database(), {"bookId": {"$ne": None}}, 100)
+    # As before, only orders whose book still exists
+    return [order for order in orders if "bookId" in order]
+
+async def newest_orders(
+    db,
+    match: dict,
+    limit: int,
+    before: Optional[Tuple[datetime, ObjectId]] = None
+) -> Tuple[List[dict], Optional[Tuple[datetime, ObjectId]]]:
+    """
+    Up to `limit` orders matching `match`, newest first by (createdAt, _id),
+    from the hot collection and the archive, with books populated.
+    
+    Returns the orders and the position the next page starts before (None
+    at the end). Archive months are read newest first, at most
+    ORDER_HISTORY_ARCHIVE_MONTHS per call; a page that stops short of the
+    older months can come back with fewer than `limit` orders and a position.
+    """
+    if before is not None:
+        created_at, last_id = before
+        match = {**match, "$or": [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": last_id}}
+        ]}
     
+    # Fetch one extra row to know whether another page exists
     pipeline = [
+        {"$match": match},
+        {"$sort": {"createdAt": -1, "_id": -1}},
+        {"$limit": limit + 1},
         {
             "$lookup": {
                 "from": "books",
@@ -94,15 +291,46 @@ async def get_all_orders() -> List[Order]:
                 "as": "bookId"
             }
         },
-        {"$unwind": "$bookId"},
-        {"$sort": {"createdAt": -1}}
+        {"$unwind": {"path": "$bookId", "preserveNullAndEmptyArrays": True}},
+        HIDE_BOOK_LEASES
     ]
+    orders = await db.orders.aggregate(pipeline).to_list(limit + 1)
     
-    orders = await db.orders.aggregate(pipeline).to_list(100)
-    return orders
+    # Archive months that can hold orders created before the position; an
+    # order's bucket is its _id time, which is never earlier than its createdAt
+    names = await archive_names.do("names", lambda: order_archive.archive_collections(db))
+    months = [name for name in names if before is None or order_archive.month_start(name) <= before[0]]
+    if len(orders) > limit and months and orders[limit]["createdAt"] >= order_archive.month_end(months[0]):
+        months = []  # the page is filled by orders newer than anything archived
+    
+    scanned = months[:settings.ORDER_HISTORY_ARCHIVE_MONTHS]
+    for name in scanned:
+        orders += await db[name].aggregate(pipeline).to_list(limit + 1)
+    orders.sort(key=lambda order: (order["createdAt"], order["_id"]), reverse=True)
+    
+    if len(scanned) < len(months):
+        # Older months are left for the next page; only orders from the months
+        # read so far can be placed yet
+        floor = order_archive.month_start(scanned[-1])
+        orders = [order for order in orders if order["createdAt"] >= floor]
+        if len(orders) <= limit:
+            return orders, (floor, _FIRST_ID)
+    
+    if len(orders) > limit:
+        orders = orders[:limit]
+        return orders, (orders[-1]["createdAt"], orders[-1]["_id"])
+    return orders, None
 
 async def get_order_by_order_id(order_id: str) -> Order:
     """Get order by orderId field"""
+    orders = await order_lookups.do(order_id, lambda: _find_order_by_order_id(order_id))
+    
+    if not orders:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    return orders[0]
+
+async def _find_order_by_order_id(order_id: str) -> List[dict]:
     db = get_database()
     
     pipeline = [
@@ -115,12 +343,102 @@ async def get_order_by_order_id(order_id: str) -> Order:
                 "as": "bookId"
             }
         },
-        {"$unwind": "$bookId"}
+        {"$unwind": "$bookId"},
+        HIDE_BOOK_LEASES
     ]
     
     orders = await db.orders.aggregate(pipeline).to_list(1)
-    
     if not orders:
+        # Not in the hot set: the orderId says which archive month to read
+        orders = await order_archive.aggregate_archived(db, order_id_time(order_id), pipeline)
+    return orders
+
+async def open_order_event_stream(order_id: str) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one order's payment status.
+    
+    Subscribes before reading the current status so no transition is missed.
+    After that one read the stream only waits on its queue; the stream ends
+    once the order is Paid or Expired, or after ORDER_EVENTS_MAX_SECONDS.
+    """
+    queue = order_events.subscribe(order_id)
+    projection = {"_id": 0, "orderId": 1, "paymentStatus": 1, "deliveryDate": 1}
+    try:
+        db = get_database()
+        order = await db.orders.find_one({"orderId": order_id}, projection)
+        if not order:
+            # Archived orders are Paid, so the stream just reports that and ends
+            order = await order_archive.find_one_archived(
+                db, order_id_time(order_id), {"orderId": order_id}, projection
+            )
+    except Exception:
+        order_events.unsubscribe(order_id, queue)
+        raise
+    
+    if not order:
+        order_events.unsubscribe(order_id, queue)
         raise HTTPException(status_code=404, detail="Order not found")
     
-    return orders[0]
+    return _order_event_stream(order_id, queue, order)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def _order_event_stream(order_id: str, queue: asyncio.Queue, order: dict) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.ORDER_EVENTS_MAX_SECONDS
+    try:
+        yield f"retry: {settings.ORDER_EVENTS_RETRY_MS}\n\n"
+        event = order
+        while True:
+            yield _sse("status", event)
+            if event.get("paymentStatus") in FINAL_STATUSES:
+                yield _sse("end", {"reason": event["paymentStatus"]})
+                return
+            
+            # Wait for the next transition, sending comment heartbeats through proxies
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    yield _sse("end", {"reason": "timeout"})
+                    return
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), min(settings.ORDER_EVENTS_HEARTBEAT_SECONDS, remaining)
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+    finally:
+        order_events.unsubscribe(order_id, queue)
+
+def invalidate_order_cache(order_id: str):
+    """Drop any micro-cached copy after the order's status changes"""
+    order_lookups.invalidate(order_id)
+
+async def get_orders_by_customer(
+    email: Optional[str] = None,
+    mobile: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> dict:
+    """Customer order history, newest first, with keyset pagination"""
+    if bool(email) == bool(mobile):
+        raise HTTPException(status_code=400, detail="Provide exactly one of email or mobile")
+    
+    if email:
+        query = {"userDetails.email": normalize_email(email)}
+    else:
+        query = {"userDetails.mobile": normalize_mobile(mobile)}
+    
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # Archived (old paid) orders are part of the history too
+    orders, position = await newest_orders(get_database(), query, limit, before)
+    
+    return {"orders": orders, "nextCursor": encode_cursor(*position) if position else None}
@@ -1,21 +1,60 @@
 from fastapi import HTTPException
-import razorpay
+import asyncio
 import hmac
 import hashlib
-from datetime import datetime, timedelta
+from datetime import datetime
 from bson import ObjectId
-import random
 
 from database import get_database
 from models.order import PaymentStatus
+from controllers import delivery_controller
+from controllers.order_controller import invalidate_order_cache
+from utils.stock import flag_stock_shortfall, order_items, release_stock, reserved_items, retake_stock
 from utils.email_service import send_order_confirmation_email
+from utils.pubsub import order_events
+from utils.resilience import Dependency, DependencyUnavailable, unavailable_error
 from config import settings
 
-# Initialize Razorpay
-razorpay_client = razorpay.Client(
-    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_SECRET)
+_razorpay_client = None
+
+# Client errors (a rejected request) mean the gateway is up; only the rest trip the breaker
+razorpay_gateway = Dependency(
+    "razorpay",
+    timeout=settings.RAZORPAY_TIMEOUT_SECONDS,
+    max_concurrent=settings.RAZORPAY_MAX_CONCURRENCY,
+    max_wait=settings.DEPENDENCY_QUEUE_SECONDS,
+    failure_threshold=settings.RAZORPAY_BREAKER_FAILURES,
+    reset_timeout=settings.RAZORPAY_BREAKER_RESET_SECONDS,
+    is_failure=lambda e: type(e).__name__ != "BadRequestError"
 )
 
+def get_razorpay_client():
+    """Create the Razorpay client on first use; importing razorpay pulls in requests"""
+    global _razorpay_client
+    if _razorpay_client is None:
+        import razorpay
+        _razorpay_client = razorpay.Client(
+            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_SECRET)
+        )
+    return _razorpay_client
+
+async def call_razorpay(method, *args):
+    """
+    Run a blocking SDK call (e.g. client.order.create) in a thread under the
+    gateway's deadline, bulkhead and circuit breaker. The HTTP request gets
+    the same timeout, so an abandoned call does not keep its thread busy.
+    """
+    return await razorpay_gateway.call(
+        asyncio.to_thread, method, *args, timeout=settings.RAZORPAY_TIMEOUT_SECONDS
+    )
+
+async def create_razorpay_order(payload: dict) -> dict:
+    """Create a gateway order; 503 with Retry-After while the gateway is unavailable"""
+    try:
+        return await call_razorpay(get_razorpay_client().order.create, payload)
+    except DependencyUnavailable as e:
+        raise unavailable_error(e, "Payment gateway is unavailable, please try again shortly")
+
 async def create_payment_order(order_id: str):
     """Create Razorpay order"""
     db = get_database()
@@ -25,17 +64,21 @@ async def create_payment_order(order_id: str):
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Get book details
-    book = await db.books.find_one({"_id": order["bookId"]})
+    # Get book details (cart orders already carry their titles)
+    if order.get("items"):
+        book_title = ", ".join(item["title"] for item in order["items"])[:250]
+    else:
+        book = await db.books.find_one({"_id": order["bookId"]})
+        book_title = book["title"] if book else ""
     
     # Create Razorpay order
-    razorpay_order = razorpay_client.order.create({
+    razorpay_order = await create_razorpay_order({
         "amount": int(order["totalAmount"] * 100),  # Amount in paise
         "currency": "INR",
         "receipt": order["orderId"],
         "notes": {
             "orderId": order["orderId"],
-            "bookTitle": book["title"] if book else ""
+            "bookTitle": book_title
         }
     })
     
@@ -76,65 +119,90 @@ async def verify_payment(payment_data: dict):
     
     db = get_database()
     
-    # Find order
-    order = await db.orders.find_one({"orderId": order_id})
+    order = await db.orders.find_one({"orderId": order_id}, {"userDetails.pincode": 1})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Get book details
-    book = await db.books.find_one({"_id": order["bookId"]})
-    
-    # Calculate delivery date (5-7 days)
-    delivery_days = random.randint(5, 7)
-    delivery_date = datetime.utcnow() + timedelta(days=delivery_days)
+    # Promised delivery date from the pincode's rate zone
+    delivery_date = delivery_controller.delivery_date(order["userDetails"]["pincode"])
     
     # Update order
-    await db.orders.update_one(
+    update = {
+        "paymentStatus": PaymentStatus.PAID.value,
+        "paymentId": razorpay_payment_id,
+        "paymentSignature": razorpay_signature,
+        "deliveryDate": delivery_date,
+        "updatedAt": datetime.utcnow(),
+        # A paid order holds its stock again (ignored for unreserved orders)
+        "stockReleased": False
+    }
+    
+    # The pre-update document says whether expiry/failure gave the reservation back
+    previous = await db.orders.find_one_and_update(
         {"orderId": order_id},
-        {
-            "$set": {
-                "paymentStatus": PaymentStatus.PAID.value,
-                "paymentId": razorpay_payment_id,
-                "paymentSignature": razorpay_signature,
-                "deliveryDate": delivery_date,
-                "updatedAt": datetime.utcnow()
-            }
-        }
+        {"$set": update}
     )
+    if not previous:
+        raise HTTPException(status_code=404, detail="Order not found")
     
-    # Reduce book stock
-    if book and book.get("stock", 0) > 0:
-        await db.books.update_one(
-            {"_id": book["_id"]},
+    invalidate_order_cache(order_id)
+    order_events.publish(order_id, PaymentStatus.PAID.value, deliveryDate=delivery_date)
+    
+    short = []
+    if previous.get("stockReserved"):
+        # Stock was taken at checkout; only re-take it if it was released since,
+        # and only if it is still there
+        if previous.get("stockReleased"):
+            short = await retake_stock(db, order_items(previous))
+        if previous.get("items"):
+            book = {"title": ", ".join(item["title"] for item in previous["items"])}
+        else:
+            # Flash-sale single-book order: read only, the hot document is not written
+            book = await db.books.find_one({"_id": previous["bookId"]})
+    else:
+        # Reduce book stock (if any is left) and get book details in one round trip
+        book = await db.books.find_one_and_update(
+            {"_id": previous["bookId"], "stock": {"$gt": 0}},
             {
                 "$inc": {"stock": -1},
                 "$set": {"updated_at": datetime.utcnow()}
             }
         )
+        if not book:
+            book = await db.books.find_one({"_id": previous["bookId"]})
+            if previous.get("paymentStatus") != PaymentStatus.PAID.value:
+                short = order_items(previous)
     
-    # Get updated order
-    updated_order = await db.orders.find_one({"orderId": order_id})
+    if short:
+        # Captured, but the units were sold meanwhile: refund or manual review, not an oversell
+        await flag_stock_shortfall(db, previous, short)
+    
+    # Updated order, without reading it back
+    updated_order = {**previous, **update}
     updated_order["bookId"] = book  # Add book details
     
-    # Send confirmation email
-    try:
-        await send_order_confirmation_email(updated_order)
-    except Exception as e:
-        print(f"Email sending failed: {e}")
+    # Send confirmation email (not for orders that cannot be fulfilled as they are)
+    if not short:
+        try:
+            await send_order_confirmation_email(updated_order)
+        except Exception as e:
+            print(f"Email sending failed: {e}")
     
     return {
         "orderId": order_id,
         "paymentId": razorpay_payment_id,
         "deliveryDate": delivery_date.isoformat(),
         "bookTitle": book["title"] if book else "",
-        "totalAmount": updated_order["totalAmount"]
+        "items": updated_order.get("items"),
+        "totalAmount": updated_order["totalAmount"],
+        "needsReview": bool(short)
     }
 
 async def payment_failed(order_id: str, error: str = None):
     """Record payment failure"""
     db = get_database()
     
-    result = await db.orders.update_one(
+    order = await db.orders.find_one_and_update(
         {"orderId": order_id},
         {
             "$set": {
@@ -144,7 +212,19 @@ async def payment_failed(order_id: str, error: str = None):
         }
     )
     
-    if result.modified_count == 0:
+    if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    invalidate_order_cache(order_id)
+    order_events.publish(order_id, PaymentStatus.FAILED.value)
+    
+    if reserved_items(order):
+        # Only the caller that flips stockReleased gives the reservation back
+        result = await db.orders.update_one(
+            {"orderId": order_id, "stockReleased": {"$ne": True}},
+            {"$set": {"stockReleased": True}}
+        )
+        if result.modified_count:
+            await release_stock(db, [order])
+    
     return {"message": "Payment failure recorded"}
@@ -1,27 +1,90 @@
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, monitoring
 from pymongo.errors import ServerSelectionTimeoutError
 from config import settings
+from utils.query_budget import budget_enabled, command_counter
 
 client = None
 db = None
 
+class PoolUsageListener(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections for the deep health check"""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): pass
+
+pool_usage = PoolUsageListener()
+
 async def connect_db():
     global client, db
+    listeners = [pool_usage]
+    if budget_enabled():
+        listeners.append(command_counter)
     try:
         client = AsyncIOMotorClient(
             settings.MONGODB_URI,
             serverSelectionTimeoutMS=5000,
-            socketTimeoutMS=45000
+            socketTimeoutMS=45000,
+            event_listeners=listeners
         )
         # Test connection
         await client.admin.command('ping')
         db = client[settings.DATABASE_NAME]
+        await ensure_indexes(db)
         print(f"✅ MongoDB Connected to {settings.DATABASE_NAME}")
         print(f"🐍 Python FastAPI Backend Ready!")
     except ServerSelectionTimeoutError as e:
         print(f"❌ MongoDB Connection Error: {e}")
         raise
 
+async def ensure_indexes(database):
+    """Create the indexes the query paths rely on (no-op when they exist)"""
+    # Pending order expiry sweep: status + age range scan
+    await database.orders.create_index(
+        [("paymentStatus", ASCENDING), ("createdAt", ASCENDING)]
+    )
+    # Payment reconciliation: pending/expired/failed orders that reached the gateway, by _id
+    await database.orders.create_index(
+        [("paymentStatus", ASCENDING), ("_id", ASCENDING)],
+        partialFilterExpression={"razorpayOrderId": {"$type": "string"}}
+    )
+    # Books listing: one index per sort order, and author (equality) ahead of
+    # the sort key for author-filtered pages; price ranges filter within them
+    for sort in (
+        [("created_at", DESCENDING), ("_id", DESCENDING)],
+        [("price", ASCENDING), ("_id", ASCENDING)],
+        [("title", ASCENDING), ("_id", ASCENDING)],
+    ):
+        await database.books.create_index(sort)
+        await database.books.create_index([("author", ASCENDING)] + sort)
+    # Customer order history: equality on the contact field, newest first
+    for field in ("userDetails.email", "userDetails.mobile"):
+        await database.orders.create_index(
+            [(field, ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]
+        )
+
 async def close_db():
     global client
     if client:
@@ -30,3 +93,16 @@ async def close_db():
 
 def get_database():
     return db
+
+async def ping_latency_ms() -> float:
+    """Round-trip time of a ping command"""
+    started = time.perf_counter()
+    await client.admin.command("ping")
+    return round((time.perf_counter() - started) * 1000, 2)
+
+def pool_stats() -> dict:
+    return {
+        "open": pool_usage.open,
+        "checkedOut": pool_usage.checked_out,
+        "maxPoolSize": client.options.pool_options.max_pool_size if client else None
+    }
@@ -1,88 +1,204 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
+from fastapi.encoders import ENCODERS_BY_TYPE
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
+import asyncio
 from datetime import datetime
+from bson import ObjectId
 
-from database import connect_db, close_db
+from database import connect_db, close_db, get_database, ping_latency_ms, pool_stats
 from routes.book_routes import router as book_router
 from routes.order_routes import router as order_router
 from routes.payment_routes import router as payment_router
+from routes.checkout_routes import router as checkout_router
+from routes.image_routes import router as image_router
+from routes.delivery_routes import router as delivery_router
 from utils.exceptions import (
     http_exception_handler,
     validation_exception_handler,
     general_exception_handler
 )
+from utils.rate_limit import configure_store
+from utils.metrics import metrics
+from utils import static_frontend
+from utils.loop_monitor import loop_monitor
+from utils.pubsub import order_events
+from utils.stock_pool import run_stock_pool_flusher
+from utils.query_budget import QueryBudgetMiddleware, budget_enabled, query_budget
+from utils.traffic_capture import TrafficCaptureMiddleware, recorder as traffic_recorder
+from workers.order_expiry import run_order_expiry_sweeper
+from workers.reconciliation import run_reconciler
+from workers.order_archive import run_order_archiver
+from workers.customer_contacts import run_contact_migration
+from controllers.delivery_controller import load_rate_table, run_rate_table_reloader
+from controllers.book_controller import run_related_books_refresher
+from controllers.image_controller import open_image_cache
 from config import settings
 
+# Routes return raw Motor documents; serialize their ObjectIds as strings
+ENCODERS_BY_TYPE[ObjectId] = str
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_db()
+    configure_store(get_database())
+    
+    await load_rate_table()
+    await open_image_cache()
+    
+    background_tasks = []
+    # One-off: old orders get the normalised contacts history lookups match on
+    background_tasks.append(asyncio.create_task(run_contact_migration()))
+    if settings.LOOP_MONITOR_ENABLED:
+        background_tasks.append(asyncio.create_task(loop_monitor.run()))
+    if settings.ORDER_EXPIRY_ENABLED:
+        background_tasks.append(asyncio.create_task(run_order_expiry_sweeper()))
+    if settings.ORDER_EVENTS_BACKEND == "changestream":
+        background_tasks.append(asyncio.create_task(order_events.watch(get_database())))
+    if settings.FLASH_SALE_ENABLED:
+        background_tasks.append(asyncio.create_task(run_stock_pool_flusher(get_database)))
+    if settings.RECONCILE_ENABLED:
+        background_tasks.append(asyncio.create_task(run_reconciler()))
+    if settings.RECOMMENDATIONS_ENABLED:
+        background_tasks.append(asyncio.create_task(run_related_books_refresher()))
+    if settings.ORDER_ARCHIVE_ENABLED:
+        background_tasks.append(asyncio.create_task(run_order_archiver()))
+    if settings.DELIVERY_RATES_RELOAD_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_rate_table_reloader()))
+    if settings.TRAFFIC_CAPTURE_ENABLED:
+        background_tasks.append(asyncio.create_task(traffic_recorder.run()))
+    if settings.SERVE_FRONTEND:
+        await static_frontend.render_index()
+        background_tasks.append(asyncio.create_task(static_frontend.run_catalog_refresher()))
+    
     yield
     # Shutdown
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
     await close_db()
 
-app = FastAPI(
-    title="Book Store API",
-    description="A complete book e-commerce API built with FastAPI",
-    version="1.0.0",
-    lifespan=lifespan,
-    docs_url="/docs",
-    redoc_url="/redoc"
-)
+def create_app() -> FastAPI:
+    """
+    Build the FastAPI application.
 
-# Exception handlers
-app.add_exception_handler(StarletteHTTPException, http_exception_handler)
-app.add_exception_handler(RequestValidationError, validation_exception_handler)
-app.add_exception_handler(Exception, general_exception_handler)
-
-# CORS Configuration
-is_production = settings.NODE_ENV == "production"
-
-origins = [
-    "http://localhost:5173",
-    "http://localhost:3000",
-    settings.FRONTEND_URL,
-]
-
-if is_production:
-    origins.extend([
-        "https://*.onrender.com",
-        "https://bookstore-frontend.onrender.com"
-    ])
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"] if is_production else origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    Payment and email clients are not created here; they are imported and
+    built on first use so a cold start only pays for FastAPI and Motor.
+    """
+    app = FastAPI(
+        title="Book Store API",
+        description="A complete book e-commerce API built with FastAPI",
+        version="1.0.0",
+        lifespan=lifespan,
+        docs_url="/docs",
+        redoc_url="/redoc"
+    )
+
+    # Exception handlers
+    app.add_exception_handler(StarletteHTTPException, http_exception_handler)
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    app.add_exception_handler(Exception, general_exception_handler)
+
+    # CORS Configuration
+    is_production = settings.NODE_ENV == "production"
+
+    origins = [
+        "http://localhost:5173",
+        "http://localhost:3000",
+        settings.FRONTEND_URL,
+    ]
+
+    if is_production:
+        origins.extend([
+            "https://*.onrender.com",
+            "https://bookstore-frontend.onrender.com"
+        ])
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"] if is_production else origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Retry-After"],
+    )
+
+    # Per-request Mongo command budgets (tests / local profiling only)
+    if budget_enabled():
+        app.add_middleware(QueryBudgetMiddleware, mode=settings.QUERY_BUDGET_MODE)
 
-# Include routers
-app.include_router(book_router, prefix="/api/books", tags=["Books"])
-app.include_router(order_router, prefix="/api/orders", tags=["Orders"])
-app.include_router(payment_router, prefix="/api/payment", tags=["Payment"])
-
-# Root route
-@app.get("/")
-async def root():
-    return {
-        "message": "Book Store API",
-        "version": "1.0.0",
-        "endpoints": {
-            "health": "/api/health",
-            "books": "/api/books",
-            "orders": "/api/orders",
-            "paymentPython FastAPI Server is running",
-        "version": "1.0.0",
-        "framework": "FastAPI",
-        "language": "Python",
-        "environment": settings.NODE_ENV,
-        "timestamp": datetime.utcnow().isoformat()
-    }
+    # Sanitized request capture for replay; outside the budget check so it sees X-Mongo-Commands
+    if settings.TRAFFIC_CAPTURE_ENABLED:
+        app.add_middleware(TrafficCaptureMiddleware, sample_rate=settings.TRAFFIC_CAPTURE_SAMPLE_RATE)
+
+    # Include routers
+    app.include_router(book_router, prefix="/api/books", tags=["Books"])
+    app.include_router(order_router, prefix="/api/orders", tags=["Orders"])
+    app.include_router(payment_router, prefix="/api/payment", tags=["Payment"])
+    app.include_router(checkout_router, prefix="/api/checkout", tags=["Checkout"])
+    app.include_router(image_router, prefix="/api/images", tags=["Images"])
+    app.include_router(delivery_router, prefix="/api/delivery", tags=["Delivery"])
+
+    # Root route (the SPA owns "/" when the frontend is served from here)
+    if not settings.SERVE_FRONTEND:
+        @app.get("/")
+        async def root():
+            return {
+                "message": "Book Store API",
+                "version": "1.0.0",
+                "endpoints": {
+                    "health": "/api/health",
+                    "books": "/api/books",
+                    "orders": "/api/orders",
+                    "payment": "/api/payment",
+                    "checkout": "/api/checkout",
+                    "images": "/api/images",
+                    "delivery": "/api/delivery"
+                }
+            }
+
+    # Health check
+    @app.get("/api/health", openapi_extra=query_budget(0))
+    async def health_check(deep: bool = Query(False)):
+        health = {
+            "status": "OK",
+            "message": "Python FastAPI Server is running",
+            "version": "1.0.0",
+            "framework": "FastAPI",
+            "language": "Python",
+            "environment": settings.NODE_ENV,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+        if deep:
+            # Loop lag, database round trip and connection pool pressure
+            health["loop"] = loop_monitor.stats()
+            try:
+                health["mongo"] = {"pingMs": await ping_latency_ms(), "pool": pool_stats()}
+            except Exception as e:
+                health["status"] = "DEGRADED"
+                health["mongo"] = {"error": str(e), "pool": pool_stats()}
+        
+        return health
+
+    # In-process metrics (read coalescing, admission control, ...)
+    @app.get("/api/metrics", openapi_extra=query_budget(0))
+    async def get_metrics():
+        return {
+            "success": True,
+            "data": metrics.snapshot()
+        }
+
+    # Built frontend catch-all; must come after every API route
+    if settings.SERVE_FRONTEND:
+        static_frontend.mount_frontend(app)
+
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
@@ -92,14 +208,4 @@ if __name__ == "__main__":
         port=settings.PORT,
         reload=settings.DEBUG,
         log_level="info"
-    
-        "status": "OK",
-        "message": "Server is running",
-        "environment": os.getenv("NODE_ENV", "development"),
-        "timestamp": datetime.utcnow().isoformat()
-    }
-
-if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 5000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+    )
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from enum import Enum
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 
@@ -25,6 +26,8 @@ class BookBase(BaseModel):
     image: str
     stock: int = Field(default=0, ge=0)
     author: str
+    # Serve reservations from per-worker leased stock (see utils/stock_pool.py)
+    flash_sale: bool = False
 
 class BookCreate(BookBase):
     pass
@@ -36,6 +39,62 @@ class BookUpdate(BaseModel):
     image: Optional[str] = None
     stock: Optional[int] = None
     author: Optional[str] = None
+    flash_sale: Optional[bool] = None
+
+class StockAdjustment(BaseModel):
+    """Either add `delta` (may be negative) to stock or `set` it outright"""
+    id: str
+    delta: Optional[int] = None
+    set_: Optional[int] = Field(None, alias="set", ge=0)
+
+    class Config:
+        populate_by_name = True
+
+    @model_validator(mode="after")
+    def check_exactly_one(self):
+        if (self.delta is None) == (self.set_ is None):
+            raise ValueError("Provide exactly one of delta or set")
+        return self
+
+class BulkStockUpdate(BaseModel):
+    updates: List[StockAdjustment] = Field(..., min_length=1, max_length=10000)
+
+    @model_validator(mode="after")
+    def check_unique_ids(self):
+        # One row per book, so each row's outcome can be read back from its book
+        ids = [update.id.lower() for update in self.updates]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Each book may appear only once per batch")
+        return self
+
+class BookSort(str, Enum):
+    NEWEST = "newest"
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+    TITLE = "title"
+
+class Availability(str, Enum):
+    IN_STOCK = "in_stock"
+    OUT_OF_STOCK = "out_of_stock"
+    ALL = "all"
+
+class BookQuery(BaseModel):
+    """Listing filters, sort and page; only the filters key the facet cache"""
+    authors: List[str] = []
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    availability: Availability = Availability.IN_STOCK
+    sort: BookSort = BookSort.NEWEST
+    page: int = 1
+    limit: int = 100
+
+    def filter_key(self) -> tuple:
+        return (
+            tuple(sorted(set(self.authors))),
+            self.min_price,
+            self.max_price,
+            self.availability.value
+        )
 
 class Book(BookBase):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 from enum import Enum
@@ -23,6 +23,7 @@ class PaymentStatus(str, Enum):
     PENDING = "Pending"
     PAID = "Paid"
     FAILED = "Failed"
+    EXPIRED = "Expired"
 
 class UserDetails(BaseModel):
     full_name: str = Field(..., alias="fullName")
@@ -41,15 +42,38 @@ class OrderBase(BaseModel):
 class OrderCreate(OrderBase):
     pass
 
+class CartItem(BaseModel):
+    book_id: str = Field(..., alias="bookId")
+    quantity: int = Field(default=1, ge=1, le=20)
+
+    class Config:
+        populate_by_name = True
+
+class CartOrderCreate(BaseModel):
+    items: List[CartItem] = Field(..., min_length=1, max_length=50)
+    user_details: UserDetails = Field(..., alias="userDetails")
+
+class OrderItem(BaseModel):
+    book_id: PyObjectId = Field(..., alias="bookId")
+    title: str
+    price: float
+    quantity: int
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+
 class Order(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     book_id: PyObjectId = Field(..., alias="bookId")
+    items: Optional[List[OrderItem]] = None
     user_details: UserDetails = Field(..., alias="userDetails")
     payment_id: Optional[str] = Field(None, alias="paymentId")
     order_id: str = Field(..., alias="orderId")
     razorpay_order_id: Optional[str] = Field(None, alias="razorpayOrderId")
     amount: float
     delivery_charges: float = Field(default=50, alias="deliveryCharges")
+    delivery_zone: Optional[str] = Field(None, alias="deliveryZone")
     total_amount: float = Field(..., alias="totalAmount")
     payment_status: PaymentStatus = Field(default=PaymentStatus.PENDING, alias="paymentStatus")
     delivery_date: Optional[datetime] = Field(None, alias="deliveryDate")
@@ -1,21 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
 
-from models.book import Book, BookCreate, BookUpdate
+from models.book import Availability, Book, BookCreate, BookQuery, BookSort, BookUpdate, BulkStockUpdate
 from controllers import book_controller
+from utils.query_budget import query_budget
+from config import settings
 
 router = APIRouter()
 
-@router.get("/", response_model=None)
-async def get_all_books():
-    """Get all books with stock > 0"""
+@router.get("/", response_model=None, openapi_extra=query_budget(1))
+async def get_all_books(
+    author: Optional[str] = Query(None, description="Comma-separated authors"),
+    min_price: Optional[float] = Query(None, alias="minPrice", ge=0),
+    max_price: Optional[float] = Query(None, alias="maxPrice", ge=0),
+    availability: Availability = Query(Availability.IN_STOCK),
+    sort: BookSort = Query(BookSort.NEWEST),
+    page: int = Query(1, ge=1),
+    limit: int = Query(100, ge=1, le=100)
+):
+    """List books (in stock, newest first by default) with author and price facet counts"""
     try:
-        books = await book_controller.get_all_books()
-        return {"success": True, "data": books}
+        query = BookQuery(
+            authors=[name.strip() for name in (author or "").split(",") if name.strip()],
+            min_price=min_price,
+            max_price=max_price,
+            availability=availability,
+            sort=sort,
+            page=page,
+            limit=limit
+        )
+        result = await book_controller.search_books(query)
+        return {
+            "success": True,
+            "data": result["books"],
+            "page": page,
+            "facets": result["facets"]
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/batch", response_model=None, openapi_extra=query_budget(1))
+async def get_books_batch(ids: str = Query(..., description="Comma-separated book IDs")):
+    """Get many books in one request; missing books come back as null"""
+    try:
+        book_ids = [book_id.strip() for book_id in ids.split(",") if book_id.strip()]
+        books = await book_controller.get_books_by_ids(book_ids)
+        return {
+            "success": True,
+            "data": books,
+            "notFound": [book_id for book_id, book in zip(book_ids, books) if book is None]
+        }
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{book_id}", response_model=None)
+@router.get("/{book_id}", response_model=None, openapi_extra=query_budget(1))
 async def get_book(book_id: str):
     """Get a single book by ID"""
     try:
@@ -26,7 +68,18 @@ async def get_book(book_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/", response_model=None)
+@router.get("/{book_id}/related", response_model=None, openapi_extra=query_budget(1))
+async def get_related_books(book_id: str, limit: int = Query(None, ge=1, le=50)):
+    """Books customers also bought (precomputed from paid orders)"""
+    try:
+        books = await book_controller.get_related_books(book_id, limit or settings.RECOMMENDATIONS_TOP_K)
+        return {"success": True, "data": books}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/", response_model=None, openapi_extra=query_budget(2))
 async def create_book(book: BookCreate):
     """Create a new book"""
     try:
@@ -39,7 +92,22 @@ async def create_book(book: BookCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.put("/{book_id}", response_model=None)
+@router.post("/stock/bulk", response_model=None, openapi_extra=query_budget(2))
+async def bulk_adjust_stock(request: BulkStockUpdate):
+    """Adjust stock for many books at once"""
+    try:
+        result = await book_controller.bulk_adjust_stock(request.updates)
+        return {
+            "success": True,
+            "message": f"Applied {result['applied']} of {len(request.updates)} stock updates",
+            "data": result
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{book_id}", response_model=None, openapi_extra=query_budget(3))
 async def update_book(book_id: str, book: BookUpdate):
     """Update a book"""
     try:
@@ -54,7 +122,7 @@ async def update_book(book_id: str, book: BookUpdate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/{book_id}")
+@router.delete("/{book_id}", openapi_extra=query_budget(1))
 async def delete_book(book_id: str):
     """Delete a book"""
     try:
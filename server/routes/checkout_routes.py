@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from models.order import CartOrderCreate
+from controllers import checkout_controller
+from utils.rate_limit import admission
+from utils.query_budget import query_budget
+
+router = APIRouter()
+
+@router.post(
+    "", response_model=None, dependencies=[Depends(admission("orders"))], openapi_extra=query_budget(4)
+)
+async def checkout(order: CartOrderCreate):
+    """Create an order and its Razorpay order in one request"""
+    try:
+        result = await checkout_controller.checkout(order)
+        return {
+            "success": True,
+            "message": "Order created successfully",
+            "data": result
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
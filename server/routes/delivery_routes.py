@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from controllers import delivery_controller
+from utils.query_budget import query_budget
+
+router = APIRouter()
+
+@router.get("/quote", response_model=None, openapi_extra=query_budget(0))
+async def get_delivery_quote(
+    pincode: str = Query(..., description="6-digit delivery pincode"),
+    bookIds: str = Query(None, description="Comma-separated book IDs in the basket")
+):
+    """Delivery charges and ETA for a pincode (answered from memory, no database hit)"""
+    try:
+        book_ids = [book_id.strip() for book_id in (bookIds or "").split(",") if book_id.strip()]
+        return {
+            "success": True,
+            "data": delivery_controller.quote(pincode, delivery_controller.basket_size(book_ids))
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
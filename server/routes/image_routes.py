@@ -0,0 +1,48 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+
+from controllers import image_controller
+from utils.query_budget import query_budget
+
+router = APIRouter()
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+@router.get("/{book_id}", openapi_extra=query_budget(1))
+async def get_book_image(
+    book_id: str,
+    request: Request,
+    w: int = Query(None, ge=1, le=4096),
+    v: str = Query(None)
+):
+    """Resized book cover (WebP when accepted, otherwise JPEG)"""
+    try:
+        path, media_type, version = await image_controller.get_book_image(
+            book_id, w, request.headers.get("accept", "")
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Only URLs pinned to the current source (?v=) are safe to cache forever
+    cache_control = IMMUTABLE if v == version else "public, max-age=86400"
+    headers = {
+        "Cache-Control": cache_control,
+        "Vary": "Accept",
+        "X-Image-Version": version,
+        # The cache key (book, source version, width, format) names the bytes;
+        # the file's mtime moves on every hit, so the default stat ETag would too
+        "ETag": f'"{os.path.basename(path)}"'
+    }
+
+    if etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
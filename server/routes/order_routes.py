@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from models.order import Order, OrderCreate
+from models.order import Order, OrderCreate, CartOrderCreate
 from controllers import order_controller
+from utils.rate_limit import admission
+from utils.query_budget import query_budget
+from config import settings
 
 router = APIRouter()
 
-@router.post("/", response_model=None)
+@router.post(
+    "/", response_model=None, dependencies=[Depends(admission("orders"))], openapi_extra=query_budget(3)
+)
 async def create_order(order: OrderCreate):
     """Create a new order"""
     try:
@@ -20,7 +26,60 @@ async def create_order(order: OrderCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{order_id}", response_model=None)
+@router.post(
+    "/cart", response_model=None, dependencies=[Depends(admission("orders"))], openapi_extra=query_budget(3)
+)
+async def create_cart_order(order: CartOrderCreate):
+    """Create one order for several books"""
+    try:
+        created_order = await order_controller.create_cart_order(order)
+        return {
+            "success": True,
+            "message": "Order created successfully",
+            "data": created_order
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/by-customer", response_model=None, openapi_extra=query_budget(2 + settings.ORDER_HISTORY_ARCHIVE_MONTHS))
+async def get_orders_by_customer(
+    email: str = Query(None),
+    mobile: str = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str = Query(None)
+):
+    """Get a customer's orders by email or mobile, newest first"""
+    try:
+        result = await order_controller.get_orders_by_customer(email, mobile, limit, cursor)
+        return {
+            "success": True,
+            "data": result["orders"],
+            "nextCursor": result["nextCursor"]
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{order_id}/events", response_model=None, openapi_extra=query_budget(3))
+async def get_order_events(order_id: str):
+    """Server-Sent Events stream of an order's payment status (use instead of polling)"""
+    try:
+        stream = await order_controller.open_order_event_stream(order_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{order_id}", response_model=None, openapi_extra=query_budget(3))
 async def get_order(order_id: str):
     """Get order by MongoDB ID"""
     try:
@@ -34,7 +93,7 @@ async def get_order(order_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=None)
+@router.get("/", response_model=None, openapi_extra=query_budget(2 + settings.ORDER_HISTORY_ARCHIVE_MONTHS))
 async def get_orders(orderId: str = Query(None)):
     """Get all orders or filter by orderId"""
     try:
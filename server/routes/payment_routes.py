@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 
 from controllers import payment_controller
+from utils.rate_limit import admission
+from utils.query_budget import query_budget
 
 router = APIRouter()
 
@@ -19,7 +21,9 @@ class PaymentFailedRequest(BaseModel):
     orderId: str
     error: Optional[str] = None
 
-@router.post("/create-order", response_model=None)
+@router.post(
+    "/create-order", response_model=None, dependencies=[Depends(admission("payment"))], openapi_extra=query_budget(3)
+)
 async def create_payment_order(request: CreateOrderRequest):
     """Create Razorpay order"""
     try:
@@ -33,7 +37,7 @@ async def create_payment_order(request: CreateOrderRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/verify", response_model=None)
+@router.post("/verify", response_model=None, openapi_extra=query_budget(3))
 async def verify_payment(request: VerifyPaymentRequest):
     """Verify payment signature"""
     try:
@@ -48,7 +52,7 @@ async def verify_payment(request: VerifyPaymentRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/failed", response_model=None)
+@router.post("/failed", response_model=None, openapi_extra=query_budget(3))
 async def payment_failed(request: PaymentFailedRequest):
     """Record payment failure"""
     try:
@@ -0,0 +1,166 @@
+"""
+Shared test fixtures
+
+The app runs on an in-memory mongomock database with background workers
+off. mongomock never reaches pymongo's network layer, so the
+`mongo_commands` fixture reports every collection call to the query budget
+listener as the command a real server would receive, and QUERY_BUDGET_MODE
+is strict: a route going over its declared budget answers 500 with the
+offending commands and its test fails.
+
+Run from the server directory:
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+import itertools
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# Read by config at import time
+os.environ.update({
+    "QUERY_BUDGET_MODE": "strict",
+    "ORDER_EXPIRY_ENABLED": "false",
+    "RECONCILE_ENABLED": "false",
+    "LOOP_MONITOR_ENABLED": "false",
+    "RECOMMENDATIONS_ENABLED": "false",
+    "RATE_LIMIT_ENABLED": "false",
+    "DELIVERY_RATES_RELOAD_SECONDS": "0",
+    "ORDER_ARCHIVE_COMPRESSOR": "",  # mongomock takes no storage engine options
+    "RAZORPAY_KEY_ID": "rzp_test_key",
+    "RAZORPAY_SECRET": "rzp_test_secret",
+    "EMAIL_USER": "",
+})
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from mongomock.collection import Collection  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from controllers import payment_controller  # noqa: E402
+from controllers.book_controller import invalidate_catalog_cache  # noqa: E402
+from controllers.order_controller import archive_names, order_lookups  # noqa: E402
+from utils import query_budget  # noqa: E402
+from config import settings  # noqa: E402
+
+# Collection method -> command name on the wire
+COMMANDS = {
+    "find": "find",
+    "find_one": "find",
+    "count_documents": "aggregate",
+    "estimated_document_count": "count",
+    "distinct": "distinct",
+    "aggregate": "aggregate",
+    "insert_one": "insert",
+    "insert_many": "insert",
+    "update_one": "update",
+    "update_many": "update",
+    "replace_one": "update",
+    "delete_one": "delete",
+    "delete_many": "delete",
+    "find_one_and_update": "findAndModify",
+    "find_one_and_replace": "findAndModify",
+    "find_one_and_delete": "findAndModify",
+    "create_index": "createIndexes",
+}
+WRITE_KINDS = {
+    "InsertOne": "insert",
+    "UpdateOne": "update", "UpdateMany": "update", "ReplaceOne": "update",
+    "DeleteOne": "delete", "DeleteMany": "delete",
+}
+
+
+def bulk_commands(requests, ordered: bool = True) -> list:
+    """A bulk write is one command per run of same-kind ops (per kind when unordered)"""
+    kinds = [WRITE_KINDS[type(request).__name__] for request in requests]
+    if not ordered:
+        return sorted(set(kinds))
+    return [kind for kind, _ in itertools.groupby(kinds)]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def mongo_commands():
+    """Report mongomock collection calls to the query budget listener"""
+    request_ids = itertools.count(1)
+    depth = threading.local()  # mongomock calls itself (find_one -> find); count the outer call
+    patch = pytest.MonkeyPatch()
+
+    def emit(name: str, collection: str):
+        request_id = next(request_ids)
+        query_budget.command_counter.started(
+            SimpleNamespace(command_name=name, command={name: collection}, request_id=request_id)
+        )
+        query_budget.command_counter.succeeded(
+            SimpleNamespace(request_id=request_id, reply={"ok": 1}, duration_micros=0)
+        )
+
+    def counted(method_name: str, original):
+        def wrapper(self, *args, **kwargs):
+            outer = not getattr(depth, "level", 0)
+            if outer:
+                if method_name == "bulk_write":
+                    for name in bulk_commands(args[0] if args else kwargs["requests"], kwargs.get("ordered", True)):
+                        emit(name, self.name)
+                else:
+                    emit(COMMANDS[method_name], self.name)
+            depth.level = getattr(depth, "level", 0) + 1
+            try:
+                return original(self, *args, **kwargs)
+            finally:
+                depth.level -= 1
+        return wrapper
+
+    for method_name in [*COMMANDS, "bulk_write"]:
+        patch.setattr(Collection, method_name, counted(method_name, getattr(Collection, method_name)))
+    yield
+    patch.undo()
+
+
+class FakeRazorpay:
+    """Gateway stand-in recording the orders it was asked to create"""
+
+    def __init__(self):
+        self.created = []
+        self.order = self
+
+    def create(self, data, **options):
+        self.created.append(data)
+        return {"id": f"order_{data['receipt']}", "amount": data["amount"], "currency": data["currency"]}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory database behind database.get_database()"""
+    client = AsyncMongoMockClient()
+    test_db = client[settings.DATABASE_NAME]
+    monkeypatch.setattr(database, "client", client)
+    monkeypatch.setattr(database, "db", test_db)
+
+    async def connected():
+        pass
+
+    monkeypatch.setattr(main, "connect_db", connected)
+    invalidate_catalog_cache()
+    order_lookups.clear()
+    archive_names.clear()
+    query_budget.violations.clear()
+    return test_db
+
+
+@pytest.fixture
+def razorpay(monkeypatch):
+    gateway = FakeRazorpay()
+    monkeypatch.setattr(payment_controller, "_razorpay_client", gateway)
+    return gateway
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(main.create_app()) as test_client:
+        yield test_client
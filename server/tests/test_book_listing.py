@@ -0,0 +1,59 @@
+"""
+Listing facets: each facet is counted without its own filter
+"""
+import pytest
+from pydantic import ValidationError
+
+from config import Settings
+
+BOOKS = [("Ann", 150), ("Ann", 450), ("Ann", 900), ("Bob", 120), ("Bob", 300), ("Cy", 2500)]
+
+
+@pytest.fixture
+def books(client):
+    for index, (author, price) in enumerate(BOOKS):
+        response = client.post("/api/books/", json={
+            "title": f"Book {index}", "description": "Facet fixture", "price": price,
+            "image": "", "stock": 1, "author": author
+        })
+        assert response.status_code == 200, response.text
+
+
+def facets(client, **params) -> dict:
+    response = client.get("/api/books/", params=params)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return {
+        "results": len(body["data"]),
+        "total": body["facets"]["total"],
+        "authors": {row["author"]: row["count"] for row in body["facets"]["authors"]},
+        "prices": [row["count"] for row in body["facets"]["price"]]
+    }
+
+
+def test_unfiltered_facets(client, books):
+    result = facets(client)
+    assert result["total"] == result["results"] == 6
+    assert result["authors"] == {"Ann": 3, "Bob": 2, "Cy": 1}
+    assert result["prices"] == [2, 2, 1, 0, 1]
+
+
+def test_author_facet_ignores_the_author_filter(client, books):
+    result = facets(client, author="Ann")
+    assert result["total"] == result["results"] == 3
+    # Other authors stay selectable with their counts
+    assert result["authors"] == {"Ann": 3, "Bob": 2, "Cy": 1}
+    assert result["prices"] == [1, 1, 1, 0, 0]
+
+
+def test_price_facet_ignores_the_price_filter(client, books):
+    result = facets(client, author="Ann,Bob", minPrice=200, maxPrice=1000)
+    assert result["total"] == result["results"] == 3
+    assert result["authors"] == {"Ann": 2, "Bob": 1}
+    assert result["prices"] == [2, 2, 1, 0, 0]
+
+
+@pytest.mark.parametrize("buckets", ["500", "", "0,500,200", "0,200,200"])
+def test_price_buckets_need_two_ascending_boundaries(buckets):
+    with pytest.raises(ValidationError):
+        Settings(BOOK_PRICE_BUCKETS=buckets)
@@ -0,0 +1,67 @@
+"""
+Batch book lookup: request order, missing books, duplicates and limits
+"""
+import asyncio
+
+from bson import ObjectId
+
+from controllers import book_controller
+from config import settings
+
+
+def add_books(db, *titles) -> list:
+    result = asyncio.run(db.books.insert_many([
+        {"title": title, "price": 100, "stock": 1} for title in titles
+    ]))
+    return [str(book_id) for book_id in result.inserted_ids]
+
+
+def batch(client, ids: list):
+    return client.get("/api/books/batch", params={"ids": ",".join(ids)})
+
+
+def test_books_come_back_in_request_order_with_nulls(client, db):
+    first, second = add_books(db, "First", "Second")
+    missing = str(ObjectId())
+
+    body = batch(client, [second, missing, first]).json()
+
+    assert [book and book["title"] for book in body["data"]] == ["Second", None, "First"]
+    assert body["notFound"] == [missing]
+
+
+def test_duplicate_ids_are_fetched_once_and_repeated(client, db, monkeypatch):
+    (book_id,) = add_books(db, "Twice")
+    fetched = []
+    find = type(db.books).find
+
+    def counting_find(collection, query, *args, **kwargs):
+        fetched.append(query)
+        return find(collection, query, *args, **kwargs)
+
+    monkeypatch.setattr(type(db.books), "find", counting_find)
+    body = batch(client, [book_id, book_id, f" {book_id} "]).json()
+
+    assert [book["title"] for book in body["data"]] == ["Twice"] * 3
+    assert fetched == [{"_id": {"$in": [ObjectId(book_id)]}}]
+
+
+def test_cached_books_skip_the_query(client, db):
+    cached, fresh = add_books(db, "Cached", "Fresh")
+    client.get(f"/api/books/{cached}")
+    assert book_controller.book_lookups.get_cached(cached) is not None
+
+    body = batch(client, [cached, fresh]).json()
+
+    assert [book["title"] for book in body["data"]] == ["Cached", "Fresh"]
+    assert book_controller.book_lookups.get_cached(fresh) is not None  # primed for next time
+
+
+def test_limits_and_invalid_ids_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "BOOKS_BATCH_MAX", 3)
+
+    too_many = batch(client, [str(ObjectId()) for _ in range(4)])
+    assert too_many.status_code == 400 and "At most 3" in too_many.json()["error"]
+
+    invalid = batch(client, [str(ObjectId()), "nope"])
+    assert invalid.status_code == 400 and "nope" in invalid.json()["error"]
@@ -0,0 +1,81 @@
+"""
+Bulk stock adjustments: per-row outcomes without upserts
+"""
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from controllers import book_controller
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def books(db):
+    result = run(db.books.insert_many([
+        {"title": f"Stocked {stock}", "price": 100, "stock": stock} for stock in (10, 2, 0)
+    ]))
+    return [str(book_id) for book_id in result.inserted_ids]
+
+
+def stock(db, book_id: str) -> int:
+    return run(db.books.find_one({"_id": ObjectId(book_id)}))["stock"]
+
+
+def adjust(client, *updates) -> dict:
+    response = client.post("/api/books/stock/bulk", json={"updates": list(updates)})
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+
+def test_set_and_delta_apply(client, db, books):
+    data = adjust(client, {"id": books[0], "set": 4}, {"id": books[1], "delta": 3}, {"id": books[2], "delta": 6})
+
+    assert [row["status"] for row in data["results"]] == ["ok"] * 3
+    assert data["applied"] == 3
+    assert [stock(db, book_id) for book_id in books] == [4, 5, 6]
+
+
+def test_shortfall_and_unknown_books_are_told_apart(client, db, books):
+    unknown = str(ObjectId())
+    data = adjust(
+        client,
+        {"id": books[0], "delta": -3},
+        {"id": books[1], "delta": -5},
+        {"id": unknown, "delta": 1},
+        {"id": str(ObjectId()), "delta": -1},
+        {"id": "not-an-id", "set": 1}
+    )
+
+    assert [row["status"] for row in data["results"]] == [
+        "ok", "insufficient_stock", "not_found", "not_found", "invalid_id"
+    ]
+    assert data["applied"] == 1
+    assert [stock(db, book_id) for book_id in books] == [7, 2, 0]
+    # Nothing was upserted for the unknown ids
+    assert run(db.books.count_documents({})) == 3
+
+
+def test_one_cache_invalidation_per_batch(client, books, monkeypatch):
+    calls = []
+    monkeypatch.setattr(book_controller, "invalidate_catalog_cache", lambda: calls.append(1))
+
+    adjust(client, *({"id": book_id, "delta": 1} for book_id in books))
+
+    assert len(calls) == 1
+
+
+def test_a_book_appears_once_per_batch(client, books):
+    response = client.post("/api/books/stock/bulk", json={"updates": [
+        {"id": books[0], "delta": 1}, {"id": books[0].upper(), "set": 2}
+    ]})
+    assert response.status_code == 422
+
+
+def test_batch_tag_is_not_served(client, books):
+    adjust(client, {"id": books[0], "delta": 1})
+
+    assert "stockBatch" not in client.get(f"/api/books/{books[0]}").json()["data"]
@@ -0,0 +1,82 @@
+"""
+One-shot checkout gives its reservation back when it does not complete
+"""
+import asyncio
+import threading
+
+import pytest
+
+from controllers import checkout_controller, payment_controller
+from models.order import CartOrderCreate, PaymentStatus
+
+USER = {
+    "fullName": "Checkout Check",
+    "address": "1 Test Street",
+    "pincode": "500001",
+    "mobile": "9000000000",
+    "email": "checkout@example.com"
+}
+
+
+class SlowRazorpay:
+    """Gateway whose order.create blocks until released, then fails or answers"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.order = self
+
+    def create(self, data, **options):
+        self.started.set()
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return {"id": f"order_{data['receipt']}", "amount": data["amount"], "currency": data["currency"]}
+
+
+@pytest.fixture
+def book_id(db):
+    return asyncio.run(db.books.insert_one({"title": "Checkout", "price": 100, "stock": 5})).inserted_id
+
+
+def cart(book_id, quantity: int = 2) -> CartOrderCreate:
+    return CartOrderCreate(items=[{"bookId": str(book_id), "quantity": quantity}], userDetails=USER)
+
+
+def state(db, book_id):
+    async def read():
+        book = await db.books.find_one({"_id": book_id})
+        orders = await db.orders.find({}, {"_id": 0, "paymentStatus": 1, "stockReleased": 1}).to_list(None)
+        return book["stock"], orders
+    return asyncio.run(read())
+
+
+def test_gateway_failure_returns_the_reservation(db, book_id, monkeypatch):
+    gateway = SlowRazorpay(error=RuntimeError("gateway down"))
+    gateway.release.set()
+    monkeypatch.setattr(payment_controller, "_razorpay_client", gateway)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(checkout_controller.checkout(cart(book_id)))
+
+    assert state(db, book_id) == (5, [{"paymentStatus": PaymentStatus.FAILED.value, "stockReleased": True}])
+
+
+def test_cancelled_checkout_returns_the_reservation(db, book_id, monkeypatch):
+    gateway = SlowRazorpay()
+    monkeypatch.setattr(payment_controller, "_razorpay_client", gateway)
+
+    async def scenario():
+        task = asyncio.create_task(checkout_controller.checkout(cart(book_id)))
+        await asyncio.to_thread(gateway.started.wait, 5)
+        task.cancel()  # e.g. the client went away
+        await asyncio.sleep(0.05)
+        # Cleanup waits for the gateway call still running in its thread
+        assert not task.done()
+        gateway.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert state(db, book_id) == (5, [{"paymentStatus": PaymentStatus.EXPIRED.value, "stockReleased": True}])
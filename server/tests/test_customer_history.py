@@ -0,0 +1,92 @@
+"""
+Customer order history: keyset pages, cursors and old unnormalised contacts
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from models.order import PaymentStatus
+from workers.customer_contacts import normalize_customer_contacts
+
+EMAIL = "history@example.com"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def book_id(db):
+    return run(db.books.insert_one({"title": "History", "price": 100, "stock": 5})).inserted_id
+
+
+def add_orders(db, book_id, count: int, email: str = EMAIL, mobile: str = "9000000000",
+               collection: str = "orders", now: datetime = None) -> list:
+    now = now or datetime.utcnow().replace(microsecond=0)
+    orders = [
+        {
+            "_id": ObjectId(),
+            "orderId": f"ORD{collection}{email}{i}",
+            "bookId": book_id,
+            "paymentStatus": PaymentStatus.PENDING.value,
+            "totalAmount": 150,
+            "userDetails": {"email": email, "mobile": mobile},
+            # Two orders per timestamp, so pages also split on the _id tie-breaker
+            "createdAt": now - timedelta(minutes=i // 2)
+        }
+        for i in range(count)
+    ]
+    run(db[collection].insert_many(orders))
+    return sorted(orders, key=lambda order: (order["createdAt"], order["_id"]), reverse=True)
+
+
+def history(client, limit: int, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        response = client.get("/api/orders/by-customer", params={
+            "limit": limit, **params, **({"cursor": cursor} if cursor else {})
+        })
+        assert response.status_code == 200, response.text
+        pages.append([order["orderId"] for order in response.json()["data"]])
+        cursor = response.json()["nextCursor"]
+        if not cursor:
+            return pages
+
+
+def test_pages_follow_the_cursor_without_gaps_or_repeats(client, db, book_id):
+    orders = add_orders(db, book_id, 7)
+    add_orders(db, book_id, 3, email="someone@example.com")
+
+    pages = history(client, 3, email=EMAIL)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [order_id for page in pages for order_id in page] == [order["orderId"] for order in orders]
+
+
+def test_a_full_last_page_has_no_next_cursor(client, db, book_id):
+    add_orders(db, book_id, 4)
+
+    assert [len(page) for page in history(client, 2, email=EMAIL)] == [2, 2]
+    assert [len(page) for page in history(client, 4, mobile="90000-00000")] == [4]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "bm90fGE", "!!"])
+def test_malformed_cursor_is_a_400(client, cursor):
+    response = client.get("/api/orders/by-customer", params={"email": EMAIL, "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_migration_finds_old_mixed_case_contacts(client, db, book_id):
+    old = add_orders(db, book_id, 2, email=" History@Example.COM", mobile="+91 90000 00000")
+    archived = add_orders(db, book_id, 1, email="HISTORY@example.com", collection="orders_archive_202401", now=datetime(2024, 1, 15))
+    assert history(client, 10, email=EMAIL) == [[]]
+
+    # The app already ran it at startup, on an empty database
+    assert run(normalize_customer_contacts(db))["skipped"] is True
+    report = run(normalize_customer_contacts(db, force=True))
+
+    assert report["changed"] == 3
+    assert history(client, 10, email=EMAIL) == [[order["orderId"] for order in old + archived]]
+    assert history(client, 10, mobile="919000000000") == [[order["orderId"] for order in old]]
@@ -0,0 +1,103 @@
+"""
+Delivery quotes: prefix index, unreadable pincodes and rate file reloads
+"""
+import asyncio
+import os
+
+import pytest
+from bson import ObjectId
+
+from controllers import delivery_controller
+from controllers.delivery_controller import DEFAULT_ZONE
+from utils.delivery_rates import RateTable
+from config import settings
+
+HEADER = "prefix,zone,charge,extra_item_charge,min_days,max_days\n"
+
+
+@pytest.fixture
+def rates_file(tmp_path, monkeypatch):
+    path = tmp_path / "rates.csv"
+    monkeypatch.setattr(settings, "DELIVERY_RATES_FILE", str(path))
+    monkeypatch.setattr(delivery_controller, "_table", RateTable.empty(DEFAULT_ZONE))
+    monkeypatch.setattr(delivery_controller, "_failed_mtime", None)
+    return path
+
+
+def write(path, body: str, mtime: float):
+    path.write_text(HEADER + body)
+    os.utime(path, (mtime, mtime))
+
+
+def load() -> bool:
+    return asyncio.run(delivery_controller.load_rate_table())
+
+
+def test_longest_prefix_wins():
+    table = RateTable.build([
+        {"prefix": "5", "zone": "regional", "charge": "50", "min_days": "3", "max_days": "5"},
+        {"prefix": "500", "zone": "local", "charge": "30", "min_days": "1", "max_days": "2"},
+        {"prefix": "500001", "zone": "hub", "charge": "0", "min_days": "0", "max_days": "1"},
+    ], DEFAULT_ZONE)
+
+    assert table.lookup(500001).name == "hub"
+    assert table.lookup(500002).name == "local"
+    assert table.lookup(560001).name == "regional"
+    assert table.lookup(110001) == DEFAULT_ZONE
+    assert table.lookup(999999) == DEFAULT_ZONE
+
+
+def test_quote_reads_spaced_pincodes_and_rejects_garbage(client, rates_file):
+    write(rates_file, "500,local,30,5,1,2\n", mtime=1000)
+    assert load()
+
+    quote = client.get("/api/delivery/quote", params={"pincode": " 500 001 "}).json()["data"]
+    assert quote["pincode"] == "500001" and quote["zone"] == "local"
+
+    for pincode in ("50001", "5000o1", ""):
+        assert client.get("/api/delivery/quote", params={"pincode": pincode}).status_code == 400
+
+
+def test_basket_ids_are_validated(client, monkeypatch):
+    monkeypatch.setattr(settings, "BOOKS_BATCH_MAX", 2)
+    ids = [str(ObjectId()) for _ in range(3)]
+
+    counted = client.get("/api/delivery/quote", params={"pincode": "500001", "bookIds": ",".join(ids[:2])})
+    assert counted.json()["data"]["items"] == 2
+    assert client.get("/api/delivery/quote", params={"pincode": "500001", "bookIds": ",".join(ids)}).status_code == 400
+    assert client.get("/api/delivery/quote", params={"pincode": "500001", "bookIds": "nope"}).status_code == 400
+
+
+def test_orders_with_unreadable_pincodes_get_the_default_eta(client, db):
+    book_id = asyncio.run(db.books.insert_one({"title": "Far", "price": 100, "stock": 5})).inserted_id
+
+    for pincode in ("012345", " 50001"):
+        response = client.post("/api/orders/", json={"bookId": str(book_id), "userDetails": {
+            "fullName": "Pin Check", "address": "1 Test Street", "pincode": pincode,
+            "mobile": "9000000000", "email": "pin@example.com"
+        }})
+        assert response.status_code == 200, response.text
+        assert response.json()["data"]["deliveryCharges"] == DEFAULT_ZONE.charge
+
+
+def test_reload_keeps_the_previous_table_until_the_file_is_fixed(rates_file):
+    write(rates_file, "500,local,30,5,1,2\n", mtime=1000)
+    assert load()
+    assert not load()  # unchanged file
+
+    write(rates_file, "500,local,thirty,5,1,2\n", mtime=2000)
+    assert not load()
+    assert delivery_controller.get_rate_table().lookup(500001).name == "local"
+
+    write(rates_file, "500,metro,20,5,1,1\n", mtime=3000)
+    assert load()
+    assert delivery_controller.get_rate_table().lookup(500001).name == "metro"
+
+
+def test_bad_rate_file_does_not_stop_startup(client, rates_file):
+    write(rates_file, "not,a,rate,row\n", mtime=1000)
+
+    with client:
+        quote = client.get("/api/delivery/quote", params={"pincode": "500001"}).json()["data"]
+
+    assert quote["zone"] == DEFAULT_ZONE.name
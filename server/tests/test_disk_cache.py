@@ -0,0 +1,35 @@
+"""
+Disk LRU cache: eviction, and puts from worker threads
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.disk_cache import DiskLRUCache
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=30)
+    for key in ("a", "b", "c"):
+        cache.put(key, b"x" * 10)
+    cache.get("a")
+    cache.put("d", b"x" * 10)
+
+    assert cache.get("b") is None and not os.path.exists(cache.path("b"))
+    assert all(cache.get(key) for key in ("a", "c", "d"))
+    assert cache.stats() == {"entries": 3, "bytes": 30, "maxBytes": 30}
+
+
+def test_concurrent_puts_keep_the_index_consistent(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=2_000)
+
+    def put(index: int):
+        cache.put(f"key-{index % 150}", b"x" * (10 + index % 7))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(put, range(2_000)))
+
+    files = {name: os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)}
+    assert cache.total_bytes == sum(cache._entries.values()) <= 2_000
+    assert set(cache._entries) <= set(files)
+    # A restart rebuilds the same index from the files
+    assert DiskLRUCache(str(tmp_path), max_bytes=2_000).total_bytes <= 2_000
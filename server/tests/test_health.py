@@ -0,0 +1,72 @@
+"""
+Loop stall detection and the deep health check
+"""
+import asyncio
+import time
+
+import main
+from utils.loop_monitor import LoopMonitor
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)  # a sync call inside a coroutine
+
+
+def test_blocked_loop_is_reported_with_its_stack(capsys):
+    monitor = LoopMonitor(interval=0.01, stall_threshold=0.05, capture_stacks=True)
+
+    async def scenario():
+        sampler = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.05)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.1)
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+    stats = monitor.stats()
+    assert stats["stalls"] >= 1 and stats["maxLagMs"] >= 200
+    stall = stats["recentStalls"][0]
+    assert stall["durationMs"] >= 200
+    assert "block_the_loop" in stall["stack"]
+    assert "Event loop blocked" in capsys.readouterr().err
+
+
+def test_idle_loop_has_no_stalls():
+    monitor = LoopMonitor(interval=0.01, stall_threshold=0.2, capture_stacks=True)
+
+    async def scenario():
+        sampler = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0.1)
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert monitor.stats()["stalls"] == 0
+
+
+def test_deep_health_reports_the_database(client, monkeypatch):
+    async def ping():
+        return 1.5
+
+    monkeypatch.setattr(main, "ping_latency_ms", ping)
+    monkeypatch.setattr(main, "pool_stats", lambda: {"open": 1, "checkedOut": 0, "maxPoolSize": 100})
+
+    health = client.get("/api/health", params={"deep": True}).json()
+    assert health["status"] == "OK"
+    assert health["mongo"]["pingMs"] == 1.5 and "lagMs" in health["loop"]
+    assert "mongo" not in client.get("/api/health").json()
+
+
+def test_deep_health_is_degraded_when_ping_fails(client, monkeypatch):
+    async def ping():
+        raise ConnectionError("no primary available")
+
+    monkeypatch.setattr(main, "ping_latency_ms", ping)
+    monkeypatch.setattr(main, "pool_stats", lambda: {"open": 0, "checkedOut": 0, "maxPoolSize": 100})
+
+    response = client.get("/api/health", params={"deep": True})
+    assert response.status_code == 200
+    assert response.json()["status"] == "DEGRADED"
+    assert response.json()["mongo"]["error"] == "no primary available"
@@ -0,0 +1,72 @@
+"""
+Cover proxy: width snapping, cached variants and conditional requests
+"""
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from controllers import image_controller
+from utils.metrics import metrics
+from config import settings
+
+
+@pytest.fixture
+def book_id(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_ALLOW_LOCAL_SOURCES", True)
+    monkeypatch.setattr(settings, "IMAGE_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(image_controller, "_cache", None)
+
+    source = tmp_path / "cover.png"
+    Image.new("RGB", (1000, 500), "navy").save(source)
+    return str(asyncio.run(db.books.insert_one({
+        "title": "Covered", "price": 100, "stock": 1, "image": str(source)
+    })).inserted_id)
+
+
+def width_of(content: bytes) -> int:
+    with Image.open(io.BytesIO(content)) as image:
+        return image.width
+
+
+def test_requested_width_snaps_to_a_configured_one(client, book_id):
+    response = client.get(f"/api/images/{book_id}", params={"w": 300})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert width_of(response.content) == 320
+    # Past the largest configured width: the largest, never upscaled
+    assert width_of(client.get(f"/api/images/{book_id}", params={"w": 4000}).content) == 960
+
+
+def test_webp_when_accepted(client, book_id):
+    response = client.get(f"/api/images/{book_id}", params={"w": 80}, headers={"Accept": "image/webp,*/*"})
+
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+
+
+def test_repeat_requests_hit_the_cache_and_revalidate(client, book_id):
+    renders = metrics.snapshot().get("images.renders", 0)
+    first = client.get(f"/api/images/{book_id}", params={"w": 160})
+    etag = first.headers["etag"]
+
+    again = client.get(f"/api/images/{book_id}", params={"w": 150})
+    assert again.headers["etag"] == etag  # same variant, and the hit did not change it
+    assert metrics.snapshot()["images.renders"] == renders + 1
+
+    revalidated = client.get(f"/api/images/{book_id}", params={"w": 160}, headers={"If-None-Match": f"W/{etag}"})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+    other_width = client.get(f"/api/images/{book_id}", params={"w": 320}, headers={"If-None-Match": etag})
+    assert other_width.status_code == 200
+
+
+def test_pinned_version_is_cached_forever(client, book_id):
+    version = client.get(f"/api/images/{book_id}").headers["x-image-version"]
+
+    pinned = client.get(f"/api/images/{book_id}", params={"v": version})
+    assert "immutable" in pinned.headers["cache-control"]
+    assert "immutable" not in client.get(f"/api/images/{book_id}", params={"v": "stale"}).headers["cache-control"]
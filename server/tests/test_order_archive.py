@@ -0,0 +1,128 @@
+"""
+Order archive: moving old paid orders, and reading them back
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from models.order import PaymentStatus
+from utils.order_archive import archive_name
+from workers.order_archive import OrderArchiver
+from config import settings
+
+PAID = PaymentStatus.PAID.value
+EMAIL = "archive@example.com"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def book_id(db):
+    return run(db.books.insert_one({"title": "Archived", "price": 100, "stock": 5})).inserted_id
+
+
+def make_order(book_id, when: datetime, status: str = PAID, email: str = EMAIL) -> dict:
+    """An order created at `when`, with the ids the app would have given it then"""
+    return {
+        "_id": ObjectId.from_datetime(when),
+        "orderId": f"ORD{int(when.timestamp())}{when.microsecond % 1000:03d}",
+        "bookId": book_id,
+        "paymentStatus": status,
+        "totalAmount": 150,
+        "userDetails": {"email": email, "mobile": "9000000000"},
+        "createdAt": when
+    }
+
+
+def add_orders(db, *orders):
+    run(db.orders.insert_many(list(orders)))
+
+
+def collection(db, name: str) -> list:
+    return run(db[name].find({}, {"orderId": 1}).sort("createdAt", 1).to_list(None))
+
+
+def test_archiver_moves_only_old_paid_orders(db, book_id):
+    old = datetime(2024, 1, 15, 12)
+    paid = make_order(book_id, old)
+    expired = make_order(book_id, old + timedelta(minutes=1), PaymentStatus.EXPIRED.value)
+    recent = make_order(book_id, datetime.utcnow() - timedelta(days=1))
+    next_month = make_order(book_id, datetime(2024, 2, 3, 9))
+    add_orders(db, paid, expired, recent, next_month)
+
+    report = run(OrderArchiver(db, after_days=30, batch_size=1).run())
+
+    assert report["moved"] == 2 and report["batches"] == 2
+    assert [order["orderId"] for order in collection(db, "orders_archive_202401")] == [paid["orderId"]]
+    assert [order["orderId"] for order in collection(db, "orders_archive_202402")] == [next_month["orderId"]]
+    assert {order["orderId"] for order in collection(db, "orders")} == {expired["orderId"], recent["orderId"]}
+
+
+def test_rerun_finishes_an_interrupted_copy(db, book_id):
+    first, second = make_order(book_id, datetime(2024, 3, 1, 8)), make_order(book_id, datetime(2024, 3, 2, 8))
+    add_orders(db, first, second)
+    # A previous run copied the first order and died before deleting it
+    run(db[archive_name(datetime(2024, 3, 1))].insert_one(dict(first)))
+
+    report = run(OrderArchiver(db, after_days=30).run())
+
+    assert report["moved"] == 2
+    assert collection(db, "orders") == []
+    assert [order["orderId"] for order in collection(db, "orders_archive_202403")] == [first["orderId"], second["orderId"]]
+
+
+def test_archived_orders_are_still_found(client, db, book_id):
+    order = make_order(book_id, datetime(2024, 5, 10, 10))
+    add_orders(db, order)
+    run(OrderArchiver(db, after_days=30).run())
+    assert collection(db, "orders") == []
+
+    by_id = client.get(f"/api/orders/{order['_id']}")
+    by_order_id = client.get("/api/orders/", params={"orderId": order["orderId"]})
+    assert by_id.status_code == by_order_id.status_code == 200
+    assert by_id.json()["data"]["orderId"] == by_order_id.json()["data"][0]["orderId"] == order["orderId"]
+    assert by_id.json()["data"]["bookId"]["title"] == "Archived"
+
+    with client.stream("GET", f"/api/orders/{order['orderId']}/events") as response:
+        body = "".join(response.iter_text())
+    assert '"paymentStatus": "Paid"' in body and "event: end" in body
+
+
+def test_customer_history_spans_the_archive(client, db, book_id, monkeypatch):
+    monkeypatch.setattr(settings, "ORDER_HISTORY_ARCHIVE_MONTHS", 2)
+    now = datetime.utcnow().replace(microsecond=0)
+    hot = [make_order(book_id, now - timedelta(days=days), PaymentStatus.EXPIRED.value) for days in (1, 2)]
+    archived = [
+        make_order(book_id, datetime(2024, month, day, 12))
+        for month, day in ((7, 20), (7, 3), (5, 9), (3, 30), (3, 2), (1, 5))
+    ]
+    other = make_order(book_id, datetime(2024, 7, 21, 12), email="someone@example.com")
+    add_orders(db, *hot, *archived, other)
+    run(OrderArchiver(db, after_days=30).run())
+
+    pages, cursor = [], None
+    while True:
+        params = {"email": EMAIL.upper(), "limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/orders/by-customer", params=params)
+        assert response.status_code == 200, response.text
+        pages.append([order["orderId"] for order in response.json()["data"]])
+        cursor = response.json()["nextCursor"]
+        if not cursor:
+            break
+
+    history = [order_id for page in pages for order_id in page]
+    assert history == [order["orderId"] for order in hot + archived]
+    assert all(len(page) <= 2 for page in pages)
+
+
+def test_admin_list_includes_archived_orders(client, db, book_id):
+    order = make_order(book_id, datetime(2024, 2, 1, 10))
+    add_orders(db, order, make_order(book_id, datetime.utcnow()))
+    run(OrderArchiver(db, after_days=30).run())
+
+    listed = [row["orderId"] for row in client.get("/api/orders/").json()["data"]]
+    assert listed[-1] == order["orderId"] and len(listed) == 2
@@ -0,0 +1,144 @@
+"""
+Order status events: pub/sub fan-out and the SSE stream
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from controllers.order_controller import open_order_event_stream
+from models.order import PaymentStatus
+from utils.pubsub import QUEUE_SIZE, OrderEvents, order_events
+from config import settings
+
+PENDING = PaymentStatus.PENDING.value
+PAID = PaymentStatus.PAID.value
+
+
+@pytest.fixture
+def pending(db):
+    asyncio.run(db.orders.insert_one({"orderId": "ORDSSE", "paymentStatus": PENDING}))
+    return "ORDSSE"
+
+
+def parse(chunk: str) -> tuple:
+    """(event name, data) of an SSE chunk; comments and retry hints come back as-is"""
+    if not chunk.startswith("event: "):
+        return chunk.strip(), None
+    name, data = chunk.strip().split("\n")
+    return name[len("event: "):], json.loads(data[len("data: "):])
+
+
+def test_events_reach_every_subscriber_of_the_order():
+    events = OrderEvents("memory")
+    first, second, other = events.subscribe("A"), events.subscribe("A"), events.subscribe("B")
+
+    events.publish("A", PAID, deliveryDate="2024-01-01")
+
+    for queue in (first, second):
+        event = queue.get_nowait()
+        assert event["paymentStatus"] == PAID and event["deliveryDate"] == "2024-01-01" and event["at"]
+    assert other.empty()
+
+    events.unsubscribe("A", first)
+    events.unsubscribe("A", second)
+    assert events.stats() == {"orders": 1, "total": 1}
+
+
+def test_a_slow_subscriber_keeps_the_latest_status():
+    events = OrderEvents("memory")
+    queue = events.subscribe("A")
+
+    for i in range(QUEUE_SIZE + 3):
+        events.publish("A", f"status{i}")
+
+    assert queue.qsize() == QUEUE_SIZE
+    *_, last = [queue.get_nowait() for _ in range(QUEUE_SIZE)]
+    assert last["paymentStatus"] == f"status{QUEUE_SIZE + 2}"
+
+
+def test_change_stream_backend_does_not_publish_locally():
+    events = OrderEvents("changestream")
+    queue = events.subscribe("A")
+    events.publish("A", PAID)
+    assert queue.empty()
+
+
+def test_stream_delivers_transitions_until_a_final_status(pending):
+    async def scenario():
+        stream = await open_order_event_stream(pending)
+        received = [parse(await stream.__anext__()), parse(await stream.__anext__())]
+        # A failed attempt can still be retried: the stream stays open
+        order_events.publish(pending, PaymentStatus.FAILED.value)
+        received.append(parse(await stream.__anext__()))
+        order_events.publish(pending, PAID)
+        received += [parse(chunk) async for chunk in stream]
+        return received
+
+    received = asyncio.run(scenario())
+
+    assert received[0] == (f"retry: {settings.ORDER_EVENTS_RETRY_MS}", None)
+    assert [(name, data.get("paymentStatus") or data.get("reason")) for name, data in received[1:]] == [
+        ("status", PENDING), ("status", PaymentStatus.FAILED.value), ("status", PAID), ("end", PAID)
+    ]
+    assert order_events.stats()["total"] == 0
+
+
+def test_stream_of_a_finished_order_ends_at_once(db):
+    asyncio.run(db.orders.insert_one({"orderId": "ORDDONE", "paymentStatus": PAID}))
+
+    async def scenario():
+        return [parse(chunk) async for chunk in await open_order_event_stream("ORDDONE")]
+
+    assert [name for name, _ in asyncio.run(scenario())[1:]] == ["status", "end"]
+
+
+def test_idle_stream_sends_heartbeats_then_times_out(pending, monkeypatch):
+    monkeypatch.setattr(settings, "ORDER_EVENTS_HEARTBEAT_SECONDS", 0.02)
+    monkeypatch.setattr(settings, "ORDER_EVENTS_MAX_SECONDS", 0.1)
+
+    async def scenario():
+        return [parse(chunk) async for chunk in await open_order_event_stream(pending)]
+
+    received = asyncio.run(scenario())
+
+    assert received.count((": heartbeat", None)) >= 2
+    assert received[-1] == ("end", {"reason": "timeout"})
+
+
+def test_disconnect_unsubscribes(pending):
+    async def scenario():
+        stream = await open_order_event_stream(pending)
+        await stream.__anext__()
+        await stream.__anext__()
+        during = order_events.stats()["total"]
+        await stream.aclose()  # what Starlette does when the client goes away
+        return during
+
+    assert asyncio.run(scenario()) == 1
+    assert order_events.stats()["total"] == 0
+
+
+def test_unknown_order_is_a_404_without_a_subscription(db):
+    async def scenario():
+        with pytest.raises(HTTPException) as missing:
+            await open_order_event_stream("ORDNOPE")
+        return missing.value.status_code
+
+    assert asyncio.run(scenario()) == 404
+    assert order_events.stats()["total"] == 0
+
+
+def test_events_endpoint_streams_the_status(client, pending, monkeypatch):
+    # The test client buffers the whole body, so keep the stream short
+    monkeypatch.setattr(settings, "ORDER_EVENTS_MAX_SECONDS", 0.05)
+
+    response = client.get(f"/api/orders/{pending}/events")
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    chunks = [parse(f"{chunk}\n\n") for chunk in response.text.strip().split("\n\n")]
+    assert chunks[1] == ("status", {"orderId": pending, "paymentStatus": PENDING})
+    assert chunks[-1] == ("end", {"reason": "timeout"})
+    assert order_events.stats()["total"] == 0
@@ -0,0 +1,154 @@
+"""
+Route query budgets: every /api route declares one and stays within it
+"""
+import asyncio
+import contextvars
+import hashlib
+import hmac
+from types import SimpleNamespace
+
+import pytest
+from fastapi.routing import APIRoute
+
+import main
+from utils import query_budget
+from utils.query_budget import command_counter
+from config import settings
+
+USER = {
+    "fullName": "Budget Check",
+    "address": "1 Test Street",
+    "pincode": "500001",
+    "mobile": "9000000000",
+    "email": "budget@example.com"
+}
+
+
+def call(client, method: str, path: str, expect: int = 200, **kwargs) -> dict:
+    """Request `path`; an over-budget route answers 500 with its command report (strict mode)"""
+    response = client.request(method, path, **kwargs)
+    assert response.status_code == expect, f"{method} {path}: {response.status_code} {response.text[:1000]}"
+    return response.json()
+
+
+def signature(razorpay_order_id: str, payment_id: str) -> str:
+    return hmac.new(
+        settings.RAZORPAY_SECRET.encode(), f"{razorpay_order_id}|{payment_id}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+@pytest.fixture
+def book(client) -> dict:
+    return call(client, "POST", "/api/books/", json={
+        "title": "Budget Book",
+        "description": "Seeded by the budget tests",
+        "price": 199,
+        "image": "",
+        "stock": 50,
+        "author": "CI"
+    })["data"]
+
+
+def test_every_api_route_declares_a_budget():
+    missing = [
+        f"{','.join(sorted(route.methods))} {route.path}"
+        for route in main.create_app().routes
+        if isinstance(route, APIRoute) and route.path.startswith("/api")
+        and query_budget.route_budget(route) is None
+    ]
+    assert missing == []
+
+
+def test_book_routes(client, book):
+    book_id = book["_id"]
+    call(client, "GET", "/api/books/")
+    call(client, "GET", "/api/books/", params={"author": "CI", "sort": "price_asc", "minPrice": 100})
+    call(client, "GET", "/api/books/batch", params={"ids": book_id})
+    call(client, "GET", f"/api/books/{book_id}")
+    call(client, "GET", f"/api/books/{book_id}/related")
+    call(client, "PUT", f"/api/books/{book_id}", json={"price": 249})
+    call(client, "POST", "/api/books/stock/bulk", json={"updates": [{"id": book_id, "delta": 5}]})
+    call(client, "GET", f"/api/images/{book_id}", expect=404)
+    call(client, "DELETE", f"/api/books/{book_id}")
+
+
+def test_order_routes(client, book):
+    order = call(client, "POST", "/api/orders/", json={"bookId": book["_id"], "userDetails": USER})["data"]
+    call(client, "POST", "/api/orders/cart", json={"items": [{"bookId": book["_id"], "quantity": 2}], "userDetails": USER})
+    call(client, "GET", "/api/orders/")
+    call(client, "GET", "/api/orders/", params={"orderId": order["orderId"]})
+    call(client, "GET", f"/api/orders/{order['_id']}")
+    call(client, "GET", "/api/orders/by-customer", params={"email": USER["email"]})
+    call(client, "GET", "/api/delivery/quote", params={"pincode": USER["pincode"]})
+
+
+def test_payment_routes(client, book, razorpay):
+    order = call(client, "POST", "/api/orders/", json={"bookId": book["_id"], "userDetails": USER})["data"]
+    cart = call(client, "POST", "/api/orders/cart", json={"items": [{"bookId": book["_id"]}], "userDetails": USER})["data"]
+
+    payment = call(client, "POST", "/api/payment/create-order", json={"orderId": order["orderId"]})["data"]
+    call(client, "POST", "/api/payment/verify", json={
+        "razorpay_order_id": payment["razorpayOrderId"],
+        "razorpay_payment_id": "pay_budget",
+        "razorpay_signature": signature(payment["razorpayOrderId"], "pay_budget"),
+        "orderId": order["orderId"]
+    })
+    call(client, "POST", "/api/payment/failed", json={"orderId": cart["orderId"], "error": "budget check"})
+    # A paid order's event stream sends its final status and closes
+    with client.stream("GET", f"/api/orders/{order['orderId']}/events") as response:
+        assert response.status_code == 200
+        assert int(response.headers["x-mongo-commands"]) <= 3
+
+
+def test_checkout_route(client, book, razorpay):
+    result = call(client, "POST", "/api/checkout", json={"items": [{"bookId": book["_id"]}], "userDetails": USER})["data"]
+    assert razorpay.created[0]["receipt"] == result["order"]["orderId"]
+
+
+def test_over_budget_request_fails_with_report(client, book, monkeypatch):
+    from controllers import book_controller
+
+    original = book_controller.get_book_by_id
+
+    async def extra_lookups(book_id):
+        for _ in range(2):
+            await book_controller.get_database().books.find_one({})
+        return await original(book_id)
+
+    monkeypatch.setattr(book_controller, "get_book_by_id", extra_lookups)
+    response = client.get(f"/api/books/{book['_id']}")
+    assert response.status_code == 500
+    report = response.json()["report"]
+    assert report["budget"] == 1 and report["commands"] == 3
+    assert [command["command"] for command in report["issued"]] == ["find", "find", "find"]
+    assert list(query_budget.violations)[-1]["route"] == "GET /api/books/{book_id}"
+
+
+def emit(name: str, request_id: int):
+    command_counter.started(SimpleNamespace(command_name=name, command={name: "books"}, request_id=request_id))
+    command_counter.succeeded(SimpleNamespace(request_id=request_id, reply={"ok": 1}, duration_micros=0))
+
+
+def test_concurrent_requests_and_workers_are_counted_apart():
+    async def request(commands: int, first_id: int):
+        log = command_counter.begin()
+        try:
+            for i in range(commands):
+                emit("find", first_id + i)
+                await asyncio.sleep(0)  # let the other request and the worker interleave
+            # Like Motor: the pymongo call runs on an executor thread in a copy of our context
+            context = contextvars.copy_context()
+            await asyncio.get_running_loop().run_in_executor(None, context.run, emit, "insert", first_id + 100)
+            return len(log.commands())
+        finally:
+            command_counter.end(log)
+
+    async def worker():
+        for i in range(10):
+            emit("update", 1000 + i)
+            await asyncio.sleep(0)
+
+    async def run():
+        return await asyncio.gather(request(3, 1), request(5, 10), worker())
+
+    assert asyncio.run(run())[:2] == [4, 6]
@@ -0,0 +1,113 @@
+"""
+Admission control: token buckets, the concurrency cap and client addresses
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from starlette.requests import Request
+
+from utils import rate_limit
+from utils.rate_limit import ConcurrencyLimiter, MemoryRateLimitStore, TokenBucket, client_ip
+from config import settings
+
+
+class Clock:
+    def __init__(self):
+        self.now = 500.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """Rate limiting on, with a fresh store and one request of burst per client"""
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_RATE", 0.25)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_BURST", 1)
+    monkeypatch.setattr(rate_limit, "_store", MemoryRateLimitStore())
+
+
+def request_from(peer: str, forwarded: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 40000)})
+
+
+def order(client):
+    return client.post("/api/orders/", json={"bookId": str(ObjectId()), "userDetails": {
+        "fullName": "Limit Check", "address": "1 Test Street", "pincode": "500001",
+        "mobile": "9000000000", "email": "limit@example.com"
+    }})
+
+
+def test_bucket_allows_the_burst_then_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.take() == 0
+    clock.now += 60
+    assert [bucket.take() for _ in range(4)][-1] > 0  # never more than the capacity
+
+
+def test_memory_store_keeps_one_bucket_per_key(clock):
+    store = MemoryRateLimitStore()
+
+    async def scenario():
+        return [await store.take(key, 1, 1) for key in ("a", "a", "b")]
+
+    assert asyncio.run(scenario()) == [0, 1, 0]
+
+
+def test_concurrency_limiter_rejects_over_the_cap():
+    limiter = ConcurrencyLimiter(2)
+
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+
+
+def test_rate_limited_client_gets_429_with_retry_after(client, limited, clock):
+    assert order(client).status_code == 404  # admitted; the book does not exist
+
+    rejected = order(client)
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "4"
+
+
+def test_busy_route_group_answers_503(client, limited, monkeypatch):
+    limiter = rate_limit._limiters["orders"]
+    monkeypatch.setattr(limiter, "in_flight", limiter.limit)
+
+    busy = order(client)
+    assert busy.status_code == 503
+    assert busy.headers["retry-after"] == "1"
+
+
+def test_client_ip_counts_trusted_proxies_from_the_right(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 2)
+
+    # Spoofed hop from the client, then the client as seen by each proxy
+    assert client_ip(request_from("10.0.0.2", "6.6.6.6, 203.0.113.7, 10.0.0.1")) == "203.0.113.7"
+    # Fewer hops than proxies: the leftmost, never the proxy we talk to
+    assert client_ip(request_from("10.0.0.2", "203.0.113.7")) == "203.0.113.7"
+    assert client_ip(request_from("10.0.0.2", " , ")) == "10.0.0.2"
+    assert client_ip(request_from("10.0.0.2")) == "10.0.0.2"
+
+
+def test_forwarded_header_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+
+    assert client_ip(request_from("198.51.100.4", "6.6.6.6")) == "198.51.100.4"
@@ -0,0 +1,35 @@
+"""
+Co-purchase input: distinct (customer, book) pairs from paid orders
+"""
+import asyncio
+
+from models.order import PaymentStatus
+from workers.recommendations import build_related_table, load_purchases
+
+PAID = PaymentStatus.PAID.value
+
+
+def order(email, status=PAID, **fields) -> dict:
+    return {"paymentStatus": status, "userDetails": {"email": email}, **fields}
+
+
+def test_purchases_are_deduplicated_on_the_server(db):
+    async def scenario():
+        await db.orders.insert_many([
+            order("a@example.com", bookId="b1"),
+            order("a@example.com", bookId="b1", items=[{"bookId": "b1"}, {"bookId": "b2"}]),
+            order("b@example.com", bookId="b3", items=[]),
+            order("c@example.com", PaymentStatus.PENDING.value, bookId="b1"),
+            order("", bookId="b1"),
+        ])
+        await db.orders_archive_202401.insert_one(order("b@example.com", bookId="b1"))
+        return await load_purchases(db)
+
+    purchases, orders = asyncio.run(scenario())
+
+    assert orders == 4
+    assert sorted(purchases) == [
+        ("a@example.com", "b1"), ("a@example.com", "b2"), ("b@example.com", "b1"), ("b@example.com", "b3")
+    ]
+    table = build_related_table(purchases, top_k=2, orders=orders)
+    assert table.lookup("b1") == [("b2", 1), ("b3", 1)]
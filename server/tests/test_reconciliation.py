@@ -0,0 +1,231 @@
+"""
+Reconciliation state transitions against a stubbed gateway
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.order import PaymentStatus
+from workers.reconciliation import Reconciler
+
+PENDING = PaymentStatus.PENDING.value
+EXPIRED = PaymentStatus.EXPIRED.value
+FAILED = PaymentStatus.FAILED.value
+
+
+class StubGateway:
+    """Payments per razorpayOrderId; `before_reply` runs inside the lookup"""
+
+    def __init__(self, payments: dict, before_reply=None):
+        self.payments = payments
+        self.before_reply = before_reply
+        self.looked_up = []
+
+    async def fetch_payments(self, razorpay_order_id: str):
+        self.looked_up.append(razorpay_order_id)
+        if self.before_reply:
+            await self.before_reply(razorpay_order_id)
+        status = self.payments.get(razorpay_order_id)
+        if isinstance(status, Exception):
+            raise status
+        return [{"id": f"pay_{razorpay_order_id}", "status": status}] if status else []
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def book_id(db):
+    return run(db.books.insert_one({"title": "Stock", "price": 100, "stock": 5})).inserted_id
+
+
+def add_order(db, book_id, name: str, status: str = PENDING, age=timedelta(hours=1), **fields) -> dict:
+    order = {
+        "orderId": f"ORD{name}",
+        "bookId": book_id,
+        "razorpayOrderId": f"order_{name}",
+        "paymentStatus": status,
+        "totalAmount": 150,
+        "userDetails": {"pincode": "500001"},
+        "createdAt": datetime.utcnow() - age,
+        **fields
+    }
+    run(db.orders.insert_one(order))
+    return order
+
+
+def status(db, name: str) -> dict:
+    return run(db.orders.find_one({"orderId": f"ORD{name}"}))
+
+
+def stock(db, book_id) -> int:
+    return run(db.books.find_one({"_id": book_id}))["stock"]
+
+
+def reconcile(db, gateway, **kwargs) -> dict:
+    return run(Reconciler(db, gateway, concurrency=4, rate=1000, batch_size=2, **kwargs).run(restart=True))
+
+
+def test_captured_pending_orders_become_paid(db, book_id):
+    add_order(db, book_id, "reserved", stockReserved=True)
+    add_order(db, book_id, "unreserved")
+    report = reconcile(db, StubGateway({"order_reserved": "captured", "order_unreserved": "captured"}))
+
+    assert report["paid"] == 2
+    for name in ("reserved", "unreserved"):
+        order = status(db, name)
+        assert order["paymentStatus"] == PaymentStatus.PAID.value
+        assert order["paymentId"] == f"pay_order_{name}"
+    # Only the unreserved order takes its unit now
+    assert stock(db, book_id) == 4
+
+
+def test_failed_orders_release_their_reservation(db, book_id):
+    add_order(db, book_id, "failed", stockReserved=True)
+    report = reconcile(db, StubGateway({"order_failed": "failed"}))
+
+    assert report["failed"] == 1
+    order = status(db, "failed")
+    assert order["paymentStatus"] == PaymentStatus.FAILED.value
+    assert order["stockReleased"] is True
+    assert stock(db, book_id) == 6
+
+
+def test_orders_without_a_verdict_are_left_alone(db, book_id):
+    young = timedelta(minutes=20)  # past the grace period, not yet expired
+    add_order(db, book_id, "none", age=young)
+    add_order(db, book_id, "authorized")
+    add_order(db, book_id, "error")
+    add_order(db, book_id, "recent", age=timedelta(minutes=1))
+    gateway = StubGateway({"order_authorized": "authorized", "order_error": ConnectionError("timeout")})
+    report = reconcile(db, gateway)
+
+    assert report["unchanged"] == 3 and report["errors"] == 1
+    assert "order_recent" not in gateway.looked_up  # still inside the grace period
+    assert {status(db, name)["paymentStatus"] for name in ("none", "authorized", "error", "recent")} == {PENDING}
+    assert stock(db, book_id) == 5
+
+
+def test_overdue_orders_with_nothing_in_flight_expire(db, book_id):
+    add_order(db, book_id, "abandoned", stockReserved=True)
+    add_order(db, book_id, "created", stockReserved=True)
+    add_order(db, book_id, "authorized", stockReserved=True)
+    report = reconcile(db, StubGateway({"order_created": "created", "order_authorized": "authorized"}))
+
+    assert report["expired"] == 1 and report["unchanged"] == 2
+    order = status(db, "abandoned")
+    assert order["paymentStatus"] == EXPIRED and order["stockReleased"] is True
+    # The customer may still be paying the other two
+    assert {status(db, name)["paymentStatus"] for name in ("created", "authorized")} == {PENDING}
+    assert stock(db, book_id) == 6
+
+
+def test_expiry_sweeper_leaves_gateway_orders_to_the_reconciler(db, book_id):
+    from workers.order_expiry import sweep_expired_orders
+
+    add_order(db, book_id, "checkout", stockReserved=True)
+    add_order(db, book_id, "cart", razorpayOrderId=None, stockReserved=True)
+    assert run(sweep_expired_orders(db)) == 1
+
+    assert status(db, "checkout")["paymentStatus"] == PENDING
+    assert status(db, "cart")["paymentStatus"] == EXPIRED
+    assert stock(db, book_id) == 6
+
+
+def test_late_capture_on_expired_order_retakes_stock(db, book_id):
+    add_order(db, book_id, "late", EXPIRED, stockReserved=True, stockReleased=True)
+    add_order(db, book_id, "late_failed", EXPIRED, stockReserved=True, stockReleased=True)
+    report = reconcile(db, StubGateway({"order_late": "captured", "order_late_failed": "failed"}))
+
+    assert report["paid"] == 1 and report["review"] == 0
+    assert status(db, "late")["paymentStatus"] == PaymentStatus.PAID.value
+    assert status(db, "late")["stockReleased"] is False
+    assert status(db, "late_failed")["paymentStatus"] == EXPIRED
+    assert stock(db, book_id) == 4
+
+
+def test_settled_orders_are_not_asked_about_again(db, book_id):
+    add_order(db, book_id, "gave_up", EXPIRED, stockReserved=True, stockReleased=True)
+    add_order(db, book_id, "still_paying", EXPIRED, stockReserved=True, stockReleased=True)
+    gateway = StubGateway({"order_gave_up": "failed", "order_still_paying": "authorized"})
+
+    reconcile(db, gateway)
+    assert status(db, "gave_up")["gatewayStatus"] == "settled"
+    assert status(db, "still_paying")["gatewayStatus"] == "in_flight"
+    assert status(db, "still_paying")["reconciledAt"]
+
+    gateway.looked_up.clear()
+    gateway.payments["order_still_paying"] = "captured"
+    report = reconcile(db, gateway)
+
+    assert gateway.looked_up == ["order_still_paying"]
+    assert report["paid"] == 1 and status(db, "still_paying")["gatewayStatus"] == "captured"
+
+
+def test_orders_expired_here_are_settled(db, book_id):
+    add_order(db, book_id, "abandoned", stockReserved=True)
+    gateway = StubGateway({})
+    reconcile(db, gateway)
+    assert status(db, "abandoned")["paymentStatus"] == EXPIRED
+
+    gateway.looked_up.clear()
+    reconcile(db, gateway)
+    assert gateway.looked_up == []
+
+
+def test_failed_orders_are_rechecked_for_a_retry(db, book_id):
+    # /failed was reported, then a retry in the same checkout captured without /verify
+    add_order(db, book_id, "retried", FAILED, stockReserved=True, stockReleased=True)
+    report = reconcile(db, StubGateway({"order_retried": "captured"}))
+
+    assert report["paid"] == 1
+    assert status(db, "retried")["paymentStatus"] == PaymentStatus.PAID.value
+    assert stock(db, book_id) == 4
+
+
+def test_late_capture_without_stock_is_flagged_not_oversold(db, book_id):
+    run(db.books.update_one({"_id": book_id}, {"$set": {"stock": 0}}))
+    add_order(db, book_id, "sold", EXPIRED, stockReserved=True, stockReleased=True)
+    report = reconcile(db, StubGateway({"order_sold": "captured"}))
+
+    order = status(db, "sold")
+    assert report["review"] == 1
+    assert order["paymentStatus"] == PaymentStatus.PAID.value
+    assert order["needsReview"] is True and order["stockShortfall"] == [book_id]
+    assert stock(db, book_id) == 0
+
+
+def test_expired_orders_past_the_lookback_are_not_checked(db, book_id):
+    add_order(db, book_id, "old", EXPIRED, age=timedelta(days=30), stockReserved=True, stockReleased=True)
+    gateway = StubGateway({"order_old": "captured"})
+    reconcile(db, gateway)
+
+    assert gateway.looked_up == []
+    assert status(db, "old")["paymentStatus"] == EXPIRED
+
+
+def test_orders_settled_elsewhere_meanwhile_are_not_touched(db, book_id):
+    add_order(db, book_id, "raced")
+
+    async def verify_lands_first(razorpay_order_id):
+        await db.orders.update_one({"orderId": "ORDraced"}, {"$set": {"paymentStatus": PaymentStatus.PAID.value}})
+
+    report = reconcile(db, StubGateway({"order_raced": "captured"}, before_reply=verify_lands_first))
+
+    assert report["paid"] == 0
+    assert "reconciledAt" not in status(db, "raced")
+    assert stock(db, book_id) == 5  # /verify already took the unit, not us
+
+
+def test_progress_is_checkpointed(db, book_id):
+    for i in range(5):
+        add_order(db, book_id, f"page{i}")
+    gateway = StubGateway({})
+    first = run(Reconciler(db, gateway, concurrency=2, rate=1000, batch_size=2).run(limit=2))
+    second = run(Reconciler(db, gateway, concurrency=2, rate=1000, batch_size=2).run())
+
+    assert first["checked"] == 2 and second["checked"] == 3
+    assert gateway.looked_up == [f"order_page{i}" for i in range(5)]
+    assert run(db.jobs.find_one({"_id": "payment_reconciliation"}))["lastId"] is None
@@ -0,0 +1,217 @@
+"""
+Circuit breaker and bulkhead behaviour of the outbound dependency policy
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from controllers import payment_controller
+from utils import resilience
+from utils.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Dependency, DependencyUnavailable
+
+
+class Clock:
+    """Stands in for time.monotonic so reset timeouts pass instantly"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def dependency(name: str, **options) -> Dependency:
+    policy = {"timeout": 1, "max_concurrent": 4, "max_wait": 0, "failure_threshold": 2, "reset_timeout": 30}
+    return Dependency(f"test_{name}", **{**policy, **options})
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise ConnectionError("gateway down")
+
+
+async def attempt(dep: Dependency, fn) -> str:
+    """The call's outcome: its result, the rejection reason or the error type"""
+    try:
+        return await dep.call(fn)
+    except DependencyUnavailable as e:
+        return e.reason
+    except Exception as e:
+        return type(e).__name__
+
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast(clock):
+    dep = dependency("opens")
+    calls = []
+
+    async def counted():
+        calls.append(1)
+        return await fail()
+
+    async def scenario():
+        return [await attempt(dep, counted) for _ in range(4)]
+
+    assert asyncio.run(scenario()) == ["ConnectionError", "ConnectionError", "circuit open", "circuit open"]
+    assert len(calls) == 2  # the open circuit never reached the dependency
+    assert dep.breaker.state == OPEN and dep.counts["rejectedOpen"] == 2
+    with pytest.raises(DependencyUnavailable) as rejected:
+        asyncio.run(dep.call(succeed))
+    assert rejected.value.retry_after == 30
+
+
+def test_successes_reset_the_failure_count(clock):
+    dep = dependency("resets")
+
+    async def scenario():
+        return [await attempt(dep, fn) for fn in (fail, succeed, fail, succeed)]
+
+    assert asyncio.run(scenario()) == ["ConnectionError", "ok", "ConnectionError", "ok"]
+    assert dep.breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_the_circuit(clock):
+    dep = dependency("closes")
+
+    async def scenario():
+        probe_started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_success():
+            probe_started.set()
+            await release.wait()
+            return "ok"
+
+        for _ in range(2):
+            await attempt(dep, fail)
+        clock.now += 31
+
+        probe = asyncio.create_task(attempt(dep, slow_success))
+        await probe_started.wait()
+        # Only one probe at a time while half-open
+        assert dep.breaker.state == HALF_OPEN
+        assert await attempt(dep, succeed) == "circuit open"
+        release.set()
+        return await probe
+
+    assert asyncio.run(scenario()) == "ok"
+    assert dep.breaker.state == CLOSED and dep.breaker.failures == 0
+    assert asyncio.run(attempt(dep, succeed)) == "ok"
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    dep = dependency("reopens")
+
+    async def scenario():
+        for _ in range(2):
+            await attempt(dep, fail)
+        clock.now += 31
+        return [await attempt(dep, fail), await attempt(dep, succeed)]
+
+    assert asyncio.run(scenario()) == ["ConnectionError", "circuit open"]
+    assert dep.breaker.state == OPEN and dep.breaker.opens == 2
+
+
+def test_timeouts_count_as_failures(clock):
+    dep = dependency("timeouts", timeout=0.01, failure_threshold=1)
+
+    async def hang():
+        await asyncio.sleep(1)
+
+    async def scenario():
+        return [await attempt(dep, hang), await attempt(dep, succeed)]
+
+    assert asyncio.run(scenario()) == ["no response within 0.01s", "circuit open"]
+    assert dep.counts["timeouts"] == 1
+
+
+def test_errors_the_dependency_is_not_blamed_for_keep_it_closed(clock):
+    dep = dependency("client_errors", failure_threshold=1, is_failure=lambda e: not isinstance(e, ValueError))
+
+    async def rejected():
+        raise ValueError("bad request")
+
+    async def scenario():
+        return [await attempt(dep, rejected) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == ["ValueError"] * 3
+    assert dep.breaker.state == CLOSED
+
+
+def test_full_bulkhead_rejects_without_calling(clock):
+    dep = dependency("bulkhead", max_concurrent=2, max_wait=0)
+    entered = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def held():
+            entered.append(1)
+            await release.wait()
+            return "ok"
+
+        in_flight = [asyncio.create_task(attempt(dep, held)) for _ in range(2)]
+        await asyncio.sleep(0)
+        rejected = await attempt(dep, held)
+        stats = dep.stats()
+        release.set()
+        return rejected, stats, await asyncio.gather(*in_flight)
+
+    rejected, stats, served = asyncio.run(scenario())
+    assert rejected == "too many concurrent calls"
+    assert served == ["ok", "ok"] and len(entered) == 2
+    assert stats["inFlight"] == 2 and stats["rejectedFull"] == 1
+    # A full bulkhead is back-pressure, not a failing dependency
+    assert dep.breaker.state == CLOSED and dep.stats()["inFlight"] == 0
+
+
+def test_queued_callers_get_a_freed_slot_within_max_wait(clock):
+    dep = dependency("queue", max_concurrent=1, max_wait=1)
+
+    async def brief():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def scenario():
+        return await asyncio.gather(*(attempt(dep, brief) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["ok"] * 3
+    assert dep.counts["rejectedFull"] == 0
+
+
+def test_bulkhead_rejection_frees_the_half_open_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 31
+
+    assert breaker.allow() == 0 and breaker.state == HALF_OPEN
+    assert breaker.allow() > 0  # the single probe slot is taken
+    breaker.record_abandoned()
+    assert breaker.allow() == 0
+
+
+def test_open_gateway_answers_503_with_retry_after(client, razorpay, monkeypatch, clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=12)
+    breaker.record_failure()
+    monkeypatch.setattr(payment_controller.razorpay_gateway, "breaker", breaker)
+    book = client.post("/api/books/", json={
+        "title": "Breaker", "description": "Seeded by the breaker test", "price": 100, "image": "", "stock": 3, "author": "CI"
+    }).json()["data"]
+    order = client.post("/api/orders/", json={"bookId": book["_id"], "userDetails": {
+        "fullName": "Breaker Check", "address": "1 Test Street", "pincode": "500001",
+        "mobile": "9000000000", "email": "breaker@example.com"
+    }}).json()["data"]
+
+    response = client.post("/api/payment/create-order", json={"orderId": order["orderId"]})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "12"
+    assert razorpay.created == []
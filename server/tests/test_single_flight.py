@@ -0,0 +1,105 @@
+"""
+Single-flight coalescing: shared calls, cancellation and the micro-cache
+"""
+import asyncio
+
+import pytest
+
+from controllers import book_controller
+from utils.single_flight import SingleFlight
+
+
+class SlowLoad:
+    """A load that waits until released, counting how often it ran"""
+
+    def __init__(self, value):
+        self.value = value
+        self.runs = 0
+        self.release = None
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        return self.value
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test.dedupe")
+    load = SlowLoad({"title": "Shared"})
+
+    async def scenario():
+        load.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(flight.do("k", load)) for _ in range(5)]
+        await asyncio.sleep(0)
+        load.release.set()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(scenario())
+    assert load.runs == 1 and flight.stats()["shared"] == 4
+    assert all(result == {"title": "Shared"} for result in results)
+
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    flight = SingleFlight("test.cancel")
+    load = SlowLoad("done")
+
+    async def scenario():
+        load.release = asyncio.Event()
+        leader = asyncio.ensure_future(flight.do("k", load))
+        follower = asyncio.ensure_future(flight.do("k", load))
+        await asyncio.sleep(0)
+        leader.cancel()  # e.g. the first client disconnected
+        await asyncio.sleep(0)
+        load.release.set()
+        return leader, await follower
+
+    leader, result = asyncio.run(scenario())
+    assert leader.cancelled() and result == "done" and load.runs == 1
+
+
+def test_failures_are_not_cached():
+    flight = SingleFlight("test.failure", ttl=60)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("reset")
+        return "ok"
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(flight.do("k", flaky))
+    assert asyncio.run(flight.do("k", flaky)) == "ok"
+    assert asyncio.run(flight.do("k", flaky)) == "ok" and len(calls) == 2
+
+
+def test_callers_cannot_change_the_shared_result():
+    flight = SingleFlight("test.copies", ttl=60)
+
+    async def load():
+        return {"title": "Original", "tags": ["a"]}
+
+    first = asyncio.run(flight.do("k", load))
+    first["title"] = "Edited"
+    first["tags"].append("b")
+
+    assert asyncio.run(flight.do("k", load)) == {"title": "Original", "tags": ["a"]}
+    assert flight.get_cached("k") == {"title": "Original", "tags": ["a"]}
+
+    primed = {"title": "Primed"}
+    flight.prime("p", primed)
+    primed["title"] = "Edited"
+    assert flight.get_cached("p") == {"title": "Primed"}
+
+
+def test_update_book_drops_the_cached_lookup(client, db):
+    book_id = asyncio.run(db.books.insert_one({
+        "title": "Before", "description": "d", "price": 100, "image": "", "stock": 2, "author": "A"
+    })).inserted_id
+
+    assert client.get(f"/api/books/{book_id}").json()["data"]["title"] == "Before"
+    assert book_controller.book_lookups.get_cached(str(book_id)) is not None
+
+    assert client.put(f"/api/books/{book_id}", json={"title": "After"}).status_code == 200
+    assert book_controller.book_lookups.get_cached(str(book_id)) is None
+    assert client.get(f"/api/books/{book_id}").json()["data"]["title"] == "After"
@@ -0,0 +1,142 @@
+"""
+Flash-sale stock pools: leasing near sell-out, flush failures, listed stock
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from utils.stock_pool import StockPools
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def add_book(db, stock: int) -> object:
+    return run(db.books.insert_one({"title": "Launch", "price": 100, "stock": stock, "flash_sale": True})).inserted_id
+
+
+def book(db, book_id) -> dict:
+    return run(db.books.find_one({"_id": book_id}))
+
+
+class FailingBooks:
+    """books collection whose bulk_write fails with `error`"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+    async def bulk_write(self, ops, ordered=True):
+        raise self.error
+
+
+def test_last_units_are_shared_between_workers(db):
+    book_id = add_book(db, 15)
+    first, second = StockPools("w1", block=10), StockPools("w2", block=10)
+
+    assert run(first.reserve(db, book_id, 1))  # leases a full block
+    # Five left: each reservation now leases only what it needs
+    assert all(run(second.reserve(db, book_id, 1)) for _ in range(2))
+
+    document = book(db, book_id)
+    assert document["leases"]["w2"]["units"] == 2
+    assert document["stock"] == 3 and document["leased"] == 12
+
+
+def test_reservations_never_exceed_stock(db):
+    book_id = add_book(db, 5)
+    pools = [StockPools(f"w{i}", block=10) for i in range(3)]
+
+    sold = sum(run(pool.reserve(db, book_id, 1)) for _ in range(4) for pool in pools)
+
+    document = book(db, book_id)
+    assert sold == 5
+    assert document["stock"] == 0 and document["leased"] == 5
+    # Every worker got a share instead of one pool holding the remainder
+    assert all(document["leases"][f"w{i}"]["units"] for i in range(3))
+
+
+def test_flush_settles_and_returns_leftovers(db):
+    book_id = add_book(db, 20)
+    pools = StockPools("w1", block=10)
+    run(pools.reserve(db, book_id, 3))
+
+    assert run(pools.flush(db, return_all=True)) == 1
+    document = book(db, book_id)
+    assert document["stock"] == 17 and document["leased"] == 0
+    assert document["leases"] == {}  # the returned lease leaves no per-worker key
+    assert pools.stats() == {"books": 1, "available": 0, "unsettled": 0}
+
+
+def test_partial_flush_failure_restores_only_failed_ops(db):
+    pools = StockPools("w1", block=10)
+    first, second = add_book(db, 20), add_book(db, 20)
+    run(pools.reserve(db, first, 2))
+    run(pools.reserve(db, second, 3))
+
+    error = BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000"}], "nInserted": 0})
+    with pytest.raises(BulkWriteError):
+        run(pools.flush(SimpleNamespace(books=FailingBooks(error))))
+
+    # The first book's settlement was applied; only the second retries
+    assert pools._pools[first].consumed == 0
+    assert pools._pools[second].consumed == 3
+
+
+def test_ambiguous_flush_failure_is_not_retried(db):
+    pools = StockPools("w1", block=10)
+    book_id = add_book(db, 20)
+    run(pools.reserve(db, book_id, 2))
+
+    with pytest.raises(AutoReconnect):
+        run(pools.flush(SimpleNamespace(books=FailingBooks(AutoReconnect("connection reset"))), return_all=True))
+
+    # Replaying it might settle the same units twice
+    assert pools.stats()["unsettled"] == 0 and pools.stats()["available"] == 0
+
+
+def test_book_lookups_count_leased_stock(client, db):
+    book_id = add_book(db, 20)
+    run(StockPools("w1", block=10).reserve(db, book_id, 1))
+
+    detail = client.get(f"/api/books/{book_id}").json()["data"]
+    batch = client.get("/api/books/batch", params={"ids": str(book_id)}).json()["data"]
+    listing = client.get("/api/books/").json()["data"]
+
+    assert detail["stock"] == batch[0]["stock"] == listing[0]["stock"] == 20
+    # Lease bookkeeping (worker host names and pids) stays on the server
+    assert not any("leases" in book for book in (detail, batch[0], listing[0]))
+
+
+def test_settled_lease_keeps_a_concurrent_lease(db):
+    book_id = add_book(db, 20)
+    pools = StockPools("w1", block=10)
+    run(pools.reserve(db, book_id, 10))
+
+    # Everything consumed and settled: the key goes
+    run(pools.flush(db))
+    assert "w1" not in book(db, book_id)["leases"]
+
+    run(pools.reserve(db, book_id, 1))
+    run(pools.flush(db))
+    # Nine units are still held, so the lease stays
+    assert book(db, book_id)["leases"]["w1"]["units"] == 9
+
+
+def test_order_responses_hide_book_leases(client, db):
+    book_id = run(db.books.insert_one({
+        "title": "Launch", "price": 100, "stock": 10, "leased": 10, "leases": {"w1": {"units": 10}}
+    })).inserted_id
+    order = client.post("/api/orders/", json={"bookId": str(book_id), "userDetails": {
+        "fullName": "Lease Check", "address": "1 Test Street", "pincode": "500001",
+        "mobile": "9000000000", "email": "lease@example.com"
+    }}).json()["data"]
+
+    by_id = client.get(f"/api/orders/{order['_id']}").json()["data"]
+    by_order_id = client.get("/api/orders/", params={"orderId": order["orderId"]}).json()["data"][0]
+    listed = client.get("/api/orders/").json()["data"][0]
+
+    assert all(populated["bookId"]["title"] == "Launch" for populated in (by_id, by_order_id, listed))
+    assert not any("leases" in populated["bookId"] for populated in (by_id, by_order_id, listed))
@@ -0,0 +1,119 @@
+"""
+Traffic capture: customer and payment data never reach the capture files
+"""
+import glob
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from utils import traffic_capture
+from utils.traffic_capture import TrafficRecorder
+from config import settings
+
+CUSTOMER = {
+    "fullName": "Jane Customer",
+    "address": "42 Private Lane, Flat 7",
+    "pincode": "560034",
+    "mobile": "9876543210",
+    "email": "jane.customer@example.org"
+}
+PAYMENT = {
+    "razorpay_order_id": "order_Secret123",
+    "razorpay_payment_id": "pay_Secret456",
+    "razorpay_signature": "f00dfacecafe",
+    "orderId": "ORD1"
+}
+SECRETS = [
+    "Jane Customer", "Private Lane", "560034", "9876543210", "jane.customer",
+    "order_Secret123", "pay_Secret456", "f00dfacecafe"
+]
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    return TrafficRecorder(str(tmp_path), max_file_bytes=1024 * 1024, max_files=3)
+
+
+@pytest.fixture
+def capture(db, recorder, monkeypatch):
+    """Run requests through an app with capture on; returns the records on disk"""
+    monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_ENABLED", True)
+    monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(traffic_capture, "recorder", recorder)
+    monkeypatch.setattr(main, "traffic_recorder", recorder)
+
+    def run(*requests) -> list:
+        with TestClient(main.create_app()) as client:
+            for method, url, kwargs in requests:
+                client.request(method, url, **kwargs)
+        # The lifespan flushed on shutdown
+        lines = []
+        for path in sorted(glob.glob(os.path.join(recorder.directory, "traffic-*.ndjson"))):
+            with open(path) as f:
+                lines.extend(f.read().splitlines())
+        return lines
+
+    return run
+
+
+def test_user_details_are_replaced_by_a_stable_synthetic_customer(recorder):
+    redacted = recorder.redact({"bookId": "abc", "userDetails": CUSTOMER})
+    again = recorder.redact_user_details({**CUSTOMER, "email": " Jane.Customer@Example.org "})
+
+    details = redacted["userDetails"]
+    assert redacted["bookId"] == "abc"
+    assert details["fullName"] == details["address"] == "Redacted"
+    assert details["pincode"] == "560001"  # same delivery zone
+    assert details["mobile"].startswith("9") and len(details["mobile"]) == 10
+    assert details["email"].startswith("replay+") and details["email"].endswith("@example.com")
+    assert again["email"] == details["email"]
+    assert not any(secret in json.dumps(redacted) for secret in SECRETS)
+
+
+def test_odd_user_details_still_come_out_synthetic(recorder):
+    assert recorder.redact({"userDetails": "jane"})["userDetails"] == {}
+    assert recorder.redact_user_details({"pincode": "12ab"})["pincode"] == "500001"
+
+
+def test_payment_ids_and_signatures_are_removed_at_any_depth(recorder):
+    redacted = recorder.redact({**PAYMENT, "attempts": [{"paymentId": "pay_X", "paymentSignature": "sig"}]})
+
+    assert {key: redacted[key] for key in PAYMENT} == {
+        "razorpay_order_id": "REDACTED",
+        "razorpay_payment_id": "REDACTED",
+        "razorpay_signature": "REDACTED",
+        "orderId": "ORD1"
+    }
+    assert redacted["attempts"] == [{"paymentId": "REDACTED", "paymentSignature": "REDACTED"}]
+
+
+def test_customer_lookups_in_the_query_string_are_pseudonymized(recorder):
+    query = recorder.redact_query("email=Jane.Customer%40example.org&mobile=9876543210&limit=5&cursor=abc")
+    params = dict(pair.split("=") for pair in query.split("&"))
+
+    assert params["email"].startswith("replay%2B") and params["email"].endswith("%40example.com")
+    assert params["mobile"].startswith("9") and params["mobile"] != "9876543210"
+    assert (params["limit"], params["cursor"]) == ("5", "abc")
+    assert recorder.redact_query("email=jane.customer%40example.org") == query.split("&")[0]
+
+
+def test_capture_files_hold_no_customer_or_payment_data(capture):
+    lines = capture(
+        ("POST", "/api/orders/", {"json": {"bookId": "0" * 24, "userDetails": CUSTOMER}}),
+        ("POST", "/api/payment/verify", {"json": PAYMENT}),
+        ("GET", "/api/orders/by-customer", {"params": {"email": CUSTOMER["email"], "limit": 5}}),
+    )
+
+    records = [json.loads(line) for line in lines]
+    assert [(record["method"], record["path"]) for record in records] == [
+        ("POST", "/api/orders/"), ("POST", "/api/payment/verify"), ("GET", "/api/orders/by-customer")
+    ]
+    order, payment, history = records
+    assert order["body"]["userDetails"]["fullName"] == "Redacted"
+    assert payment["body"]["razorpay_signature"] == "REDACTED"
+    assert history["route"] == "/api/orders/by-customer" and "replay%2B" in history["query"]
+    for secret in SECRETS:
+        assert not any(secret in line for line in lines), secret
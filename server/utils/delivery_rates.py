@@ -0,0 +1,110 @@
+"""
+Pincode delivery rate table with an O(1) prefix index
+
+Rates are declared per pincode prefix (1-6 digits) in a CSV file:
+
+    prefix,zone,charge,extra_item_charge,min_days,max_days
+    5,regional,50,10,3,5
+    500,local,30,5,1,2
+
+The longest matching prefix wins. Every 6-digit pincode is pre-resolved into
+a flat array of zone numbers (2 bytes per pincode, ~2 MB in total), so a
+lookup is one array read no matter how many rows the table has.
+"""
+import csv
+import os
+import time
+from array import array
+from typing import Iterable, List, NamedTuple, Optional
+
+PINCODE_DIGITS = 6
+PINCODE_SPACE = 10 ** PINCODE_DIGITS
+MAX_ZONES = 65535  # zone numbers are stored as unsigned 16-bit ints
+
+
+class Zone(NamedTuple):
+    name: str
+    charge: float
+    extra_item_charge: float
+    min_days: int
+    max_days: int
+
+
+class RateTable:
+    """Immutable once built; reloading builds a new table and swaps it in"""
+
+    def __init__(self, zones: List[Zone], index: array, rows: int = 0,
+                 source: Optional[str] = None, mtime: Optional[float] = None):
+        self.zones = zones
+        self.index = index
+        self.rows = rows
+        self.source = source
+        self.mtime = mtime
+        self.loaded_at = time.time()
+
+    @classmethod
+    def build(cls, rows: Iterable[dict], default_zone: Zone, **kwargs) -> "RateTable":
+        """Resolve prefix rows into the dense pincode -> zone index"""
+        zones = [default_zone]
+        zone_numbers = {default_zone: 0}
+        entries = []
+
+        for line, row in enumerate(rows, start=2):
+            prefix = (row.get("prefix") or "").strip()
+            if not prefix.isdigit() or len(prefix) > PINCODE_DIGITS:
+                raise ValueError(f"line {line}: invalid prefix {prefix!r}")
+            try:
+                zone = Zone(
+                    name=row["zone"].strip(),
+                    charge=float(row["charge"]),
+                    extra_item_charge=float(row.get("extra_item_charge") or 0),
+                    min_days=int(row["min_days"]),
+                    max_days=int(row["max_days"])
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"line {line}: {e}")
+            if zone.charge < 0 or zone.extra_item_charge < 0 or not 0 <= zone.min_days <= zone.max_days:
+                raise ValueError(f"line {line}: invalid charge or delivery days")
+
+            if zone not in zone_numbers:
+                if len(zones) >= MAX_ZONES:
+                    raise ValueError(f"more than {MAX_ZONES} distinct zones")
+                zone_numbers[zone] = len(zones)
+                zones.append(zone)
+            entries.append((prefix, zone_numbers[zone]))
+
+        index = array("H", bytes(2 * PINCODE_SPACE))
+        # Shorter prefixes first so longer (more specific) ones overwrite them
+        entries.sort(key=lambda entry: len(entry[0]))
+        for prefix, number in entries:
+            span = 10 ** (PINCODE_DIGITS - len(prefix))
+            start = int(prefix) * span
+            if span == 1:
+                index[start] = number
+            else:
+                index[start:start + span] = array("H", [number]) * span
+
+        return cls(zones, index, rows=len(entries), **kwargs)
+
+    @classmethod
+    def load(cls, path: str, default_zone: Zone) -> "RateTable":
+        """Read and index a CSV rate file (blocking; run off the event loop)"""
+        mtime = os.stat(path).st_mtime
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls.build(csv.DictReader(f), default_zone, source=path, mtime=mtime)
+
+    @classmethod
+    def empty(cls, default_zone: Zone) -> "RateTable":
+        """Every pincode in the default zone"""
+        return cls.build([], default_zone)
+
+    def lookup(self, pincode: int) -> Zone:
+        return self.zones[self.index[pincode]]
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.rows,
+            "zones": len(self.zones) - 1,
+            "source": self.source,
+            "loadedAt": self.loaded_at
+        }
@@ -0,0 +1,103 @@
+"""
+Size-bounded on-disk LRU cache
+
+Entries are plain files in one directory so they can be served straight
+from disk. Recency is kept in memory and mirrored to file mtimes, which lets
+the index be rebuilt after a restart.
+
+Every method touches the disk (the constructor lists the directory, get()
+updates an mtime, put() writes), so call them from a worker thread. The
+index is guarded by a lock held only for in-memory updates, never across
+disk I/O.
+"""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+
+class DiskLRUCache:
+    """Files keyed by name, evicting least recently used ones over `max_bytes`"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.total_bytes += size
+        self._remove(self._evict())
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of a cached entry (marking it recently used), or None"""
+        if key not in self._entries:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                if key in self._entries:
+                    self.total_bytes -= self._entries.pop(key)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        """Atomically write an entry and evict old ones; returns its path"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            evicted = self._evict(keep=key)
+        self._remove(evicted)
+        return self.path(key)
+
+    def _evict(self, keep: Optional[str] = None) -> List[str]:
+        """Drop least recently used entries from the index; returns their keys"""
+        evicted = []
+        while self.total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self.total_bytes -= self._entries.pop(key)
+            evicted.append(key)
+        return evicted
+
+    def _remove(self, keys: List[str]):
+        for key in keys:
+            if key in self._entries:
+                continue  # written again since it was evicted
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.total_bytes, "maxBytes": self.max_bytes}
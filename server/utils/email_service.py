@@ -1,9 +1,17 @@
-import aiosmtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
+from utils.resilience import Dependency
 from config import settings
 
+# A slow or dead mail server must not hold up /verify
+smtp = Dependency(
+    "smtp",
+    timeout=settings.EMAIL_TIMEOUT_SECONDS,
+    max_concurrent=settings.EMAIL_MAX_CONCURRENCY,
+    max_wait=settings.DEPENDENCY_QUEUE_SECONDS,
+    failure_threshold=settings.EMAIL_BREAKER_FAILURES,
+    reset_timeout=settings.EMAIL_BREAKER_RESET_SECONDS
+)
+
 async def send_order_confirmation_email(order: dict):
     """Send order confirmation email"""
     try:
@@ -17,6 +25,11 @@ async def send_order_confirmation_email(order: dict):
             print("Email credentials not configured")
             return
         
+        # Imported lazily to keep them off the cold-start path
+        import aiosmtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        
         # Format delivery date
         delivery_date = order.get("deliveryDate")
         if isinstance(delivery_date, datetime):
@@ -28,6 +41,15 @@ async def send_order_confirmation_email(order: dict):
         user_details = order.get("userDetails", {})
         book = order.get("bookId", {})
         
+        if order.get("items"):
+            books_html = "".join(
+                f"<li>{item['title']} × {item['quantity']} — ₹{item['price'] * item['quantity']}</li>"
+                for item in order["items"]
+            )
+            books_html = f"<ul style=\"margin: 0; padding-left: 20px;\">{books_html}</ul>"
+        else:
+            books_html = book.get('title', 'N/A')
+        
         # Create message
         message = MIMEMultipart("alternative")
         message["Subject"] = f"Order Confirmation - {order['orderId']}"
@@ -46,7 +68,7 @@ async def send_order_confirmation_email(order: dict):
             <div style="background-color: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
                 <h3 style="margin-top: 0;">Order Details:</h3>
                 <p><strong>Order ID:</strong> {order['orderId']}</p>
-                <p><strong>Book:</strong> {book.get('title', 'N/A')}</p>
+                <p><strong>Book:</strong> {books_html}</p>
                 <p><strong>Amount:</strong> ₹{order.get('amount', 0)}</p>
                 <p><strong>Delivery Charges:</strong> ₹{order.get('deliveryCharges', 50)}</p>
                 <p><strong>Total Amount:</strong> ₹{order.get('totalAmount', 0)}</p>
@@ -71,13 +93,15 @@ async def send_order_confirmation_email(order: dict):
         message.attach(part)
         
         # Send email
-        await aiosmtplib.send(
+        await smtp.call(
+            aiosmtplib.send,
             message,
             hostname=smtp_host,
             port=smtp_port,
             username=smtp_user,
             password=smtp_password,
             start_tls=True,
+            timeout=settings.EMAIL_TIMEOUT_SECONDS,
         )
         
         print(f"✅ Email sent successfully to: {user_details.get('email')}")
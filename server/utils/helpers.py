@@ -1,8 +1,10 @@
 """
 Utility functions and helpers
 """
+import base64
+from datetime import datetime
 from bson import ObjectId
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 def serialize_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -47,3 +49,37 @@ def validate_object_id(id_str: str) -> bool:
         True if valid ObjectId, False otherwise
     """
     return ObjectId.is_valid(id_str)
+
+def encode_cursor(created_at: datetime, doc_id: ObjectId) -> str:
+    """
+    Encode a keyset pagination position as an opaque URL-safe token
+    
+    Args:
+        created_at: Sort key of the last document on the page
+        doc_id: _id of the last document, used as the tie-breaker
+        
+    Returns:
+        Cursor string for the next page
+    """
+    raw = f"{created_at.isoformat()}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decode a cursor produced by encode_cursor
+    
+    Args:
+        cursor: Opaque cursor token
+        
+    Returns:
+        (created_at, _id) tuple
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,106 @@
+"""
+Event-loop lag and blocking-call detector
+
+A sampler coroutine measures how late the loop wakes it up (scheduling lag)
+and publishes it as a metric. In debug mode a watchdog thread also pings the
+loop; if a ping is not serviced within the stall threshold, whatever is
+holding the loop (e.g. a sync HTTP call or a blocking print) has its stack
+captured from the loop thread and logged.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from utils.metrics import metrics
+from config import settings
+
+
+class LoopMonitor:
+    """Samples loop lag and, optionally, captures stacks of stalled callbacks"""
+
+    def __init__(self, interval: float, stall_threshold: float, capture_stacks: bool):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.capture_stacks = capture_stacks
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.recent_stalls = deque(maxlen=20)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def run(self):
+        """Sampler coroutine; runs until cancelled"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+
+        if self.capture_stacks:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+        try:
+            while True:
+                started = self._loop.time()
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, self._loop.time() - started - self.interval)
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                metrics.set("loop.lagMs", round(lag * 1000, 2))
+                metrics.set("loop.maxLagMs", round(self.max_lag * 1000, 2))
+        finally:
+            self._stop.set()
+
+    def _watch(self):
+        """Watchdog thread: a ping the loop cannot service in time means it is blocked"""
+        while not self._stop.is_set():
+            serviced = threading.Event()
+            try:
+                self._loop.call_soon_threadsafe(serviced.set)
+            except RuntimeError:
+                return  # loop closed
+
+            if not serviced.wait(self.stall_threshold):
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                started = time.monotonic()
+                serviced.wait()
+                self._record_stall(time.monotonic() - started + self.stall_threshold, stack)
+
+            self._stop.wait(self.stall_threshold)
+
+    def _record_stall(self, duration: float, stack: str):
+        self.stall_count += 1
+        metrics.inc("loop.stalls")
+        self.recent_stalls.append({
+            "durationMs": round(duration * 1000, 1),
+            "at": time.time(),
+            "stack": stack
+        })
+        # Written straight to stderr from this thread: the loop is what's blocked
+        sys.stderr.write(
+            f"⚠️  Event loop blocked for {duration * 1000:.0f} ms at:\n{stack}\n"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "lagMs": round(self.last_lag * 1000, 2),
+            "maxLagMs": round(self.max_lag * 1000, 2),
+            "stalls": self.stall_count,
+            "stallThresholdMs": round(self.stall_threshold * 1000),
+            "captureStacks": self.capture_stacks,
+            "recentStalls": list(self.recent_stalls)
+        }
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL,
+    stall_threshold=settings.LOOP_STALL_THRESHOLD_MS / 1000,
+    capture_stacks=settings.LOOP_STALL_CAPTURE
+)
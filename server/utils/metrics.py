@@ -0,0 +1,38 @@
+"""
+Lightweight in-process metrics registry
+
+Counters and gauges are plain numbers keyed by dotted names. Components that
+already keep their own statistics register a collector instead, which is
+evaluated lazily when a snapshot is taken (GET /api/metrics).
+"""
+from typing import Any, Callable, Dict
+
+
+class MetricsRegistry:
+    """Process-local counters, gauges and lazily evaluated collectors"""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Any]] = {}
+
+    def inc(self, name: str, value: float = 1):
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        self._gauges[name] = value
+
+    def register(self, name: str, collector: Callable[[], Any]):
+        """Register a callable returning a number or a dict of numbers"""
+        self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {}
+        data.update(self._counters)
+        data.update(self._gauges)
+        for name, collector in self._collectors.items():
+            data[name] = collector()
+        return data
+
+
+metrics = MetricsRegistry()
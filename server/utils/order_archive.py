@@ -0,0 +1,93 @@
+"""
+Cold storage for old paid orders
+
+The archiver (workers/order_archive.py) moves paid orders past
+ORDER_ARCHIVE_AFTER_DAYS out of `orders` into one collection per month,
+`orders_archive_YYYYMM`, bucketed by the creation time in the order's
+ObjectId. Lookups that miss the hot collection derive the month from the id
+they were given (the ObjectId timestamp, or the unix time embedded in an
+`ORD<unix><rand>` orderId) and read just that bucket, so a fall-through costs
+one extra query, or two right at a month boundary.
+
+Newest-first listings (customer history, the admin list) read the hot
+collection and then archive months newest first, a few per page; see
+order_controller.newest_orders.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+
+ARCHIVE_PREFIX = "orders_archive_"
+
+# orderId and _id are generated moments apart; near a month boundary they can
+# land in different months, so the neighbouring bucket is checked too
+BOUNDARY_SLACK = timedelta(minutes=5)
+
+
+def archive_name(when: datetime) -> str:
+    return f"{ARCHIVE_PREFIX}{when:%Y%m}"
+
+
+def month_start(name: str) -> datetime:
+    """First instant of an archive collection's month"""
+    return datetime.strptime(name[len(ARCHIVE_PREFIX):], "%Y%m")
+
+
+def month_end(name: str) -> datetime:
+    """First instant after an archive collection's month"""
+    start = month_start(name)
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+def bucket_time(order: dict) -> datetime:
+    """Creation time that decides an order's archive month"""
+    if isinstance(order.get("_id"), ObjectId):
+        return order["_id"].generation_time.replace(tzinfo=None)
+    return order["createdAt"]
+
+
+def order_id_time(order_id: str) -> Optional[datetime]:
+    """Creation time embedded in an `ORD<unix seconds><3 random digits>` orderId"""
+    order_id = order_id or ""
+    digits = order_id[3:]
+    if not order_id.startswith("ORD") or not digits.isdigit() or len(digits) < 4:
+        return None
+    try:
+        return datetime.utcfromtimestamp(int(digits[:-3]))
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def candidate_archives(when: Optional[datetime]) -> List[str]:
+    """Archive collections that can hold an order created at `when`"""
+    if when is None:
+        return []
+    names = [archive_name(when)]
+    for neighbour in (when - BOUNDARY_SLACK, when + BOUNDARY_SLACK):
+        if archive_name(neighbour) not in names:
+            names.append(archive_name(neighbour))
+    return names
+
+
+async def archive_collections(db) -> List[str]:
+    """Existing archive collections, newest month first"""
+    names = await db.list_collection_names(filter={"name": {"$regex": f"^{ARCHIVE_PREFIX}"}})
+    return sorted(names, reverse=True)
+
+
+async def aggregate_archived(db, when: Optional[datetime], pipeline: list, limit: int = 1) -> List[dict]:
+    """Run `pipeline` against the archive buckets for `when` until one matches"""
+    for name in candidate_archives(when):
+        found = await db[name].aggregate(pipeline).to_list(limit)
+        if found:
+            return found
+    return []
+
+
+async def find_one_archived(db, when: Optional[datetime], query: dict, projection: dict = None) -> Optional[dict]:
+    for name in candidate_archives(when):
+        found = await db[name].find_one(query, projection)
+        if found:
+            return found
+    return None
@@ -0,0 +1,105 @@
+"""
+Order status pub/sub for the SSE stream
+
+Subscribers are per-order asyncio queues, so an idle waiter is just a
+suspended coroutine. Two backends:
+
+- memory (default): controllers publish after their writes; events reach
+  subscribers of this process only (single worker).
+- changestream: one MongoDB change stream per process watches paymentStatus
+  updates and fans them out locally, so a transition made by any worker
+  (or by a background job) reaches every subscriber. Needs a replica set.
+"""
+import asyncio
+import weakref
+from datetime import datetime
+from typing import Dict, Optional
+
+from utils.metrics import metrics
+from config import settings
+
+QUEUE_SIZE = 8
+
+
+class OrderEvents:
+    """Fan-out of order status events to local subscribers, keyed by orderId"""
+
+    def __init__(self, backend: str = "memory"):
+        self.backend = backend
+        # Weak so a stream that is dropped before it ever runs cannot leak its queue
+        self._subscribers: Dict[str, weakref.WeakSet] = {}
+        metrics.register("orders.subscribers", self.stats)
+
+    def subscribe(self, order_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self._subscribers.setdefault(order_id, weakref.WeakSet()).add(queue)
+        return queue
+
+    def unsubscribe(self, order_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(order_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[order_id]
+
+    def publish(self, order_id: str, payment_status: str, **fields):
+        """Called after a status write; a no-op when the change stream delivers instead"""
+        if self.backend == "memory":
+            self.deliver(order_id, {"orderId": order_id, "paymentStatus": payment_status, **fields})
+
+    def deliver(self, order_id: str, event: dict):
+        subscribers = self._subscribers.get(order_id)
+        if not subscribers:
+            self._subscribers.pop(order_id, None)
+            return
+        event.setdefault("at", datetime.utcnow().isoformat())
+        for queue in list(subscribers):
+            if queue.full():
+                # A slow client only needs the latest status
+                queue.get_nowait()
+            queue.put_nowait(event)
+        metrics.inc("orders.events.delivered", len(subscribers))
+
+    async def watch(self, db):
+        """Change-stream backend: forward paymentStatus updates to local subscribers"""
+        pipeline = [
+            {"$match": {
+                "operationType": "update",
+                "updateDescription.updatedFields.paymentStatus": {"$exists": True}
+            }},
+            {"$project": {
+                "fullDocument.orderId": 1,
+                "fullDocument.paymentStatus": 1,
+                "fullDocument.deliveryDate": 1
+            }}
+        ]
+        resume_token: Optional[dict] = None
+        while True:
+            try:
+                async with db.orders.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        order = change.get("fullDocument") or {}
+                        if order.get("orderId"):
+                            self.deliver(order["orderId"], {
+                                "orderId": order["orderId"],
+                                "paymentStatus": order.get("paymentStatus"),
+                                "deliveryDate": order.get("deliveryDate")
+                            })
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.inc("orders.events.watchErrors")
+                print(f"❌ Order change stream failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "orders": len(self._subscribers),
+            "total": sum(len(queues) for queues in self._subscribers.values())
+        }
+
+
+order_events = OrderEvents(settings.ORDER_EVENTS_BACKEND)
@@ -0,0 +1,201 @@
+"""
+Per-request MongoDB query budgets
+
+Routes declare how many Mongo commands one request may issue via
+`openapi_extra=query_budget(n)`. A pymongo command listener counts the
+commands (and the bytes their replies carry) and a middleware compares the
+count against the matched route's budget after each request.
+
+Each request collects into its own log, held in a ContextVar. Motor copies
+the caller's context into the executor thread that runs the pymongo call,
+and the listener is invoked on that thread, so concurrent requests never
+see each other's commands. Work outside a request (background workers,
+the flash-sale flusher) has no log and is not counted.
+"""
+import json
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import List, Optional
+
+import bson
+from pymongo import monitoring
+
+from config import settings
+
+BUDGET_KEY = "x-query-budget"
+
+# Handshakes and session bookkeeping are driver noise, not query work
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue"}
+# Admission control state lives in Mongo when RATE_LIMIT_STORE=mongo
+IGNORED_COLLECTIONS = {"rate_limits"}
+
+
+def query_budget(limit: int) -> dict:
+    """`openapi_extra` for a route allowed at most `limit` Mongo commands"""
+    return {BUDGET_KEY: limit}
+
+
+def route_budget(route) -> Optional[int]:
+    return (getattr(route, "openapi_extra", None) or {}).get(BUDGET_KEY)
+
+
+class CommandLog:
+    """Commands issued on behalf of one request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # a request's commands can run on several threads
+        self._commands: List[dict] = []
+        self._by_request_id = {}
+
+    def add(self, request_id, entry: dict):
+        with self._lock:
+            self._commands.append(entry)
+            self._by_request_id[request_id] = entry
+
+    def pop(self, request_id) -> Optional[dict]:
+        with self._lock:
+            return self._by_request_id.pop(request_id, None)
+
+    def commands(self) -> List[dict]:
+        with self._lock:
+            return list(self._commands)
+
+
+_current_log: ContextVar[Optional[CommandLog]] = ContextVar("query_budget_log", default=None)
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Attributes every command to the CommandLog of the request that issued it"""
+
+    def begin(self) -> CommandLog:
+        """Start collecting for the current context (a request) and everything it awaits"""
+        log = CommandLog()
+        log.token = _current_log.set(log)
+        return log
+
+    def end(self, log: CommandLog):
+        _current_log.reset(log.token)
+
+    def started(self, event):
+        log = _current_log.get()
+        if log is None or event.command_name in IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if target in IGNORED_COLLECTIONS:
+            return
+        log.add(event.request_id, {
+            "command": event.command_name,
+            "collection": target if isinstance(target, str) else None,
+            "replyBytes": 0
+        })
+
+    def succeeded(self, event):
+        log = _current_log.get()
+        entry = log.pop(event.request_id) if log is not None else None
+        if entry is not None:
+            entry["replyBytes"] = len(bson.encode(event.reply))
+            entry["durationMs"] = round(event.duration_micros / 1000, 2)
+
+    def failed(self, event):
+        log = _current_log.get()
+        entry = log.pop(event.request_id) if log is not None else None
+        if entry is not None:
+            entry["failed"] = True
+
+
+command_counter = CommandCounter()
+
+# The most recent violations (warn mode keeps running); read by the budget check
+violations: deque = deque(maxlen=200)
+
+
+def budget_report(method: str, path: str, limit: Optional[int], commands: List[dict]) -> dict:
+    return {
+        "route": f"{method} {path}",
+        "budget": limit,
+        "commands": len(commands),
+        "replyBytes": sum(c["replyBytes"] for c in commands),
+        "issued": commands
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['route']}: {report['commands']} Mongo commands (budget {report['budget']}), "
+        f"{report['replyBytes']} reply bytes"
+    ]
+    for i, command in enumerate(report["issued"], 1):
+        lines.append(
+            f"  {i}. {command['command']} {command['collection'] or ''} "
+            f"({command['replyBytes']} bytes)".rstrip()
+        )
+    return "\n".join(lines)
+
+
+class QueryBudgetMiddleware:
+    """
+    ASGI middleware enforcing route budgets.
+
+    Every response gets an X-Mongo-Commands header. Over budget, "warn" logs
+    the offending commands and "strict" replaces the response with a 500
+    carrying the same report, so a test hitting the route fails loudly.
+    """
+
+    def __init__(self, app, mode: str = "warn"):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = command_counter.begin()
+        state = {"replaced": False}
+
+        async def send_with_budget(message):
+            if state["replaced"]:
+                return
+            if message["type"] == "http.response.start":
+                report = self._check(scope, log.commands())
+                if report and self.mode == "strict":
+                    state["replaced"] = True
+                    body = json.dumps(
+                        {"success": False, "error": "Query budget exceeded", "report": report},
+                        default=str
+                    ).encode()
+                    await send({
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [
+                            (b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())
+                        ]
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                headers = list(message.get("headers", []))
+                headers.append((b"x-mongo-commands", str(len(log.commands())).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_budget)
+        finally:
+            command_counter.end(log)
+
+    def _check(self, scope, commands: List[dict]) -> Optional[dict]:
+        route = scope.get("route")
+        limit = route_budget(route)
+        if limit is None or len(commands) <= limit:
+            return None
+
+        report = budget_report(scope["method"], route.path, limit, commands)
+        violations.append(report)
+        print(f"⚠️  Query budget exceeded\n{format_report(report)}")
+        return report
+
+
+def budget_enabled() -> bool:
+    return settings.QUERY_BUDGET_MODE in ("warn", "strict")
@@ -0,0 +1,243 @@
+"""
+Admission control for checkout and payment routes
+
+Token-bucket rate limiting (per client IP and global) backed by a pluggable
+store, plus a fail-fast concurrency cap per route group. Rejected requests
+get 429/503 with a Retry-After header instead of queueing until they time out.
+"""
+import math
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def take(self, cost: float = 1) -> float:
+        """Consume `cost` tokens; return 0 if allowed, else seconds to wait"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+
+        return (cost - self.tokens) / self.rate
+
+
+class MemoryRateLimitStore:
+    """Per-process bucket store (default). Limits apply per worker."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    async def take(self, key: str, rate: float, capacity: float, cost: float = 1) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket.take(cost)
+
+    def _prune(self):
+        """Drop buckets that have been idle long enough to be full again"""
+        now = time.monotonic()
+        idle = [
+            key for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated_at) * bucket.rate >= bucket.capacity
+        ]
+        for key in idle:
+            del self._buckets[key]
+
+        # Still full: everyone is active, evict the oldest half
+        if len(self._buckets) >= self.max_keys:
+            oldest = sorted(self._buckets, key=lambda k: self._buckets[k].updated_at)
+            for key in oldest[: len(oldest) // 2]:
+                del self._buckets[key]
+
+
+class MongoRateLimitStore:
+    """
+    Shared bucket store so limits hold across workers.
+
+    Each bucket is one document refilled and debited atomically with a
+    pipeline update, using the server clock ($$NOW) to avoid worker skew.
+    """
+
+    def __init__(self, collection, idle_ttl_seconds: int = 3600):
+        self.collection = collection
+        self.idle_ttl_ms = idle_ttl_seconds * 1000
+        self._indexed = False
+
+    async def take(self, key: str, rate: float, capacity: float, cost: float = 1) -> float:
+        if not self._indexed:
+            await self.collection.create_index("expiresAt", expireAfterSeconds=0)
+            self._indexed = True
+
+        elapsed = {
+            "$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$ts", "$$NOW"]}]}, 1000]
+        }
+        pipeline = [
+            {"$set": {
+                "tokens": {"$min": [
+                    capacity,
+                    {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]}
+                ]},
+                "ts": "$$NOW"
+            }},
+            {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                "expiresAt": {"$add": ["$$NOW", self.idle_ttl_ms]}
+            }}
+        ]
+
+        try:
+            doc = await self._apply(key, pipeline)
+        except DuplicateKeyError:
+            # Two workers raced to create the same bucket; the second one retries
+            doc = await self._apply(key, pipeline)
+
+        if doc["allowed"]:
+            return 0.0
+        return (cost - doc["tokens"]) / rate
+
+    async def _apply(self, key: str, pipeline: list) -> dict:
+        return await self.collection.find_one_and_update(
+            {"_id": key},
+            pipeline,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+
+class ConcurrencyLimiter:
+    """Non-blocking in-flight counter; callers over the cap are rejected, not queued"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+
+_store = MemoryRateLimitStore()
+_limiters: Dict[str, ConcurrencyLimiter] = {}
+
+
+def get_store():
+    return _store
+
+
+def set_store(store):
+    global _store
+    _store = store
+
+
+def configure_store(db):
+    """Select the bucket store from settings once the database is connected"""
+    if settings.RATE_LIMIT_STORE == "mongo":
+        set_store(MongoRateLimitStore(db.rate_limits))
+    else:
+        set_store(MemoryRateLimitStore())
+
+
+def client_ip(request: Request) -> str:
+    """
+    Client address for per-IP limits.
+
+    Each trusted proxy appends the address it received the request from to
+    X-Forwarded-For, so the client is the hop RATE_LIMIT_TRUSTED_PROXIES
+    places from the right. Anything further left is whatever the client
+    sent and is ignored. With fewer hops than proxies (a request that
+    skipped the outer proxy) the leftmost hop is the best guess: the peer
+    address would be one of our proxies, putting every client in one bucket.
+    """
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if proxies > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if hops:
+            return hops[-min(proxies, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+
+def _reject(status_code: int, detail: str, retry_after: float):
+    raise HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def admission(group: str):
+    """
+    Route dependency enforcing rate limits and the concurrency cap for `group`.
+
+    Usage: @router.post("/", dependencies=[Depends(admission("orders"))])
+    """
+    limiter = _limiters.setdefault(group, ConcurrencyLimiter(settings.ROUTE_GROUP_MAX_CONCURRENCY))
+
+    async def dependency(request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            yield
+            return
+
+        store = get_store()
+
+        # Per-IP first so one noisy client cannot drain the global budget
+        retry_after = await store.take(
+            f"{group}:ip:{client_ip(request)}",
+            settings.RATE_LIMIT_IP_RATE,
+            settings.RATE_LIMIT_IP_BURST
+        )
+        if retry_after:
+            _reject(429, "Too many requests, please try again shortly", retry_after)
+
+        retry_after = await store.take(
+            f"{group}:global",
+            settings.RATE_LIMIT_GLOBAL_RATE,
+            settings.RATE_LIMIT_GLOBAL_BURST
+        )
+        if retry_after:
+            _reject(429, "Too many requests, please try again shortly", retry_after)
+
+        if not limiter.try_acquire():
+            _reject(503, "Server busy, please try again shortly", 1)
+
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    return dependency
+
+
+def in_flight(group: Optional[str] = None):
+    """Current in-flight counts, for diagnostics"""
+    if group is not None:
+        limiter = _limiters.get(group)
+        return limiter.in_flight if limiter else 0
+    return {name: limiter.in_flight for name, limiter in _limiters.items()}
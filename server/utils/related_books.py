@@ -0,0 +1,56 @@
+"""
+"Customers also bought" lookup table
+
+Built offline from the co-purchase matrix (see workers/recommendations.py)
+and held as two dense (books x K) arrays: neighbour row numbers, padded with
+-1, and how many customers bought both books. A lookup is one dict probe and
+one row slice, so it never touches the database.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class RelatedTable:
+    """Immutable once built; a refresh builds a new table and swaps it in"""
+
+    def __init__(self, book_ids: List[str], neighbours=None, counts=None,
+                 customers: int = 0, orders: int = 0, build_seconds: float = 0):
+        self.book_ids = book_ids
+        self.rows: Dict[str, int] = {book_id: row for row, book_id in enumerate(book_ids)}
+        self.neighbours = neighbours  # int32 (books, K), -1 where a book has fewer neighbours
+        self.counts = counts          # uint32 (books, K), customers who bought both
+        self.customers = customers
+        self.orders = orders
+        self.build_seconds = build_seconds
+        self.built_at: Optional[float] = time.time() if book_ids else None
+
+    @classmethod
+    def empty(cls) -> "RelatedTable":
+        return cls([])
+
+    @property
+    def top_k(self) -> int:
+        return 0 if self.neighbours is None else self.neighbours.shape[1]
+
+    def lookup(self, book_id: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(book id, co-purchase count) pairs, most bought-together first"""
+        row = self.rows.get(book_id)
+        if row is None:
+            return []
+        neighbours = self.neighbours[row, :limit].tolist()
+        counts = self.counts[row, :limit].tolist()
+        return [
+            (self.book_ids[neighbour], count)
+            for neighbour, count in zip(neighbours, counts)
+            if neighbour >= 0
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "books": len(self.book_ids),
+            "topK": self.top_k,
+            "customers": self.customers,
+            "orders": self.orders,
+            "buildSeconds": self.build_seconds,
+            "builtAt": self.built_at
+        }
@@ -0,0 +1,195 @@
+"""
+Deadlines, bulkheads and circuit breakers for outbound dependencies
+
+Every call to a remote dependency (Razorpay, SMTP) goes through a
+`Dependency` policy, so a degraded service costs a bounded amount of time
+and worker capacity instead of piling requests up:
+
+- deadline: the call is abandoned after `timeout` seconds
+- bulkhead: at most `max_concurrent` calls in flight; a caller waits at most
+  `max_wait` seconds for a slot and is otherwise rejected
+- circuit breaker: after `failure_threshold` consecutive failures the circuit
+  opens and calls fail fast for `reset_timeout` seconds. It then half-opens
+  and lets `half_open_max` probe calls through; a successful probe closes
+  the circuit again, a failed one re-opens it.
+
+Rejections raise DependencyUnavailable (with a Retry-After hint) without
+touching the dependency. Breaker state is exported under
+`dependencies.<name>` in /api/metrics (state: 0 closed, 1 half-open, 2 open).
+"""
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException
+
+from utils.metrics import metrics
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half-open", OPEN: "open"}
+
+
+class DependencyUnavailable(Exception):
+    """The call was not made (circuit open, bulkhead full) or hit its deadline"""
+
+    def __init__(self, dependency: str, reason: str, retry_after: float = 1):
+        super().__init__(f"{dependency} unavailable: {reason}")
+        self.dependency = dependency
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with half-open probing"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, half_open_max: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.opens = 0
+
+    def allow(self) -> float:
+        """0 if a call may proceed (taking a probe slot when half-open), else seconds to wait"""
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            self.state = HALF_OPEN
+            self.probes = 0
+
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_max:
+                return 1.0
+            self.probes += 1
+        return 0.0
+
+    def record_success(self):
+        self.failures = 0
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self.probes = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._open()
+
+    def record_abandoned(self):
+        """A probe ended without a verdict (e.g. the caller was cancelled)"""
+        if self.state == HALF_OPEN and self.probes:
+            self.probes -= 1
+
+    def _open(self):
+        if self.state != OPEN:
+            self.opens += 1
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes = 0
+
+
+class Bulkhead:
+    """Bounded concurrency; callers queue for at most `max_wait` seconds"""
+
+    def __init__(self, max_concurrent: int, max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore.locked() and self.max_wait <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait or None)
+        except asyncio.TimeoutError:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class Dependency:
+    """Deadline + bulkhead + circuit breaker policy for one remote dependency"""
+
+    def __init__(self, name: str, timeout: float, max_concurrent: int, max_wait: float,
+                 failure_threshold: int, reset_timeout: float, half_open_max: int = 1,
+                 is_failure: Callable[[BaseException], bool] = lambda e: True):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, half_open_max)
+        self.bulkhead = Bulkhead(max_concurrent, max_wait)
+        # Errors the dependency is not to blame for (e.g. a 400) should not trip the breaker
+        self.is_failure = is_failure
+        self.counts = {"calls": 0, "failures": 0, "timeouts": 0, "rejectedOpen": 0, "rejectedFull": 0}
+        metrics.register(f"dependencies.{name}", self.stats)
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await fn(*args, **kwargs) under the policy"""
+        retry_after = self.breaker.allow()
+        if retry_after:
+            self.counts["rejectedOpen"] += 1
+            raise DependencyUnavailable(self.name, "circuit open", retry_after)
+
+        if not await self.bulkhead.acquire():
+            self.breaker.record_abandoned()
+            self.counts["rejectedFull"] += 1
+            raise DependencyUnavailable(self.name, "too many concurrent calls", 1)
+
+        self.counts["calls"] += 1
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+            self._failed()
+            raise DependencyUnavailable(self.name, f"no response within {self.timeout}s", self.timeout)
+        except asyncio.CancelledError:
+            self.breaker.record_abandoned()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._failed()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+            return result
+        finally:
+            self.bulkhead.release()
+
+    def _failed(self):
+        self.counts["failures"] += 1
+        was_open = self.breaker.state == OPEN
+        self.breaker.record_failure()
+        if not was_open and self.breaker.state == OPEN:
+            print(f"⚠️ Circuit for {self.name} opened; failing fast for {self.breaker.reset_timeout}s")
+
+    @property
+    def state(self) -> str:
+        return STATE_NAMES[self.breaker.state]
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "consecutiveFailures": self.breaker.failures,
+            "opens": self.breaker.opens,
+            "inFlight": self.bulkhead.in_flight,
+            **self.counts
+        }
+
+
+def unavailable_error(error: DependencyUnavailable, detail: str) -> HTTPException:
+    """HTTP 503 with Retry-After for a rejected dependency call"""
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    )
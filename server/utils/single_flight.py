@@ -0,0 +1,111 @@
+"""
+Async single-flight request coalescing
+
+Concurrent calls for the same key share one in-flight coroutine instead of
+each hitting MongoDB. An optional micro-cache keeps the result for a short
+TTL so bursts arriving just after completion are served from memory too.
+
+Every caller gets its own deep copy of the result (the cached original is
+never handed out), so a caller that edits what it got, e.g. adding fields
+before responding, cannot change what concurrent callers or later cache
+hits see.
+"""
+import asyncio
+import copy
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from utils.metrics import metrics
+
+
+class SingleFlight:
+    """Coalesce concurrent identical reads, optionally caching for `ttl` seconds"""
+
+    def __init__(self, name: str, ttl: float = 0.0, max_entries: int = 10_000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+        self.calls = 0
+        self.executions = 0
+        self.shared = 0
+        self.cache_hits = 0
+        metrics.register(f"singleflight.{name}", self.stats)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+
+        if self.ttl:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return copy.deepcopy(cached[1])
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.executions += 1
+            # Run as a task so a disconnecting leader does not cancel the followers
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None or not self.ttl:
+            return
+        if len(self._cache) >= self.max_entries:
+            self._evict()
+        self._cache[key] = (time.monotonic() + self.ttl, task.result())
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+        # Dicts keep insertion order, so the first keys are the oldest entries
+        while len(self._cache) >= self.max_entries:
+            del self._cache[next(iter(self._cache))]
+
+    def get_cached(self, key: Hashable) -> Optional[Any]:
+        """Return a still-fresh cached result without starting a call"""
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return copy.deepcopy(cached[1])
+        return None
+
+    def prime(self, key: Hashable, value: Any):
+        """Store a result fetched elsewhere (e.g. by a batch query)"""
+        if not self.ttl:
+            return
+        if len(self._cache) >= self.max_entries:
+            self._evict()
+        # The caller keeps using `value`; cache a copy of it
+        self._cache[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+
+    def invalidate(self, key: Hashable):
+        self._cache.pop(key, None)
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def dedupe_ratio(self) -> float:
+        """Fraction of calls that did not need their own database round trip"""
+        if not self.calls:
+            return 0.0
+        return 1 - self.executions / self.calls
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "shared": self.shared,
+            "cacheHits": self.cache_hits,
+            "inFlight": len(self._inflight),
+            "dedupeRatio": round(self.dedupe_ratio, 4)
+        }
@@ -0,0 +1,110 @@
+"""
+Serve the built Vite frontend (dist/) from the API server
+
+Optional single-origin mode: assets are served from files precompressed at
+build time (.br/.gz next to the original), hashed files under assets/ are
+cached forever, unknown paths fall back to index.html for client-side
+routing, and the current catalog is inlined into index.html so the books
+page renders without a first API round trip.
+"""
+import asyncio
+import gzip
+import json
+import mimetypes
+import os
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, Response
+
+from config import settings
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_index = {"html": b"", "gzip": b""}
+
+
+def dist_dir() -> str:
+    return os.path.realpath(settings.FRONTEND_DIST_DIR)
+
+
+def _accepted_encodings(request: Request) -> set:
+    encodings = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(token.lower())
+    return encodings
+
+
+async def render_index():
+    """Rebuild index.html with the current catalog inlined"""
+    from controllers.book_controller import get_all_books
+
+    with open(os.path.join(dist_dir(), "index.html"), "rb") as f:
+        template = f.read().decode()
+
+    books = await get_all_books()
+    # "</" would end the script element early
+    payload = json.dumps(jsonable_encoder(books), separators=(",", ":")).replace("</", "<\\/")
+    script = f"<script>window.__BOOK_CATALOG__={payload};</script>"
+    html = template.replace("</head>", f"{script}</head>", 1).encode()
+
+    _index["html"] = html
+    _index["gzip"] = gzip.compress(html, compresslevel=9)
+
+
+async def run_catalog_refresher():
+    """Keep the inlined catalog reasonably fresh; started from the app lifespan"""
+    while True:
+        await asyncio.sleep(settings.FRONTEND_CATALOG_REFRESH_SECONDS)
+        try:
+            await render_index()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Catalog inlining failed: {e}")
+
+
+def _index_response(request: Request) -> Response:
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if "gzip" in _accepted_encodings(request) and _index["gzip"]:
+        headers["Content-Encoding"] = "gzip"
+        return Response(_index["gzip"], media_type="text/html", headers=headers)
+    return Response(_index["html"], media_type="text/html", headers=headers)
+
+
+async def serve_frontend(path: str, request: Request):
+    """Static file (preferring precompressed variants) or the SPA shell"""
+    if path == "api" or path.startswith("api/"):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    root = dist_dir()
+    full_path = os.path.realpath(os.path.join(root, path))
+
+    if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path) \
+            or full_path == os.path.join(root, "index.html"):
+        return _index_response(request)
+
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    # Vite content-hashes everything it emits under assets/
+    cache_control = IMMUTABLE if path.startswith("assets/") else "public, max-age=3600"
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    encodings = _accepted_encodings(request)
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in encodings and os.path.isfile(full_path + suffix):
+            headers["Content-Encoding"] = encoding
+            return FileResponse(full_path + suffix, media_type=media_type, headers=headers)
+
+    return FileResponse(full_path, media_type=media_type, headers=headers)
+
+
+def mount_frontend(app: FastAPI):
+    """Register the catch-all route; call after every API router is included"""
+    app.add_api_route(
+        "/{path:path}",
+        serve_frontend,
+        methods=["GET", "HEAD"],
+        include_in_schema=False
+    )
@@ -0,0 +1,155 @@
+"""
+Stock reservation helpers shared by order flows and background workers
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from utils.metrics import metrics
+from utils.stock_pool import stock_pools
+from config import settings
+
+DUPLICATE_KEY = 11000
+
+
+class InsufficientStockError(Exception):
+    """Raised by reserve_stock when a line item cannot be satisfied"""
+
+    def __init__(self, book_id):
+        super().__init__(f"Insufficient stock for book {book_id}")
+        self.book_id = book_id
+
+
+def order_items(order: dict) -> List[dict]:
+    """Line items of an order; single-book orders are one item of quantity 1"""
+    if order.get("items"):
+        return [{"bookId": item["bookId"], "quantity": item["quantity"]} for item in order["items"]]
+    return [{"bookId": order["bookId"], "quantity": 1}]
+
+
+def reserved_items(order: dict) -> List[dict]:
+    """
+    Line items whose stock the order is currently holding.
+
+    Orders without `stockReserved` only decrement stock at payment time,
+    and `stockReleased` marks a reservation that was already given back.
+    """
+    if not order.get("stockReserved") or order.get("stockReleased"):
+        return []
+    return order_items(order)
+
+
+async def adjust_stock(db, items: Iterable[dict], sign: int) -> int:
+    """Unguarded +/- quantity per book in one bulk write; returns units moved"""
+    quantities = Counter()
+    for item in items:
+        quantities[item["bookId"]] += item["quantity"]
+
+    if not quantities:
+        return 0
+
+    now = datetime.utcnow()
+    await db.books.bulk_write(
+        [
+            UpdateOne({"_id": book_id}, {"$inc": {"stock": sign * quantity}, "$set": {"updated_at": now}})
+            for book_id, quantity in quantities.items()
+        ],
+        ordered=False
+    )
+    return sum(quantities.values())
+
+
+async def release_stock(db, orders: Iterable[dict]) -> int:
+    """Return reserved stock for `orders` in one bulk write; returns units released"""
+    items = [item for order in orders for item in reserved_items(order)]
+    return await adjust_stock(db, items, +1)
+
+
+async def reserve_stock(db, items: List[dict]):
+    """
+    Reserve every item or none, in a single ordered bulk write.
+
+    Each update only matches while stock >= quantity. On a shortfall the
+    upsert tries to insert a document with the book's existing _id, which
+    fails with a duplicate key error and stops the ordered batch; the items
+    before it are then put back. Callers must have checked the books exist,
+    otherwise the upsert would create a stub document.
+    """
+    if not items:
+        return
+
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"_id": item["bookId"], "stock": {"$gte": item["quantity"]}},
+            {"$inc": {"stock": -item["quantity"]}, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for item in items
+    ]
+
+    try:
+        await db.books.bulk_write(ops, ordered=True)
+    except BulkWriteError as e:
+        failed = e.details["writeErrors"][0]
+        await adjust_stock(db, items[: failed["index"]], +1)
+        if failed["code"] == DUPLICATE_KEY:
+            raise InsufficientStockError(items[failed["index"]]["bookId"]) from e
+        raise
+
+
+async def retake_stock(db, items: List[dict]) -> List[dict]:
+    """
+    Take stock again for an order that was paid after its reservation was
+    given back (expired or failed first). All or nothing, never below zero:
+    regular books go through reserve_stock's guarded write, and flash-sale
+    books through this worker's pool, so units already leased count.
+
+    Returns the items that could not be covered ([] on success).
+    """
+    if not items:
+        return []
+
+    books = await db.books.find(
+        {"_id": {"$in": [item["bookId"] for item in items]}}, {"flash_sale": 1}
+    ).to_list(len(items))
+    flash_sale = {book["_id"] for book in books if settings.FLASH_SALE_ENABLED and book.get("flash_sale")}
+    found = {book["_id"] for book in books}
+    missing = [item for item in items if item["bookId"] not in found]
+    if missing:
+        return missing
+
+    pooled = [item for item in items if item["bookId"] in flash_sale]
+    regular = [item for item in items if item["bookId"] not in flash_sale]
+
+    taken = []
+    try:
+        for item in pooled:
+            if not await stock_pools.reserve(db, item["bookId"], item["quantity"]):
+                raise InsufficientStockError(item["bookId"])
+            taken.append(item)
+        await reserve_stock(db, regular)
+    except InsufficientStockError as e:
+        for item in taken:
+            stock_pools.release(item["bookId"], item["quantity"])
+        return [item for item in items if item["bookId"] == e.book_id]
+    return []
+
+
+async def flag_stock_shortfall(db, order: dict, short: List[dict]):
+    """Mark a paid order that has no stock behind it for refund or manual review"""
+    await db.orders.update_one(
+        {"_id": order["_id"]},
+        {"$set": {
+            "stockReleased": True,
+            "needsReview": True,
+            "reviewReason": "Paid after its stock was released and sold",
+            "stockShortfall": [item["bookId"] for item in short],
+            "updatedAt": datetime.utcnow()
+        }}
+    )
+    metrics.inc("orders.stockShortfall")
+    print(f"⚠️ Order {order['orderId']} was paid without stock left; flagged for refund review")
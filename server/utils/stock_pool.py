@@ -0,0 +1,213 @@
+"""
+Flash-sale stock token pools
+
+For books flagged `flash_sale`, each worker leases blocks of stock from the
+book document into a local pool and serves reservations from memory, so a
+launch title no longer takes one write on the same document per checkout.
+
+Accounting on the book document:
+
+    stock              units nobody holds (the normal $inc path uses these)
+    leases.<worker>    units leased to a worker and not yet settled (removed
+                       once the worker returns everything it holds)
+    leased             sum of all leases (for listings and monitoring)
+
+A lease is one guarded $inc moving units from `stock` to the worker's lease,
+so a pool can only ever hand out units that existed. Once less than a block
+is left, each reservation leases exactly what it needs, so the last units go
+to whichever worker's customer asks first instead of all to one pool.
+Reservations are settled (and idle leftovers returned) by a periodic bulk
+flush. If a worker dies, or a flush fails in a way that leaves unknown
+whether it was applied, its unsettled lease stays on the document: stock can
+be stranded (under-sold) until an operator returns it, but never oversold.
+"""
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Dict
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from utils.metrics import metrics
+from config import settings
+
+
+def default_worker_id() -> str:
+    # Used as a field name under `leases`, so no dots or dollars
+    return f"{socket.gethostname()}-{os.getpid()}".replace(".", "_").replace("$", "_")
+
+
+class StockPool:
+    """Leased tokens for one book in one worker"""
+
+    def __init__(self, book_id):
+        self.book_id = book_id
+        self.available = 0
+        self.consumed = 0  # reserved from the pool, not yet settled
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+
+class StockPools:
+    """A worker's pools, keyed by book id"""
+
+    def __init__(self, worker_id: str = None, block: int = None):
+        self.worker_id = worker_id or default_worker_id()
+        self.block = block or settings.FLASH_SALE_LEASE_BLOCK
+        self._pools: Dict[object, StockPool] = {}
+
+    @property
+    def lease_field(self) -> str:
+        return f"leases.{self.worker_id}"
+
+    def _pool(self, book_id) -> StockPool:
+        pool = self._pools.get(book_id)
+        if pool is None:
+            pool = self._pools[book_id] = StockPool(book_id)
+        return pool
+
+    async def reserve(self, db, book_id, quantity: int) -> bool:
+        """Take `quantity` tokens, leasing more when the pool runs low"""
+        pool = self._pool(book_id)
+        pool.last_used = time.monotonic()
+
+        if pool.available < quantity:
+            async with pool.lock:
+                # Another reservation may have leased while we waited
+                if pool.available < quantity:
+                    pool.available += await self._lease(db, book_id, quantity - pool.available)
+
+        if pool.available < quantity:
+            metrics.inc("flashSale.soldOut")
+            return False
+
+        pool.available -= quantity
+        pool.consumed += quantity
+        metrics.inc("flashSale.reservations")
+        return True
+
+    def release(self, book_id, quantity: int):
+        """Undo a reservation that was never persisted (e.g. the order insert failed)"""
+        pool = self._pool(book_id)
+        pool.available += quantity
+        pool.consumed -= quantity
+
+    async def _lease(self, db, book_id, needed: int) -> int:
+        """Move a block (or, near sell-out, exactly `needed` units) from `stock` into this worker's lease"""
+        block = max(self.block, needed)
+        if await self._take(db, book_id, block):
+            return block
+        # Less than a block left: a guarded $inc per reservation, like the
+        # regular path, rather than one pool holding the remainder
+        if needed < block and await self._take(db, book_id, needed):
+            metrics.inc("flashSale.directLeases")
+            return needed
+        return 0
+
+    async def _take(self, db, book_id, units: int) -> bool:
+        result = await db.books.update_one(
+            {"_id": book_id, "stock": {"$gte": units}},
+            {
+                "$inc": {"stock": -units, f"{self.lease_field}.units": units, "leased": units},
+                "$set": {f"{self.lease_field}.at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+            }
+        )
+        if not result.modified_count:
+            return False
+        metrics.inc("flashSale.leases")
+        metrics.inc("flashSale.leasedUnits", units)
+        return True
+
+    async def flush(self, db, return_all: bool = False) -> int:
+        """
+        Settle consumed tokens and return idle leftovers in one bulk write.
+
+        Returns the number of books written.
+        """
+        now = time.monotonic()
+        lease_field = self.lease_field
+        ops = []
+        settled = []
+
+        for book_id, pool in list(self._pools.items()):
+            idle = now - pool.last_used >= settings.FLASH_SALE_IDLE_SECONDS
+            leftover = pool.available if (return_all or idle) and not pool.lock.locked() else 0
+            if not pool.consumed and not leftover:
+                continue
+
+            consumed = pool.consumed
+            settled.append((pool, consumed, leftover))
+            pool.consumed -= consumed
+            pool.available -= leftover
+            ops.append(UpdateOne(
+                {"_id": book_id},
+                {
+                    "$inc": {
+                        f"{lease_field}.units": -(consumed + leftover),
+                        "leased": -(consumed + leftover),
+                        "stock": leftover
+                    },
+                    "$set": {f"{lease_field}.at": datetime.utcnow()}
+                }
+            ))
+
+        if not ops:
+            return 0
+
+        try:
+            await db.books.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # The other ops were applied; put back only the failed ones for the next flush
+            for error in e.details.get("writeErrors", []):
+                pool, consumed, leftover = settled[error["index"]]
+                pool.consumed += consumed
+                pool.available += leftover
+            raise
+        except Exception:
+            # e.g. a network error: the write may have been applied, and retrying
+            # it would settle the same units twice. Count it as applied; at worst
+            # the units stay stranded in our lease (under-sold, never oversold).
+            metrics.inc("flashSale.ambiguousFlushes")
+            raise
+
+        # Drop the lease entries this flush emptied, so restarted workers (a new
+        # pid each time) don't pile up keys; a lease taken meanwhile is kept
+        emptied = [pool.book_id for pool, _, _ in settled if not pool.available and not pool.consumed]
+        if emptied:
+            await db.books.update_many(
+                {"_id": {"$in": emptied}, f"{lease_field}.units": 0},
+                {"$unset": {lease_field: ""}}
+            )
+
+        metrics.inc("flashSale.flushes")
+        return len(ops)
+
+    def stats(self) -> dict:
+        return {
+            "books": len(self._pools),
+            "available": sum(pool.available for pool in self._pools.values()),
+            "unsettled": sum(pool.consumed for pool in self._pools.values())
+        }
+
+
+stock_pools = StockPools()
+metrics.register("flashSale.pools", stock_pools.stats)
+
+
+async def run_stock_pool_flusher(get_db):
+    """Settle pools every FLASH_SALE_FLUSH_SECONDS; returns everything on shutdown"""
+    try:
+        while True:
+            await asyncio.sleep(settings.FLASH_SALE_FLUSH_SECONDS)
+            try:
+                await stock_pools.flush(get_db())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.inc("flashSale.flushErrors")
+                print(f"❌ Flash-sale stock flush failed: {e}")
+    finally:
+        await asyncio.shield(stock_pools.flush(get_db(), return_all=True))
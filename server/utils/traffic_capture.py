@@ -0,0 +1,231 @@
+"""
+Opt-in production traffic capture for replay (see benchmarks/replay.py)
+
+A pure ASGI middleware records the shape and timing of every sampled /api
+request: method, path, matched route, query string, JSON body, status,
+latency, time to first byte, response size and, when the query budget
+middleware runs, the X-Mongo-Commands count. Records are buffered in memory
+and appended as NDJSON by a background flusher to size-rotated files, one
+set per worker process.
+
+Customer and payment data never reach the disk: `userDetails` is replaced
+by a synthetic but valid customer (email/mobile pseudonymized with a
+per-process random key, so one customer stays one customer within a
+capture without being linkable to the real one), and payment ids and
+signatures are replaced outright.
+"""
+import asyncio
+import glob
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+from datetime import datetime
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from utils.metrics import metrics
+from config import settings
+
+PAYMENT_FIELDS = {
+    "razorpay_order_id", "razorpay_payment_id", "razorpay_signature",
+    "razorpayOrderId", "paymentId", "paymentSignature"
+}
+MAX_BODY_BYTES = 64 * 1024
+MAX_BUFFERED = 10_000
+
+
+class TrafficRecorder:
+    """Buffers capture records and appends them to rotating NDJSON files"""
+
+    def __init__(self, directory: str, max_file_bytes: int, max_files: int):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self._key = os.urandom(16)  # never persisted
+        self._buffer: List[dict] = []
+        self._path: Optional[str] = None
+        self._size = 0
+        self.written = 0
+        self.dropped = 0
+        metrics.register("traffic.capture", self.stats)
+
+    # Redaction
+
+    def pseudonym(self, value: str, digits: int = 10) -> str:
+        digest = hmac.new(self._key, value.strip().lower().encode(), hashlib.sha256).hexdigest()
+        return str(int(digest, 16))[:digits]
+
+    def redact_user_details(self, details) -> dict:
+        if not isinstance(details, dict):
+            return {}
+        pincode = str(details.get("pincode", ""))
+        return {
+            "fullName": "Redacted",
+            "address": "Redacted",
+            # The first three digits keep the delivery zone, not the address
+            "pincode": pincode[:3] + "001" if len(pincode) == 6 and pincode.isdigit() else "500001",
+            "mobile": "9" + self.pseudonym(str(details.get("mobile", "")), 9),
+            "email": f"replay+{self.pseudonym(str(details.get('email', '')))}@example.com"
+        }
+
+    def redact(self, value):
+        if isinstance(value, dict):
+            return {
+                key: self.redact_user_details(item) if key == "userDetails"
+                else "REDACTED" if key in PAYMENT_FIELDS
+                else self.redact(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self.redact(item) for item in value]
+        return value
+
+    def redact_query(self, query_string: str) -> str:
+        params = []
+        for key, value in parse_qsl(query_string, keep_blank_values=True):
+            if key == "email":
+                value = f"replay+{self.pseudonym(value)}@example.com"
+            elif key == "mobile":
+                value = "9" + self.pseudonym(value, 9)
+            elif key in PAYMENT_FIELDS:
+                value = "REDACTED"
+            params.append((key, value))
+        return urlencode(params)
+
+    # Buffering and files
+
+    def record(self, entry: dict):
+        if len(self._buffer) >= MAX_BUFFERED:
+            self.dropped += 1
+            return
+        self._buffer.append(entry)
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        entries, self._buffer = self._buffer, []
+        await asyncio.to_thread(self._write, entries)
+
+    def _write(self, entries: List[dict]):
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in entries:
+            line = (json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode()
+            if self._path is None or self._size + len(line) > self.max_file_bytes:
+                self._rotate()
+            with open(self._path, "ab") as f:
+                f.write(line)
+            self._size += len(line)
+            self.written += 1
+
+    def _rotate(self):
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")
+        self._path = os.path.join(self.directory, f"traffic-{stamp}-{os.getpid()}.ndjson")
+        self._size = 0
+        # Keep the newest max_files files (all workers share the directory)
+        files = sorted(glob.glob(os.path.join(self.directory, "traffic-*.ndjson")), key=os.path.getmtime)
+        for old in files[:max(0, len(files) - self.max_files + 1)]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    async def run(self):
+        """Flush every second; started from the app lifespan"""
+        try:
+            while True:
+                await asyncio.sleep(1)
+                try:
+                    await self.flush()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"❌ Traffic capture flush failed: {e}")
+        finally:
+            await asyncio.shield(self.flush())
+
+    def stats(self) -> dict:
+        return {"buffered": len(self._buffer), "written": self.written, "dropped": self.dropped}
+
+
+recorder = TrafficRecorder(
+    settings.TRAFFIC_CAPTURE_DIR,
+    settings.TRAFFIC_CAPTURE_MAX_FILE_BYTES,
+    settings.TRAFFIC_CAPTURE_MAX_FILES
+)
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware feeding sampled /api requests to the recorder"""
+
+    def __init__(self, app, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith("/api/")
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        body = bytearray()
+        state = {"status": None, "ttfb": None, "bytes": 0, "mongo": None, "stream": False, "truncated": False}
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request" and not state["truncated"]:
+                body.extend(message.get("body", b""))
+                if len(body) > MAX_BODY_BYTES:
+                    state["truncated"] = True
+                    body.clear()
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["ttfb"] = time.perf_counter()
+                for name, value in message.get("headers", []):
+                    if name == b"x-mongo-commands":
+                        state["mongo"] = int(value)
+                    elif name == b"content-type" and value.startswith(b"text/event-stream"):
+                        state["stream"] = True
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            self._record(scope, started, bytes(body), state)
+
+    def _record(self, scope, started: float, body: bytes, state: dict):
+        finished = time.perf_counter()
+        payload = None
+        if body:
+            try:
+                payload = recorder.redact(json.loads(body))
+            except ValueError:
+                payload = None  # the API only takes JSON bodies
+
+        route = scope.get("route")
+        recorder.record({
+            "ts": round(time.time() - (finished - started), 6),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "query": recorder.redact_query(scope.get("query_string", b"").decode("latin-1")),
+            "body": payload,
+            "bodyTruncated": state["truncated"] or None,
+            "status": state["status"],
+            "ms": round((finished - started) * 1000, 3),
+            "ttfbMs": round((state["ttfb"] - started) * 1000, 3) if state["ttfb"] else None,
+            "bytes": state["bytes"],
+            "mongo": state["mongo"],
+            "stream": state["stream"]
+        })
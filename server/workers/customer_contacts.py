@@ -0,0 +1,117 @@
+"""
+One-off migration normalising customer emails and mobiles on old orders
+
+Orders are stored with a lower-cased email and a digits-only mobile (see
+order_controller.normalize_email/normalize_mobile) so the customer history
+lookup is an exact index match. Orders created before that kept whatever
+the customer typed ("Jane@Example.com ", "+91 90000 00000") and were
+missing from their history. This pass rewrites them, in the hot collection
+and every archive month, and records completion in the `jobs` collection
+so the server only runs it once.
+
+Usage (from the server directory):
+    python -m workers.customer_contacts [--force]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from controllers.order_controller import normalize_email, normalize_mobile
+from database import get_database
+from utils import order_archive
+from utils.metrics import metrics
+from config import settings
+
+JOB_ID = "customer_contacts_v1"
+
+# Upper-case letters or surrounding whitespace in the email, anything but digits in the mobile
+UNNORMALIZED = {"$or": [
+    {"userDetails.email": {"$regex": r"[A-Z]|^\s|\s$"}},
+    {"userDetails.mobile": {"$regex": r"\D"}}
+]}
+
+
+async def normalize_collection(collection, batch_size: int) -> int:
+    """Rewrite unnormalised contacts in one collection; returns orders changed"""
+    changed = 0
+    last_id = None
+    while True:
+        query = UNNORMALIZED if last_id is None else {**UNNORMALIZED, "_id": {"$gt": last_id}}
+        batch = await collection.find(query, {"userDetails.email": 1, "userDetails.mobile": 1}) \
+            .sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return changed
+
+        ops = []
+        for order in batch:
+            details = order.get("userDetails") or {}
+            update = {}
+            if isinstance(details.get("email"), str):
+                update["userDetails.email"] = normalize_email(details["email"])
+            if isinstance(details.get("mobile"), str):
+                update["userDetails.mobile"] = normalize_mobile(details["mobile"])
+            if update:
+                ops.append(UpdateOne({"_id": order["_id"]}, {"$set": update}))
+        if ops:
+            result = await collection.bulk_write(ops, ordered=False)
+            changed += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        if len(batch) < batch_size:
+            return changed
+
+
+async def normalize_customer_contacts(db, force: bool = False) -> dict:
+    """Run the migration unless it already completed; returns what it changed"""
+    if not force and await db.jobs.find_one({"_id": JOB_ID, "done": True}):
+        return {"skipped": True, "changed": 0}
+
+    started = time.perf_counter()
+    changed = 0
+    for name in ["orders", *await order_archive.archive_collections(db)]:
+        changed += await normalize_collection(db[name], settings.ORDER_ARCHIVE_BATCH_SIZE)
+
+    await db.jobs.update_one(
+        {"_id": JOB_ID},
+        {"$set": {"done": True, "changed": changed, "updatedAt": datetime.utcnow()}},
+        upsert=True
+    )
+    metrics.inc("orders.contactsNormalized", changed)
+    return {"skipped": False, "changed": changed, "seconds": round(time.perf_counter() - started, 3)}
+
+
+async def run_contact_migration():
+    """Started from the app lifespan; a no-op once the job has completed"""
+    try:
+        report = await normalize_customer_contacts(get_database())
+        if report["changed"]:
+            print(f"📇 Normalised customer contacts on {report['changed']} orders")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Retried on the next start; histories miss those orders until then
+        print(f"❌ Customer contact migration failed: {e}")
+
+
+async def _main(args):
+    from database import connect_db, close_db
+
+    await connect_db()
+    try:
+        report = await normalize_customer_contacts(get_database(), force=args.force)
+    finally:
+        await close_db()
+
+    if report["skipped"]:
+        print("✅ Already done (use --force to run again)")
+    else:
+        print(f"✅ Normalised customer contacts on {report['changed']} orders ({report['seconds']}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalise customer emails and mobiles on existing orders")
+    parser.add_argument("--force", action="store_true", help="run even if the job already completed")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,137 @@
+"""
+Archiver moving old paid orders out of the hot `orders` collection
+
+Paid orders older than ORDER_ARCHIVE_AFTER_DAYS are copied in batches into
+their monthly archive collection (see utils/order_archive.py) and then
+deleted from `orders`. The copy is idempotent (duplicate keys are ignored),
+so a run interrupted between the copy and the delete is simply finished by
+the next one; until then lookups find the hot copy first.
+
+Usage (from the server directory):
+    python -m workers.order_archive [--limit N] [--after-days D]
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+from controllers.order_controller import archive_names, invalidate_order_cache
+from database import get_database
+from models.order import PaymentStatus
+from utils.metrics import metrics
+from utils.order_archive import archive_name, bucket_time
+from utils.stock import DUPLICATE_KEY
+from config import settings
+
+
+class OrderArchiver:
+    """One archiving pass over paid orders older than `after_days`"""
+
+    def __init__(self, db, after_days: int = None, batch_size: int = None):
+        self.db = db
+        self.after = timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS if after_days is None else after_days)
+        self.batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+        self._prepared = set()
+        self.stats = {"moved": 0, "batches": 0}
+
+    async def _prepare(self, name: str):
+        """Create a month's archive collection (compressed) and its orderId index once"""
+        if name in self._prepared:
+            return
+        if settings.ORDER_ARCHIVE_COMPRESSOR:
+            try:
+                await self.db.create_collection(
+                    name,
+                    storageEngine={"wiredTiger": {"configString": f"block_compressor={settings.ORDER_ARCHIVE_COMPRESSOR}"}}
+                )
+            except CollectionInvalid:
+                pass  # already exists
+        await self.db[name].create_index("orderId")
+        self._prepared.add(name)
+        # Order listings in this process see the new month right away
+        archive_names.clear()
+
+    async def _copy(self, name: str, orders: list):
+        try:
+            await self.db[name].insert_many(orders, ordered=False)
+        except BulkWriteError as e:
+            # Already archived by an interrupted run; anything else is a real failure
+            if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+
+    async def run(self, limit: Optional[int] = None) -> dict:
+        started = time.perf_counter()
+        query = {
+            "paymentStatus": PaymentStatus.PAID.value,
+            "createdAt": {"$lt": datetime.utcnow() - self.after}
+        }
+
+        while limit is None or self.stats["moved"] < limit:
+            size = self.batch_size if limit is None else min(self.batch_size, limit - self.stats["moved"])
+            # Oldest first, on the (paymentStatus, createdAt) index
+            batch = await self.db.orders.find(query).sort("createdAt", 1).limit(size).to_list(size)
+            if not batch:
+                break
+
+            by_month = defaultdict(list)
+            for order in batch:
+                by_month[archive_name(bucket_time(order))].append(order)
+            for name, orders in by_month.items():
+                await self._prepare(name)
+                await self._copy(name, orders)
+
+            # Only now remove the hot copies (still guarded on Paid)
+            await self.db.orders.delete_many({
+                "_id": {"$in": [order["_id"] for order in batch]},
+                "paymentStatus": PaymentStatus.PAID.value
+            })
+            for order in batch:
+                invalidate_order_cache(order["orderId"])
+
+            self.stats["moved"] += len(batch)
+            self.stats["batches"] += 1
+            if len(batch) < size:
+                break
+
+        report = {**self.stats, "seconds": round(time.perf_counter() - started, 3)}
+        metrics.inc("orders.archive.runs")
+        metrics.inc("orders.archive.moved", self.stats["moved"])
+        return report
+
+
+async def run_order_archiver():
+    """Archive every ORDER_ARCHIVE_INTERVAL_SECONDS; started from the app lifespan"""
+    while True:
+        await asyncio.sleep(settings.ORDER_ARCHIVE_INTERVAL_SECONDS)
+        try:
+            report = await OrderArchiver(get_database()).run()
+            if report["moved"]:
+                print(f"🗄️ Archived {report['moved']} paid orders in {report['seconds']}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.inc("orders.archive.errors")
+            print(f"❌ Order archiving failed: {e}")
+
+
+async def _main(args):
+    from database import connect_db, close_db
+
+    await connect_db()
+    try:
+        report = await OrderArchiver(get_database(), after_days=args.after_days).run(limit=args.limit)
+    finally:
+        await close_db()
+
+    print(f"✅ Archived {report['moved']} paid orders in {report['batches']} batches ({report['seconds']}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old paid orders to the monthly archive")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many orders")
+    parser.add_argument("--after-days", type=int, default=None, help="archive orders older than this")
+    asyncio.run(_main(parser.parse_args()))
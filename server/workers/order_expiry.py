@@ -0,0 +1,119 @@
+"""
+Background sweeper that expires abandoned pending orders
+
+Every checkout visit inserts a Pending order; those that never reach
+/verify or /failed are marked Expired in batches once they are older than
+PENDING_ORDER_TTL_MINUTES, and any stock they reserved is released.
+
+Orders that already have a Razorpay order may have a captured payment
+whose /verify never arrived, so they are left to the reconciler
+(workers/reconciliation.py), which expires them only after the gateway
+shows nothing was captured.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from database import get_database
+from models.order import PaymentStatus
+from utils.metrics import metrics
+from utils.pubsub import order_events
+from utils.stock import release_stock, reserved_items
+from config import settings
+
+_PROJECTION = {"_id": 1, "orderId": 1, "bookId": 1, "items": 1, "stockReserved": 1}
+
+
+def overdue_query(cutoff: datetime) -> dict:
+    """Pending orders created before `cutoff` that never reached the gateway"""
+    return {
+        "paymentStatus": PaymentStatus.PENDING.value,
+        "createdAt": {"$lt": cutoff},
+        "razorpayOrderId": None
+    }
+
+
+async def sweep_expired_orders(db, now: Optional[datetime] = None) -> int:
+    """Expire every overdue pending order; returns how many were expired"""
+    now = now or datetime.utcnow()
+    ttl = timedelta(minutes=settings.PENDING_ORDER_TTL_MINUTES)
+    overdue = overdue_query(now - ttl)
+
+    # Lag is measured before sweeping: how long past expiry orders waited for us
+    await _record_lag(db, now - ttl)
+
+    started = time.perf_counter()
+    expired = 0
+    released = 0
+
+    while True:
+        batch = await db.orders.find(overdue, _PROJECTION) \
+            .sort("createdAt", 1) \
+            .limit(settings.ORDER_SWEEP_BATCH_SIZE) \
+            .to_list(settings.ORDER_SWEEP_BATCH_SIZE)
+        if not batch:
+            break
+
+        # A unique stamp per batch tells us which orders this sweep actually expired
+        stamp = datetime.utcnow()
+        ids = [order["_id"] for order in batch]
+        result = await db.orders.update_many(
+            # Still guarded: /create-order may have attached a gateway order since the read
+            {"_id": {"$in": ids}, "paymentStatus": PaymentStatus.PENDING.value, "razorpayOrderId": None},
+            {"$set": {
+                "paymentStatus": PaymentStatus.EXPIRED.value,
+                "expiredAt": stamp,
+                "stockReleased": True,
+                "updatedAt": stamp
+            }}
+        )
+        expired += result.modified_count
+
+        if result.modified_count < len(batch):
+            # Some orders were paid or failed between the read and the write
+            transitioned = set(await db.orders.distinct("_id", {"_id": {"$in": ids}, "expiredAt": stamp}))
+            batch = [order for order in batch if order["_id"] in transitioned]
+
+        released += await release_stock(db, [order for order in batch if reserved_items(order)])
+        for order in batch:
+            order_events.publish(order["orderId"], PaymentStatus.EXPIRED.value)
+
+        if len(ids) < settings.ORDER_SWEEP_BATCH_SIZE:
+            break
+
+    elapsed = time.perf_counter() - started
+    metrics.inc("orders.expiry.sweeps")
+    metrics.inc("orders.expiry.expired", expired)
+    metrics.inc("orders.expiry.stockReleased", released)
+    metrics.set("orders.expiry.lastSweepSeconds", round(elapsed, 4))
+    metrics.set("orders.expiry.lastSweepOrdersPerSecond", round(expired / elapsed, 1) if elapsed else 0)
+
+    return expired
+
+
+async def _record_lag(db, cutoff: datetime):
+    """Seconds the oldest still-pending overdue order has been waiting past its expiry"""
+    oldest = await db.orders.find_one(
+        overdue_query(cutoff),
+        {"createdAt": 1},
+        sort=[("createdAt", 1)]
+    )
+    lag = (cutoff - oldest["createdAt"]).total_seconds() if oldest else 0
+    metrics.set("orders.expiry.lagSeconds", round(lag, 1))
+
+
+async def run_order_expiry_sweeper():
+    """Sweep forever at ORDER_SWEEP_INTERVAL_SECONDS; started from the app lifespan"""
+    while True:
+        try:
+            expired = await sweep_expired_orders(get_database())
+            if expired:
+                print(f"🧹 Expired {expired} abandoned pending orders")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.inc("orders.expiry.errors")
+            print(f"❌ Order expiry sweep failed: {e}")
+
+        await asyncio.sleep(settings.ORDER_SWEEP_INTERVAL_SECONDS)
@@ -0,0 +1,138 @@
+"""
+"Customers also bought" recommendations from paid order history
+
+Paid orders are grouped by customer email on the database server (see
+load_purchases) into a sparse customers x books purchase matrix P (1 where
+the customer bought the book at least once).
+P.T @ P is the book x book co-purchase matrix: entry (a, b) counts customers
+who bought both. The top-K neighbours of each book are kept and published as
+a RelatedTable, which the API swaps in atomically (see
+book_controller.refresh_related_books).
+
+NumPy and SciPy are only needed here and are imported on first build.
+
+Usage (from the server directory):
+    python -m workers.recommendations [--top-k 8] [--book BOOK_ID]
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+
+from models.order import PaymentStatus
+from utils.order_archive import archive_collections
+from utils.related_books import RelatedTable
+from config import settings
+
+PAID = {"paymentStatus": PaymentStatus.PAID.value, "userDetails.email": {"$nin": [None, ""]}}
+
+# One document per customer with the distinct books they paid for, so the
+# server does the deduplication and only (customer, book) pairs come back
+_CUSTOMER_BOOKS = [
+    {"$match": PAID},
+    {"$project": {"_id": 0, "email": "$userDetails.email", "bookId": 1, "items": "$items.bookId"}},
+    # Cart orders list their books under items; single-book orders only have bookId
+    {"$unwind": {"path": "$items", "preserveNullAndEmptyArrays": True}},
+    {"$project": {"email": 1, "book": {"$ifNull": ["$items", "$bookId"]}}},
+    {"$match": {"book": {"$ne": None}}},
+    {"$group": {"_id": "$email", "books": {"$addToSet": "$book"}}},
+]
+
+
+async def load_purchases(db) -> Tuple[List[Tuple[str, str]], int]:
+    """Distinct (customer email, book id) pairs from paid orders, plus the order count"""
+    purchases = []
+    orders = 0
+    # Old paid orders live in the monthly archive collections
+    for collection in ["orders"] + await archive_collections(db):
+        orders += await db[collection].count_documents(PAID)
+        cursor = db[collection].aggregate(_CUSTOMER_BOOKS, allowDiskUse=True, batchSize=1000)
+        async for customer in cursor:
+            purchases.extend((customer["_id"], str(book_id)) for book_id in customer["books"])
+    return purchases, orders
+
+
+def build_related_table(purchases: List[Tuple[str, str]], top_k: int, orders: int = 0) -> RelatedTable:
+    """Co-purchase matrix and top-K neighbours (blocking; run off the event loop)"""
+    import numpy as np
+    from scipy import sparse
+
+    started = time.perf_counter()
+    if not purchases:
+        return RelatedTable.empty()
+
+    customers: dict = {}
+    books: dict = {}
+    rows = np.fromiter((customers.setdefault(email, len(customers)) for email, _ in purchases),
+                       dtype=np.int32, count=len(purchases))
+    cols = np.fromiter((books.setdefault(book_id, len(books)) for _, book_id in purchases),
+                       dtype=np.int32, count=len(purchases))
+
+    purchased = sparse.csr_matrix(
+        (np.ones(len(purchases), dtype=np.uint32), (rows, cols)),
+        shape=(len(customers), len(books))
+    )
+    # Repeat purchases count once per customer
+    purchased.data[:] = 1
+
+    co_purchases = (purchased.T @ purchased).tocsr()
+    co_purchases.setdiag(0)
+    co_purchases.eliminate_zeros()
+
+    neighbours = np.full((len(books), top_k), -1, dtype=np.int32)
+    counts = np.zeros((len(books), top_k), dtype=np.uint32)
+    indptr, indices, data = co_purchases.indptr, co_purchases.indices, co_purchases.data
+    for book in range(len(books)):
+        start, end = indptr[book], indptr[book + 1]
+        if start == end:
+            continue
+        row_counts = data[start:end]
+        if end - start > top_k:
+            best = np.argpartition(row_counts, -top_k)[-top_k:]
+        else:
+            best = np.arange(end - start)
+        # Highest count first; ties broken by book row for a stable order
+        best = best[np.lexsort((indices[start:end][best], -row_counts[best].astype(np.int64)))]
+        neighbours[book, :len(best)] = indices[start:end][best]
+        counts[book, :len(best)] = row_counts[best]
+
+    return RelatedTable(
+        list(books),
+        neighbours,
+        counts,
+        customers=len(customers),
+        orders=orders,
+        build_seconds=round(time.perf_counter() - started, 3)
+    )
+
+
+async def build_from_orders(db, top_k: int = None) -> RelatedTable:
+    purchases, orders = await load_purchases(db)
+    return await asyncio.to_thread(
+        build_related_table, purchases, top_k or settings.RECOMMENDATIONS_TOP_K, orders
+    )
+
+
+async def _main(args):
+    from database import connect_db, close_db, get_database
+
+    await connect_db()
+    try:
+        table = await build_from_orders(get_database(), args.top_k)
+    finally:
+        await close_db()
+
+    print(
+        f"✅ {table.orders} paid orders from {table.customers} customers -> "
+        f"{len(table.book_ids)} books, top {table.top_k} in {table.build_seconds}s"
+    )
+    if args.book:
+        for book_id, count in table.lookup(args.book):
+            print(f"   {book_id}  bought together by {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build co-purchase recommendations from paid orders")
+    parser.add_argument("--top-k", type=int, default=None, help="neighbours kept per book")
+    parser.add_argument("--book", default=None, help="print the neighbours of this book id")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,349 @@
+"""
+Payment reconciliation for orders stuck in Pending
+
+A dropped /verify call (closed tab, flaky network) leaves an order Pending
+even though Razorpay captured the payment. This job pages through pending
+orders that reached the gateway (they have a razorpayOrderId), asks the
+gateway what happened with a bounded, rate-limited pool of lookups, and
+applies Paid/Failed transitions in bulk. Progress is checkpointed in the
+`jobs` collection so an interrupted pass resumes where it stopped.
+
+The expiry sweeper leaves orders that reached the gateway to this job:
+once past PENDING_ORDER_TTL_MINUTES with no captured or in-flight payment
+they are expired here, and only then is their stock released. Orders
+expired or failed in the last RECONCILE_LOOKBACK_HOURS are checked too: a
+payment captured after expiry (or a retry after a reported failure) still
+makes the order Paid, taking its stock back only if it is still there
+(otherwise it is flagged for review).
+
+Each check of an Expired/Failed order records `gatewayStatus` and
+`reconciledAt`. Once the gateway shows nothing in flight the order is
+"settled" and is not asked about again; a payment started after that is
+left to /verify.
+
+Usage (from the server directory):
+    python -m workers.reconciliation [--restart] [--limit N]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+from controllers import delivery_controller
+from controllers.order_controller import invalidate_order_cache
+from database import get_database
+from models.order import PaymentStatus
+from utils.metrics import metrics
+from utils.pubsub import order_events
+from utils.rate_limit import TokenBucket
+from utils.resilience import DependencyUnavailable
+from utils.stock import flag_stock_shortfall, order_items, release_stock, reserved_items, retake_stock
+from config import settings
+
+JOB_ID = "payment_reconciliation"
+
+# Matches the partial index created in database.ensure_indexes
+RECONCILABLE = {
+    "paymentStatus": {"$in": [
+        PaymentStatus.PENDING.value, PaymentStatus.EXPIRED.value, PaymentStatus.FAILED.value
+    ]},
+    "razorpayOrderId": {"$type": "string"}
+}
+
+_PROJECTION = {
+    "_id": 1, "orderId": 1, "razorpayOrderId": 1, "bookId": 1, "items": 1, "paymentStatus": 1,
+    "stockReserved": 1, "stockReleased": 1, "userDetails.pincode": 1, "createdAt": 1
+}
+
+# Razorpay payment states that can still turn into a capture
+IN_FLIGHT = {"created", "authorized"}
+
+# gatewayStatus of a checked order; settled ones are not checked again
+CAPTURED = "captured"
+PAYING = "in_flight"
+SETTLED = "settled"
+
+STATUS_BY_OUTCOME = {
+    "paid": PaymentStatus.PAID.value,
+    "failed": PaymentStatus.FAILED.value,
+    "expired": PaymentStatus.EXPIRED.value
+}
+
+
+def reconcilable(cutoff: datetime, lookback: datetime) -> dict:
+    """Pending orders past the grace period, and unsettled expired/failed orders since `lookback`"""
+    return {
+        **RECONCILABLE,
+        "createdAt": {"$lt": cutoff},
+        "$or": [
+            {"paymentStatus": PaymentStatus.PENDING.value},
+            {"createdAt": {"$gte": lookback}, "gatewayStatus": {"$ne": SETTLED}}
+        ]
+    }
+
+
+def gateway_status(payments: List[dict]) -> str:
+    """Whether anything at the gateway can still capture (for an order that stays as it is)"""
+    return PAYING if any(payment.get("status") in IN_FLIGHT for payment in payments) else SETTLED
+
+
+def needs_stock(order: dict) -> bool:
+    """A newly paid order holds no stock: never reserved, or given back on expiry/failure"""
+    return not order.get("stockReserved") or bool(order.get("stockReleased"))
+
+
+class RazorpayGateway:
+    """Payments of a Razorpay order; the SDK is blocking, so calls run in threads"""
+
+    async def fetch_payments(self, razorpay_order_id: str) -> List[dict]:
+        from controllers.payment_controller import call_razorpay, get_razorpay_client
+
+        # Shares the gateway's circuit breaker: lookups stop while it is open
+        response = await call_razorpay(get_razorpay_client().order.payments, razorpay_order_id)
+        return response.get("items", [])
+
+
+def decide(payments: List[dict], overdue: bool = False) -> Optional[tuple]:
+    """
+    Outcome for one order from its gateway payments.
+
+    Returns ("paid", payment), ("failed", payment), ("expired", None) for an
+    `overdue` order nothing can capture any more, or None to leave the order
+    Pending (no attempt yet, or a payment still authorized/in flight).
+    """
+    for payment in payments:
+        if payment.get("status") == "captured":
+            return "paid", payment
+    if payments and all(payment.get("status") == "failed" for payment in payments):
+        return "failed", payments[-1]
+    if overdue and not any(payment.get("status") in IN_FLIGHT for payment in payments):
+        return "expired", None
+    return None
+
+
+class Reconciler:
+    """One reconciliation pass; `gateway` is anything with `async fetch_payments(id)`"""
+
+    def __init__(self, db, gateway, concurrency: int = None, rate: float = None,
+                 batch_size: int = None, grace_minutes: int = None):
+        self.db = db
+        self.gateway = gateway
+        self.concurrency = concurrency or settings.RECONCILE_CONCURRENCY
+        self.bucket = TokenBucket(rate or settings.RECONCILE_RATE, max(1, self.concurrency))
+        self.batch_size = batch_size or settings.RECONCILE_BATCH_SIZE
+        self.grace = timedelta(minutes=settings.RECONCILE_GRACE_MINUTES if grace_minutes is None else grace_minutes)
+        self.lookback = timedelta(hours=settings.RECONCILE_LOOKBACK_HOURS)
+        self.expire_before = None  # set per run: pending orders created before this are overdue
+        self.stats = {"checked": 0, "paid": 0, "failed": 0, "expired": 0, "unchanged": 0, "errors": 0, "review": 0}
+
+    async def _throttle(self):
+        while True:
+            wait = self.bucket.take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _lookup(self, semaphore: asyncio.Semaphore, order: dict):
+        async with semaphore:
+            await self._throttle()
+            try:
+                return order, await self.gateway.fetch_payments(order["razorpayOrderId"])
+            except DependencyUnavailable:
+                # Gateway circuit open or saturated; retried on the next run
+                self.stats["errors"] += 1
+                return order, None
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"❌ Reconciliation lookup failed for {order['orderId']}: {e}")
+                return order, None
+
+    def _sort(self, results: List[tuple]) -> tuple:
+        """Split lookups into transitions and expired/failed orders that stay as they are"""
+        outcomes, checked = [], []
+        for order, payments in results:
+            if payments is None:
+                continue  # lookup failed; asked again on the next run
+            pending = order["paymentStatus"] == PaymentStatus.PENDING.value
+            decision = decide(payments, pending and order["createdAt"] < self.expire_before)
+            # An expired/failed order only changes if its payment was captured after all
+            if decision and (decision[0] == "paid" or pending):
+                outcomes.append((order, decision))
+            elif not pending:
+                checked.append((order, gateway_status(payments)))
+        return outcomes, checked
+
+    async def _apply(self, outcomes: List[tuple], checked: List[tuple] = ()):
+        """Bulk-apply transitions and check records; only orders still in the status we read are changed"""
+        stamp = datetime.utcnow()
+        ops = []
+        for order, (outcome, payment) in outcomes:
+            if outcome == "paid":
+                update = {
+                    "paymentStatus": PaymentStatus.PAID.value,
+                    "paymentId": payment.get("id"),
+                    "deliveryDate": delivery_controller.delivery_date(
+                        order.get("userDetails", {}).get("pincode")
+                    ),
+                    "stockReleased": False
+                }
+            elif outcome == "failed":
+                update = {
+                    "paymentStatus": PaymentStatus.FAILED.value,
+                    "paymentError": payment.get("error_description") or "Payment failed",
+                    "stockReleased": True
+                }
+            else:
+                update = {
+                    "paymentStatus": PaymentStatus.EXPIRED.value,
+                    "expiredAt": stamp,
+                    "stockReleased": True
+                }
+            update.update({
+                # Nothing is left to capture for a failed or expired one
+                "gatewayStatus": CAPTURED if outcome == "paid" else SETTLED,
+                "reconciledAt": stamp,
+                "updatedAt": stamp
+            })
+            ops.append(UpdateOne(
+                {"_id": order["_id"], "paymentStatus": order["paymentStatus"]},
+                {"$set": update}
+            ))
+        for order, gateway in checked:
+            ops.append(UpdateOne(
+                {"_id": order["_id"], "paymentStatus": order["paymentStatus"]},
+                {"$set": {"gatewayStatus": gateway, "reconciledAt": stamp}}
+            ))
+
+        if not ops:
+            return
+
+        result = await self.db.orders.bulk_write(ops, ordered=False)
+        applied = outcomes
+        if outcomes and result.modified_count < len(ops):
+            # Someone else (/verify, /failed, expiry) got to some orders first
+            changed = set(await self.db.orders.distinct(
+                "_id", {"_id": {"$in": [order["_id"] for order, _ in outcomes]}, "reconciledAt": stamp}
+            ))
+            applied = [entry for entry in outcomes if entry[0]["_id"] in changed]
+
+        paid = [order for order, (outcome, _) in applied if outcome == "paid"]
+        failed = [order for order, (outcome, _) in applied if outcome != "paid"]
+
+        # Stock: paid orders holding none take it now (never below zero), failed/expired ones give theirs back
+        for order in paid:
+            if needs_stock(order):
+                short = await retake_stock(self.db, order_items(order))
+                if short:
+                    await flag_stock_shortfall(self.db, order, short)
+                    self.stats["review"] += 1
+        await release_stock(self.db, [order for order in failed if reserved_items(order)])
+
+        for order, (outcome, _) in applied:
+            invalidate_order_cache(order["orderId"])
+            order_events.publish(order["orderId"], STATUS_BY_OUTCOME[outcome])
+            self.stats[outcome] += 1
+
+    async def _load_checkpoint(self):
+        job = await self.db.jobs.find_one({"_id": JOB_ID})
+        return job.get("lastId") if job else None
+
+    async def _save_checkpoint(self, last_id):
+        await self.db.jobs.update_one(
+            {"_id": JOB_ID},
+            {"$set": {"lastId": last_id, "stats": self.stats, "updatedAt": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def run(self, restart: bool = False, limit: Optional[int] = None) -> dict:
+        """Reconcile one pass over pending orders; returns counts and orders/sec"""
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        cutoff, lookback = now - self.grace, now - self.lookback
+        self.expire_before = now - timedelta(minutes=settings.PENDING_ORDER_TTL_MINUTES)
+        last_id = None if restart else await self._load_checkpoint()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        while limit is None or self.stats["checked"] < limit:
+            query = reconcilable(cutoff, lookback)
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            size = self.batch_size if limit is None else min(self.batch_size, limit - self.stats["checked"])
+
+            batch = await self.db.orders.find(query, _PROJECTION).sort("_id", 1).limit(size).to_list(size)
+            if not batch:
+                last_id = None  # pass complete; the next run starts from the beginning
+                break
+
+            results = await asyncio.gather(*(self._lookup(semaphore, order) for order in batch))
+            outcomes, checked = self._sort(results)
+            self.stats["checked"] += len(batch)
+            self.stats["unchanged"] += len(batch) - len(outcomes)
+            await self._apply(outcomes, checked)
+
+            last_id = batch[-1]["_id"]
+            await self._save_checkpoint(last_id)
+            if len(batch) < size:
+                last_id = None
+                break
+
+        await self._save_checkpoint(last_id)
+
+        elapsed = time.perf_counter() - started
+        report = {
+            **self.stats,
+            "seconds": round(elapsed, 3),
+            "ordersPerSecond": round(self.stats["checked"] / elapsed, 1) if elapsed else 0
+        }
+        metrics.inc("orders.reconcile.runs")
+        for key in ("checked", "paid", "failed", "expired", "errors", "review"):
+            metrics.inc(f"orders.reconcile.{key}", self.stats[key])
+        metrics.set("orders.reconcile.lastOrdersPerSecond", report["ordersPerSecond"])
+        return report
+
+
+async def run_reconciler():
+    """Reconcile at RECONCILE_INTERVAL_SECONDS; started from the app lifespan"""
+    while True:
+        await asyncio.sleep(settings.RECONCILE_INTERVAL_SECONDS)
+        try:
+            report = await Reconciler(get_database(), RazorpayGateway()).run()
+            if report["paid"] or report["failed"] or report["expired"]:
+                print(
+                    f"🔁 Reconciled {report['paid']} paid, {report['failed']} failed "
+                    f"and {report['expired']} expired orders"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.inc("orders.reconcile.errors")
+            print(f"❌ Payment reconciliation failed: {e}")
+
+
+async def _main(args):
+    from database import connect_db, close_db
+
+    await connect_db()
+    try:
+        reconciler = Reconciler(get_database(), RazorpayGateway(), concurrency=args.concurrency, rate=args.rate)
+        report = await reconciler.run(restart=args.restart, limit=args.limit)
+    finally:
+        await close_db()
+
+    print(
+        f"✅ Checked {report['checked']} orders in {report['seconds']}s "
+        f"({report['ordersPerSecond']} orders/sec): {report['paid']} paid, "
+        f"{report['failed']} failed, {report['expired']} expired, {report['unchanged']} unchanged, {report['errors']} errors, "
+        f"{report['review']} flagged for review"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile pending orders with Razorpay")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the oldest order")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many orders")
+    parser.add_argument("--concurrency", type=int, default=None, help="parallel gateway lookups")
+    parser.add_argument("--rate", type=float, default=None, help="gateway lookups per second")
+    asyncio.run(_main(parser.parse_args()))
@@ -3,21 +3,30 @@ import { useNavigate } from "react-router-dom";
 import axios from "axios";
 import { API_URL } from '../config';
 
+// Catalog inlined into index.html when the API server also serves the frontend.
+// It is a snapshot of page load time, so it only serves the first render.
+let inlineCatalog = window.__BOOK_CATALOG__;
+
 function Books() {
   const navigate = useNavigate();
-  const [books, setBooks] = useState([]);
-  const [loading, setLoading] = useState(true);
+  const [initialCatalog] = useState(inlineCatalog);
+  const [books, setBooks] = useState(initialCatalog || []);
+  const [loading, setLoading] = useState(!initialCatalog);
   const [error, setError] = useState("");
 
-  // Fetch books on component mount
+  // Fetch books on component mount; an inlined catalog is shown meanwhile
+  // and revalidated in the background
   useEffect(() => {
-    getAllBooks();
+    inlineCatalog = undefined;
+    getAllBooks(Boolean(initialCatalog));
   }, []);
 
-  const getAllBooks = async () => {
+  const getAllBooks = async (background = false) => {
     try {
-      setLoading(true);
-      setError("");
+      if (!background) {
+        setLoading(true);
+        setError("");
+      }
 
       const response = await axios.get(`${API_URL}/books`);
 
@@ -25,10 +34,15 @@ function Books() {
         setBooks(response.data.data);
       }
     } catch (err) {
-      setError("Failed to fetch books. Please make sure the server is running.");
+      // A failed background refresh keeps the inlined catalog on screen
+      if (!background) {
+        setError("Failed to fetch books. Please make sure the server is running.");
+      }
       console.error("Error fetching books:", err);
     } finally {
-      setLoading(false);
+      if (!background) {
+        setLoading(false);
+      }
     }
   };
 
@@ -63,7 +77,7 @@ function Books() {
             <p className="font-semibold">Error</p>
             <p>{error}</p>
             <button
-              onClick={getAllBooks}
+              onClick={() => getAllBooks()}
               className="mt-2 bg-red-600 text-white px-4 py-2 rounded-lg hover:bg-red-700 transition-colors"
             >
               Try Again
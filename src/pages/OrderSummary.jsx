@@ -15,6 +15,17 @@ function OrderSummary() {
     fetchOrder();
   }, [orderId]);
 
+  useEffect(() => {
+    // Live payment status (e.g. paid in another tab or confirmed by reconciliation)
+    const events = new EventSource(`${API_URL}/orders/${orderId}/events`);
+    events.addEventListener('status', (event) => {
+      const { paymentStatus } = JSON.parse(event.data);
+      setOrder(prev => (prev ? { ...prev, paymentStatus } : prev));
+    });
+    events.addEventListener('end', () => events.close());
+    return () => events.close();
+  }, [orderId]);
+
   const fetchOrder = async () => {
     try {
       setLoading(true);